@@ -0,0 +1,379 @@
+import asyncio
+import csv
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Set
+
+import numpy as np
+from dotenv import load_dotenv
+from google.adk.plugins.logging_plugin import LoggingPlugin
+from google.adk.runners import Runner
+from google.adk.sessions import BaseSessionService
+from google.genai import types
+from pydantic import BaseModel, Field, ValidationError, model_validator
+
+from config.settings import BATCH_CONCURRENCY, LLM_CACHE_ENABLED, STRUCTURED_INPUT
+from instrumentation import InstrumentationPlugin
+from llm_cache import LlmCachePlugin
+from progress import ProgressEvent, ProgressTracker
+from resilience import ResiliencePlugin, resilience_stats
+from session_store import create_session_service, seed_session_state
+
+if TYPE_CHECKING:
+    from coordinator_agent.sub_agents.baseline_agent_sequential.sub_agents.baseline_data_agent_parallel.sub_agents.weather_data_agent.weather_archive import (
+        WeatherArchive,
+    )
+
+load_dotenv()  # Loads .env from current directory
+
+# --- Configuration ---
+APP_NAME = "multiple_regression_prediction_app"
+USER_ID = "portfolio_batch_user"
+
+logger = logging.getLogger(__name__)
+
+
+class FacilityRequest(BaseModel):
+    """One row of the portfolio input file."""
+    facility_id: str = ""
+    name: str
+    city: Optional[str] = None
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+    baseline_from_date: str
+    baseline_to_date: str
+
+    @model_validator(mode="after")
+    def _check_location(self):
+        if not self.city and (self.latitude is None or self.longitude is None):
+            raise ValueError("either city or latitude and longitude is required")
+        if not self.facility_id:
+            from coordinator_agent.sub_agents.input_agent.agent import default_facility_id
+
+            # The same registry key main.py and the input agent give a user without an id.
+            self.facility_id = default_facility_id(self.name, self.city or f"{self.latitude},{self.longitude}")
+        return self
+
+    @property
+    def run_key(self) -> str:
+        """Resume key of a batch run: one facility can appear once per baseline window."""
+        return f"{self.facility_id}|{self.baseline_from_date}|{self.baseline_to_date}"
+
+    def to_query(self) -> str:
+        """The same natural-language request main.py sends for a single facility."""
+        query = f"My name is {self.name}. "
+        if self.city:
+            query += f"I live in {self.city}. "
+        if self.latitude is not None and self.longitude is not None:
+            query += f"My latitude is {self.latitude} and my longitude is {self.longitude}. "
+        return query + (
+            f"My baseline start date is {self.baseline_from_date} and "
+            f"my baseline end date is {self.baseline_to_date}."
+        )
+
+
+def load_facilities(path: str) -> List[FacilityRequest]:
+    """Read facilities from a .csv or .jsonl file; invalid rows are logged and skipped."""
+    if path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    else:
+        with open(path, encoding="utf-8", newline="") as f:
+            rows = [{k: v for k, v in row.items() if v not in ("", None)} for row in csv.DictReader(f)]
+
+    facilities = []
+    for i, row in enumerate(rows, start=1):
+        try:
+            facilities.append(FacilityRequest(**row))
+        except ValidationError as e:
+            logger.error(f"Skipping row {i} of {path}: {e}")
+    return facilities
+
+
+def completed_run_keys(output_path: str) -> Set[str]:
+    """Run keys (FacilityRequest.run_key) that already have a successful result in the output file."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Partial line from an interrupted run
+            if result.get("status") == "success":
+                done.add(result.get("run_key") or result["facility_id"])
+    return done
+
+
+def end_partial_line(output_path: str) -> None:
+    """Terminate a partial last line left by an interrupted run, so appended results start on their own line."""
+    if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+        return
+    with open(output_path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    if not latencies:
+        return {"p50_s": 0.0, "p95_s": 0.0, "max_s": 0.0}
+    values = np.asarray(latencies)
+    return {
+        "p50_s": float(np.percentile(values, 50)),
+        "p95_s": float(np.percentile(values, 95)),
+        "max_s": float(values.max()),
+    }
+
+
+async def run_facility(
+    runner: Runner,
+    session_service: BaseSessionService,
+    facility: FacilityRequest,
+    structured: bool = False,
+    on_progress: Optional[Callable[[ProgressEvent], Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Run the baseline pipeline for one facility in its own session.
+
+    The facility id is written to session state and keys the registered model.
+    With structured, the facility's fields are validated and written to session
+    state directly and `runner` must run baseline_agent_sequential; otherwise
+    `runner` runs the coordinator, which reads them from the query.
+    `on_progress` is called with each milestone (progress.py) as it is reached;
+    the result's `milestones` gives the elapsed seconds of each.
+    """
+    started = time.perf_counter()
+    if structured:
+        from coordinator_agent.sub_agents.input_agent.agent import structured_user_state
+
+        try:
+            state = structured_user_state(
+                facility.name, facility.city, facility.baseline_from_date, facility.baseline_to_date,
+                facility.latitude, facility.longitude, facility.facility_id,
+            )
+        except LookupError as e:
+            raise LookupError(f"{e} Give latitude and longitude, or run with --conversational.") from e
+    else:
+        # The input agent keeps a seeded facility id when it saves the user's details.
+        state = {"facility_id": facility.facility_id}
+    session = await session_service.create_session(app_name=APP_NAME, user_id=USER_ID)
+    session_id = session.id
+    try:
+        await seed_session_state(session_service, session, state)
+        tracker = ProgressTracker(state if structured else None, on_progress=on_progress, started=started)
+        tracker.start()
+        query_content = types.Content(role="user", parts=[types.Part(text=facility.to_query())])
+        final_text = None
+        async for event in runner.run_async(
+            user_id=USER_ID, session_id=session_id, new_message=query_content
+        ):
+            tracker.observe(event)
+            if event.is_final_response() and event.content and event.content.parts:
+                text = event.content.parts[0].text
+                if text and text != "None":
+                    final_text = text
+
+        session = await session_service.get_session(
+            app_name=APP_NAME, user_id=USER_ID, session_id=session_id
+        )
+        regression_record = session.state.get("regression_record")
+        savings = session.state.get("savings") or {}
+    finally:
+        # Sessions are only needed until the result is written, and a facility that
+        # fails mid-run must not leave its session behind; keep memory flat.
+        await session_service.delete_session(app_name=APP_NAME, user_id=USER_ID, session_id=session_id)
+    return {
+        "facility_id": facility.facility_id,
+        "run_key": facility.run_key,
+        "name": facility.name,
+        "status": "success" if regression_record else "error",
+        "latency_s": round(time.perf_counter() - started, 3),
+        "regression_record": regression_record,
+        "hourly_regression_record": session.state.get("hourly_regression_record"),
+        "model_selection": (session.state.get("model_selection") or {}).get("winner"),
+        "baseline_model": savings.get("baseline_model"),
+        "savings": savings.get("summary"),
+        "final_response": final_text,
+        "milestones": tracker.reached,
+        "error": None if regression_record else "No regression record produced",
+    }
+
+
+async def run_batch(
+    input_path: str,
+    output_path: str,
+    concurrency: int = BATCH_CONCURRENCY,
+    verbose: bool = False,
+    structured: bool = STRUCTURED_INPUT,
+) -> Dict[str, Any]:
+    """
+    Run baselines for every facility in input_path, appending one JSON line per
+    facility to output_path as soon as it finishes. Facilities with a successful
+    line for the same window already in output_path are skipped, so an
+    interrupted run can be resumed.
+
+    With structured (the default), facilities go straight to the baseline pipeline
+    with their fields seeded into session state, skipping the coordinator and
+    input agent LLM turns.
+    """
+    facilities = load_facilities(input_path)
+    done = completed_run_keys(output_path)
+    pending = [f for f in facilities if f.run_key not in done]
+    logger.info(f"{len(facilities)} facilities, {len(done)} already complete, {len(pending)} to run with concurrency {concurrency}")
+
+    if structured:
+        from coordinator_agent.sub_agents.baseline_agent_sequential.agent import baseline_agent_sequential as agent
+    else:
+        from coordinator_agent.agent import root_agent as agent  # builds the whole agent tree
+
+    # Facilities with coordinates in a covered cell get their weather with no network calls.
+    from coordinator_agent.sub_agents.baseline_agent_sequential.sub_agents.baseline_data_agent_parallel.sub_agents.weather_data_agent.agent import (
+        WEATHER_ARCHIVE,
+    )
+
+    coverage = archive_coverage(WEATHER_ARCHIVE, pending)
+    if coverage:
+        logger.info(f"Weather archive covers {coverage['covered']} of {coverage['located']} facilities with coordinates")
+
+    session_service = create_session_service()
+    # One plugin for the whole batch; per-run tables are skipped in favour of the aggregate.
+    instrumentation = InstrumentationPlugin(print_report=False)
+    # The LLM cache goes first: a hit skips the model callbacks of later plugins.
+    plugins = [LlmCachePlugin()] if LLM_CACHE_ENABLED else []
+    plugins.append(ResiliencePlugin())
+    if verbose:
+        plugins.append(LoggingPlugin())
+    runner = Runner(
+        agent=agent,
+        plugins=plugins + [instrumentation],
+        session_service=session_service,
+        app_name=APP_NAME,
+    )
+
+    semaphore = asyncio.Semaphore(concurrency)
+    write_lock = asyncio.Lock()
+    latencies: List[float] = []
+    counts = {"success": 0, "error": 0}
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    started = time.perf_counter()
+
+    end_partial_line(output_path)
+    with open(output_path, "a", encoding="utf-8") as out:
+        async def worker(facility: FacilityRequest) -> None:
+            async with semaphore:
+                t0 = time.perf_counter()
+                on_progress = None
+                if verbose:
+                    def on_progress(progress: ProgressEvent) -> None:
+                        logger.info(f"{facility.facility_id} {progress.milestone} after {progress.elapsed_s}s: {progress.message}")
+                try:
+                    result = await run_facility(runner, session_service, facility, structured, on_progress)
+                except Exception as e:
+                    logger.exception(f"Facility {facility.facility_id} failed")
+                    result = {
+                        "facility_id": facility.facility_id,
+                        "run_key": facility.run_key,
+                        "name": facility.name,
+                        "status": "error",
+                        "latency_s": round(time.perf_counter() - t0, 3),
+                        "regression_record": None,
+                        "baseline_model": None,
+                        "savings": None,
+                        "final_response": None,
+                        "error": str(e),
+                    }
+            async with write_lock:
+                out.write(json.dumps(result, default=str) + "\n")
+                out.flush()
+                latencies.append(result["latency_s"])
+                counts[result["status"]] += 1
+                logger.info(f"[{sum(counts.values())}/{len(pending)}] {facility.facility_id}: {result['status']} in {result['latency_s']}s")
+
+        await asyncio.gather(*(worker(f) for f in pending))
+    await runner.close()
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        "facilities": len(facilities),
+        "skipped": len(facilities) - len(pending),
+        "succeeded": counts["success"],
+        "failed": counts["error"],
+        "elapsed_s": round(elapsed, 3),
+        "facilities_per_min": round(len(pending) / elapsed * 60, 2) if elapsed > 0 and pending else 0.0,
+        **{k: round(v, 3) for k, v in latency_summary(latencies).items()},
+        "stages": instrumentation.batch_report(),
+        "upstreams": resilience_stats(),
+    }
+    if coverage:
+        summary["weather_archive"] = {**coverage, **WEATHER_ARCHIVE.stats()}
+    return summary
+
+
+def archive_coverage(archive: Optional["WeatherArchive"], facilities: List[FacilityRequest]) -> Optional[Dict[str, int]]:
+    """How many facilities with coordinates the weather archive covers for their whole baseline window."""
+    located = [f for f in facilities if f.latitude is not None and f.longitude is not None]
+    if archive is None or not located:
+        return None
+    _, _, covered = archive.cells([f.latitude for f in located], [f.longitude for f in located])
+    start, end = str(archive.start), str(archive.end)
+    in_range = np.array([start <= f.baseline_from_date[:10] and f.baseline_to_date[:10] <= end for f in located])
+    return {"located": len(located), "covered": int((covered & in_range).sum())}
+
+
+def print_summary(summary: Dict[str, Any]) -> None:
+    print("\n### Batch summary")
+    for key, value in summary.items():
+        if key not in ("stages", "upstreams"):
+            print(f"{key:>20}: {value}")
+    for upstream, stats in summary.get("upstreams", {}).items():
+        breaker = stats["breaker"]
+        print(
+            f"{upstream:>20}: {stats['acquired']} calls, {stats['waited']} rate limited, "
+            f"max queue {stats['max_queue_depth']}, wait p50 {stats['wait_p50_s']}s / p95 {stats['wait_p95_s']}s / "
+            f"max {stats['wait_max_s']}s, circuit {breaker['state']} (opened {breaker['opens']}x, rejected {breaker['rejected']})"
+        )
+    if summary.get("stages"):
+        print("\n### Per-stage latency")
+        print(InstrumentationPlugin.format_batch_report(summary["stages"]))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run energy baselines for a portfolio of facilities.")
+    parser.add_argument(
+        "--input",
+        type=str,
+        required=True,
+        help="CSV or JSONL file with columns name, city or latitude/longitude, "
+             "baseline_from_date, baseline_to_date and optional facility_id",
+    )
+    parser.add_argument("--output", type=str, required=True, help="JSONL file results are appended to")
+    parser.add_argument(
+        "--concurrency", type=int, default=BATCH_CONCURRENCY, help="Facilities processed concurrently"
+    )
+    parser.add_argument("--verbose", action="store_true", help="Enable the ADK LoggingPlugin")
+    parser.add_argument(
+        "--conversational",
+        action="store_true",
+        help="Send each facility through the coordinator as a chat message instead of seeding session state",
+    )
+
+    args = parser.parse_args()
+
+    summary = asyncio.run(
+        run_batch(
+            input_path=args.input,
+            output_path=args.output,
+            concurrency=args.concurrency,
+            verbose=args.verbose,
+            structured=STRUCTURED_INPUT and not args.conversational,
+        )
+    )
+    print_summary(summary)
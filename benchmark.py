@@ -0,0 +1,714 @@
+"""
+Offline end-to-end benchmark of the baseline pipeline.
+
+Runs the real `root_agent` graph with every Gemini model swapped for a
+scripted stand-in (`ScriptedLlm`) and Open-Meteo served by a local HTTP
+server (`FakeOpenMeteo`), so the numbers measure this code rather than the
+network. Scenarios cover 15 day, 1 year and 3 year baseline windows at 1, 10
+and 100 concurrent sessions. For each one the benchmark reports latency and
+throughput, plus per-agent latency (InstrumentationPlugin). A second pass of each
+scenario under tracemalloc gives peak traced memory, overall and per agent.
+
+Results can be saved as a baseline and later runs compared against it:
+
+    python benchmark.py --save-baseline .cache/benchmarks/baseline.json
+    python benchmark.py --baseline .cache/benchmarks/baseline.json   # exit code 1 on regressions
+"""
+import asyncio
+import importlib
+import json
+import logging
+import os
+import platform
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, AsyncGenerator, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+from google.adk.agents import BaseAgent, LlmAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.plugins.base_plugin import BasePlugin
+from google.adk.tools.agent_tool import AgentTool
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+SCENARIO_WINDOWS = {"15d": 15, "1y": 365, "3y": 1096}
+SCENARIO_CONCURRENCY = (1, 10, 100)
+BENCHMARK_END_DATE = "2024-12-31"
+WEATHER_AGENT_MODULE = (
+    "coordinator_agent.sub_agents.baseline_agent_sequential.sub_agents.baseline_data_agent_parallel"
+    ".sub_agents.weather_data_agent.agent"
+)
+
+# Calls served by ScriptedLlm, and the prompt tokens they were sent, per agent.
+LLM_CALLS: Counter = Counter()
+PROMPT_TOKENS: Counter = Counter()
+
+
+# -------------------------------------------------------------------
+# Local Open-Meteo stand-in
+# -------------------------------------------------------------------
+def synthetic_daily(latitude: float, longitude: float, start_date: str, end_date: str) -> Dict[str, list]:
+    """Deterministic daily means shaped like the Open-Meteo `daily` block."""
+    start = date.fromisoformat(start_date)
+    n = (date.fromisoformat(end_date) - start).days + 1
+    days = np.arange(n)
+    day_of_year = (start.timetuple().tm_yday + days) % 365
+    rng = np.random.default_rng([int(abs(latitude) * 1000), int(abs(longitude) * 1000), start.toordinal()])
+    temperature = 12 - 0.3 * (abs(latitude) - 40) + 10 * np.sin(2 * np.pi * (day_of_year - 110) / 365) + rng.normal(0, 2, n)
+    humidity = np.clip(65 + 15 * np.cos(2 * np.pi * day_of_year / 365) + rng.normal(0, 5, n), 5, 100)
+    dewpoint = temperature - (100 - humidity) / 5
+    return {
+        "time": [(start + timedelta(days=int(d))).isoformat() for d in days],
+        "temperature_2m_mean": np.round(temperature, 1).tolist(),
+        "relative_humidity_2m_mean": np.round(humidity).tolist(),
+        "dew_point_2m_mean": np.round(dewpoint, 1).tolist(),
+    }
+
+
+def synthetic_hourly(latitude: float, longitude: float, start_date: str, end_date: str) -> Dict[str, list]:
+    """Hourly values shaped like the Open-Meteo `hourly` block: the daily means plus a diurnal cycle."""
+    daily = synthetic_daily(latitude, longitude, start_date, end_date)
+    start = datetime.fromisoformat(start_date)
+    n = len(daily["time"]) * 24
+    hour = np.arange(n) % 24
+    swing = np.sin(2 * np.pi * (hour - 9) / 24)
+    temperature = np.repeat(daily["temperature_2m_mean"], 24) + 5 * swing
+    humidity = np.clip(np.repeat(daily["relative_humidity_2m_mean"], 24) - 10 * swing, 5, 100)
+    return {
+        "time": [(start + timedelta(hours=int(h))).isoformat(timespec="minutes") for h in range(n)],
+        "temperature_2m": np.round(temperature, 1).tolist(),
+        "relative_humidity_2m": np.round(humidity).tolist(),
+        "dew_point_2m": np.round(temperature - (100 - humidity) / 5, 1).tolist(),
+    }
+
+
+class FakeOpenMeteo:
+    """Threaded local server answering /v1/forecast daily and hourly requests with synthetic weather."""
+
+    def __init__(self, latency_s: float = 0.0):
+        self.latency_s = latency_s
+        self.requests = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                query = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+                with server._lock:
+                    server.requests += 1
+                if server.latency_s:
+                    time.sleep(server.latency_s)
+                try:
+                    block = "hourly" if "hourly" in query else "daily"
+                    values = (synthetic_hourly if block == "hourly" else synthetic_daily)(
+                        float(query["latitude"]), float(query["longitude"]), query["start_date"], query["end_date"]
+                    )
+                    status, body = 200, json.dumps({block: values}).encode()
+                except (KeyError, ValueError) as e:
+                    status, body = 400, json.dumps({"error": True, "reason": str(e)}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/forecast"
+
+    def start(self) -> "FakeOpenMeteo":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+# -------------------------------------------------------------------
+# Scripted Gemini stand-in
+# -------------------------------------------------------------------
+QUERY_PATTERN = re.compile(
+    r"My name is (?P<name>.+?)\. "
+    r"(?:I live in (?P<city>.+?)\. )?"
+    r"(?:My latitude is (?P<latitude>-?[\d.]+) and my longitude is (?P<longitude>-?[\d.]+)\. )?"
+    r"My baseline start date is (?P<start>[\d-]+) and my baseline end date is (?P<end>[\d-]+)"
+)
+
+
+def _parse_query(llm_request: LlmRequest) -> Dict[str, Any]:
+    """Facility fields from the user query (FacilityRequest.to_query format) in the request history."""
+    for content in llm_request.contents:
+        for part in content.parts or []:
+            match = QUERY_PATTERN.search(part.text or "")
+            if match:
+                fields = match.groupdict()
+                for key in ("latitude", "longitude"):
+                    fields[key] = float(fields[key]) if fields[key] is not None else None
+                return fields
+    raise ValueError("No facility query found in the request contents")
+
+
+def _last_function_response(llm_request: LlmRequest) -> Optional[types.FunctionResponse]:
+    last = llm_request.contents[-1] if llm_request.contents else None
+    for part in (last.parts or []) if last else []:
+        if part.function_response is not None:
+            return part.function_response
+    return None
+
+
+def _call(name: str, **args) -> types.Content:
+    return types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(name=name, args=args))])
+
+
+def _text(text: str) -> types.Content:
+    return types.Content(role="model", parts=[types.Part(text=text)])
+
+
+def scripted_turn(agent_name: str, llm_request: LlmRequest) -> types.Content:
+    """The response a well-behaved Gemini would give this agent at this point of the conversation."""
+    response = _last_function_response(llm_request)
+    tools = llm_request.tools_dict
+    if agent_name == "CoordinatorAgent":
+        return _call("transfer_to_agent", agent_name="InputAgent") if response is None else _text("Baseline complete.")
+
+    if agent_name == "InputAgent":
+        if response is None:
+            q = _parse_query(llm_request)
+            return _call(
+                "save_userinfo", user_name=q["name"], city=q["city"] or f"{q['latitude']},{q['longitude']}",
+                dates=[q["start"], q["end"]], latitude=q["latitude"], longitude=q["longitude"],
+            )
+        return _call("transfer_to_agent", agent_name="AnalyticalCoreAgentSequential")
+
+    if agent_name == "WeatherDataAgent" and "get_weather_daily" in tools:
+        if response is None:
+            q = _parse_query(llm_request)
+            return _call(
+                "get_weather_daily", geo_location={"latitude": q["latitude"], "longitude": q["longitude"]},
+                start_date=q["start"], end_date=q["end"],
+            )
+        output = {"daily_records": response.response.get("daily_records", [])}
+        if "set_model_response" in tools:
+            return _call("set_model_response", **output)
+        return _text(json.dumps(output))
+
+    # LLM variants of the other stages call their single no-argument tool, then summarize.
+    callable_tools = [name for name in tools if name not in ("transfer_to_agent", "set_model_response")]
+    if response is None and callable_tools:
+        return _call(callable_tools[0])
+    return _text("Done.")
+
+
+class ScriptedLlm(BaseLlm):
+    """Offline replacement for Gemini that answers each agent from `scripted_turn`."""
+    agent_name: str
+    latency_s: float = 0.0
+    seconds_per_token: float = 0.0
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        LLM_CALLS[self.agent_name] += 1
+        content = scripted_turn(self.agent_name, llm_request)
+        # Rough token counts (4 characters per token) so the usage numbers scale with the payload.
+        system_instruction = llm_request.config.system_instruction if llm_request.config else None
+        prompt_tokens = (
+            sum(len(c.model_dump_json(exclude_none=True)) for c in llm_request.contents)
+            + len(str(system_instruction or ""))
+        ) // 4
+        PROMPT_TOKENS[self.agent_name] += prompt_tokens
+        output_tokens = len(content.model_dump_json(exclude_none=True)) // 4
+        delay = self.latency_s + self.seconds_per_token * output_tokens
+        if delay:
+            await asyncio.sleep(delay)
+        yield LlmResponse(
+            content=content,
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_tokens, candidates_token_count=output_tokens
+            ),
+        )
+
+
+def iter_agents(agent: BaseAgent) -> Iterable[BaseAgent]:
+    """The agent, its sub-agents and agents wrapped in AgentTools, recursively."""
+    yield agent
+    for sub_agent in agent.sub_agents:
+        yield from iter_agents(sub_agent)
+    for tool in getattr(agent, "tools", []):
+        if isinstance(tool, AgentTool):
+            yield from iter_agents(tool.agent)
+
+
+def install_scripted_llm(root: BaseAgent, latency_s: float = 0.0, seconds_per_token: float = 0.0) -> List[str]:
+    """Swap the model of every LlmAgent under root for a ScriptedLlm; returns the agent names."""
+    names = []
+    for agent in iter_agents(root):
+        if isinstance(agent, LlmAgent) and not isinstance(agent.model, ScriptedLlm):
+            model_name = agent.model if isinstance(agent.model, str) else agent.model.model
+            agent.model = ScriptedLlm(
+                model=model_name, agent_name=agent.name, latency_s=latency_s, seconds_per_token=seconds_per_token
+            )
+            names.append(agent.name)
+    return names
+
+
+# -------------------------------------------------------------------
+# Per-agent memory
+# -------------------------------------------------------------------
+class AgentMemoryPlugin(BasePlugin):
+    """
+    Peak traced memory above the starting level of each agent run.
+
+    Peaks are folded in at every agent boundary, so a peak is attributed to
+    every agent open at the time, including concurrently running sessions.
+    Per-agent numbers are therefore exact only at concurrency 1.
+    """
+
+    def __init__(self, name: str = "agent_memory_plugin"):
+        super().__init__(name)
+        self.peaks: Dict[str, List[int]] = {}
+        self._open: Dict[Tuple[str, str, str], List[int]] = {}
+
+    def _fold(self) -> int:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for entry in self._open.values():
+            entry[1] = max(entry[1], peak)
+        return current
+
+    @staticmethod
+    def _key(agent: BaseAgent, callback_context: CallbackContext) -> Tuple[str, str, str]:
+        return callback_context.invocation_id, callback_context._invocation_context.branch or "", agent.name
+
+    async def before_agent_callback(self, *, agent: BaseAgent, callback_context: CallbackContext):
+        if tracemalloc.is_tracing():
+            current = self._fold()
+            self._open[self._key(agent, callback_context)] = [current, current]
+        return None
+
+    async def after_agent_callback(self, *, agent: BaseAgent, callback_context: CallbackContext):
+        if tracemalloc.is_tracing():
+            self._fold()
+            entry = self._open.pop(self._key(agent, callback_context), None)
+            if entry is not None:
+                self.peaks.setdefault(agent.name, []).append(entry[1] - entry[0])
+        return None
+
+
+# -------------------------------------------------------------------
+# Scenarios
+# -------------------------------------------------------------------
+def configure_environment(workdir: str, session_backend: str) -> None:
+    """Point every on-disk store at workdir. Must run before the agent modules are imported."""
+    os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")  # Gemini is never called
+    os.environ["SESSION_BACKEND"] = session_backend
+    os.environ["SESSION_DB_PATH"] = os.path.join(workdir, "sessions.db")
+    os.environ["MODEL_REGISTRY_DIR"] = os.path.join(workdir, "model_registry")
+    os.environ["WEATHER_CACHE_DIR"] = os.path.join(workdir, "weather_cache")
+    os.environ["CONSUMPTION_SOURCE"] = "synthetic"
+    os.environ["TELEMETRY_RUN_REPORT"] = "false"
+    # Keep the upstream rate limiters out of the way; the stand-ins have no quota.
+    os.environ["GEMINI_RATE_PER_MIN"] = "0"
+    os.environ["OPEN_METEO_RATE_PER_MIN"] = "0"
+
+
+def scenario_facilities(days: int, sessions: int, offset: int) -> List[Any]:
+    """Facilities with distinct coordinates (no weather cache sharing) and a `days` long window."""
+    from batch import FacilityRequest
+
+    end = date.fromisoformat(BENCHMARK_END_DATE)
+    start = (end - timedelta(days=days - 1)).isoformat()
+    facilities = []
+    for i in range(offset, offset + sessions):
+        facilities.append(FacilityRequest(
+            facility_id=f"bench-{i}",
+            name=f"Bench {i}",
+            city=f"Bench City {i}",
+            latitude=round(-45 + (i * 0.731) % 100, 3),
+            longitude=round(-170 + (i * 1.377) % 340, 3),
+            baseline_from_date=start,
+            baseline_to_date=end.isoformat(),
+        ))
+    return facilities
+
+
+async def run_scenario(
+    name: str, days: int, concurrency: int, offset: int, trace_memory: bool = False
+) -> Dict[str, Any]:
+    """
+    Run `concurrency` sessions at once through a fresh Runner and collect their numbers.
+
+    With trace_memory the run is under tracemalloc, which slows it several
+    times over, so its latencies should not be compared with untraced runs.
+    """
+    from google.adk.runners import Runner
+
+    from batch import APP_NAME, run_facility
+    from config.settings import STRUCTURED_INPUT
+    from coordinator_agent.agent import root_agent
+    from coordinator_agent.sub_agents.baseline_agent_sequential.agent import baseline_agent_sequential
+    from instrumentation import InstrumentationPlugin, percentiles
+    from resilience import ResiliencePlugin
+    from session_store import create_session_service
+
+    facilities = scenario_facilities(days, concurrency, offset)
+    session_service = create_session_service()
+    instrumentation = InstrumentationPlugin(print_report=False)
+    memory = AgentMemoryPlugin()
+    runner = Runner(
+        agent=baseline_agent_sequential if STRUCTURED_INPUT else root_agent,
+        app_name=APP_NAME,
+        session_service=session_service,
+        plugins=[ResiliencePlugin(), instrumentation] + ([memory] if trace_memory else []),
+    )
+    LLM_CALLS.clear()
+    PROMPT_TOKENS.clear()
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(run_facility(runner, session_service, f, STRUCTURED_INPUT) for f in facilities), return_exceptions=True
+    )
+    wall = time.perf_counter() - started
+    peak_traced = None
+    if trace_memory:
+        peak_traced = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+        tracemalloc.stop()
+    await runner.close()
+
+    errors = [r for r in results if isinstance(r, BaseException) or r["status"] != "success"]
+    for error in errors[:3]:
+        if isinstance(error, BaseException):
+            logger.error(f"{name}: session failed", exc_info=error)
+        else:
+            logger.error(f"{name}: {error['error']}")
+    latencies = [r["latency_s"] for r in results if not isinstance(r, BaseException)]
+    # Time to the first useful result: the fitted baseline (progress milestone fit_complete).
+    fit_latencies = [
+        r["milestones"]["fit_complete"] for r in results
+        if not isinstance(r, BaseException) and "fit_complete" in r.get("milestones", {})
+    ]
+    stages = instrumentation.batch_report()
+    agents = {}
+    for key, row in stages.items():
+        kind, _, agent_name = key.partition(":")
+        if kind != "agent":
+            continue
+        peaks = memory.peaks.get(agent_name)
+        agents[agent_name] = {
+            **{k: round(v, 4) for k, v in row.items() if k != "runs"},
+            "peak_mb": round(max(peaks) / 2**20, 2) if peaks else None,
+            "prompt_tokens": round(PROMPT_TOKENS[agent_name] / len(facilities)),   # per session
+        }
+    return {
+        "scenario": name,
+        "window_days": days,
+        "concurrency": concurrency,
+        "sessions": len(facilities),
+        "succeeded": len(facilities) - len(errors),
+        "wall_s": round(wall, 3),
+        "sessions_per_min": round(len(facilities) / wall * 60, 2) if wall > 0 else 0.0,
+        **{k: round(v, 4) for k, v in percentiles(latencies).items()},
+        "fit_p50_s": round(percentiles(fit_latencies)["p50_s"], 4),
+        "peak_traced_mb": peak_traced,
+        "llm_calls": sum(LLM_CALLS.values()),
+        "agents": agents,
+    }
+
+
+async def run_benchmark(
+    windows: Dict[str, int],
+    concurrency_levels: Iterable[int],
+    llm_latency_s: float = 0.0,
+    llm_seconds_per_token: float = 0.0,
+    weather_latency_s: float = 0.0,
+    trace_memory: bool = True,
+) -> Dict[str, Any]:
+    """
+    Run every window x concurrency scenario against the offline stand-ins.
+
+    Each scenario is timed untraced; with trace_memory it is then repeated
+    under tracemalloc (on fresh facilities) for the memory numbers.
+    """
+    from coordinator_agent.agent import root_agent
+
+    weather_agent = importlib.import_module(WEATHER_AGENT_MODULE)
+    scripted = install_scripted_llm(root_agent, llm_latency_s, llm_seconds_per_token)
+    logger.info(f"Scripted LLM installed for {scripted}")
+
+    server = FakeOpenMeteo(latency_s=weather_latency_s).start()
+    weather_agent.WEATHER_CLIENT.base_url = server.url
+    scenarios = []
+    offset = 0
+    try:
+        # One untimed session first, so lazy imports and first connections are not billed to a scenario.
+        await run_scenario("warmup", min(windows.values()), 1, offset)
+        offset += 1
+        for window_name, days in windows.items():
+            for concurrency in concurrency_levels:
+                name = f"{window_name}x{concurrency}"
+                result = await run_scenario(name, days, concurrency, offset)
+                offset += concurrency
+                if trace_memory:
+                    traced = await run_scenario(name, days, concurrency, offset, trace_memory=True)
+                    offset += concurrency
+                    result["peak_traced_mb"] = traced["peak_traced_mb"]
+                    for agent_name, row in result["agents"].items():
+                        row["peak_mb"] = traced["agents"].get(agent_name, {}).get("peak_mb")
+                scenarios.append(result)
+                logger.info(
+                    f"{name}: {result['succeeded']}/{result['sessions']} ok, p50 {result['p50_s']}s, "
+                    f"{result['sessions_per_min']} sessions/min, peak {result['peak_traced_mb']} MB"
+                )
+        await weather_agent.WEATHER_CLIENT.aclose()
+    finally:
+        server.stop()
+    return {
+        "metadata": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "llm_latency_s": llm_latency_s,
+            "llm_seconds_per_token": llm_seconds_per_token,
+            "weather_latency_s": weather_latency_s,
+            "trace_memory": trace_memory,
+            "weather_requests": server.requests,
+            "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        },
+        "scenarios": {s["scenario"]: s for s in scenarios},
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# -------------------------------------------------------------------
+# Baselines
+# -------------------------------------------------------------------
+# metric -> (higher is worse, absolute slack below which changes are noise)
+COMPARED_METRICS = {
+    "p50_s": (True, 0.005),
+    "p95_s": (True, 0.005),
+    "fit_p50_s": (True, 0.005),
+    "wall_s": (True, 0.01),
+    "sessions_per_min": (False, 1.0),
+    "peak_traced_mb": (True, 1.0),
+}
+COMPARED_AGENT_METRICS = {"p95_s": (True, 0.005), "peak_mb": (True, 1.0), "prompt_tokens": (True, 50)}
+
+
+def _regressed(current: Optional[float], baseline: Optional[float], higher_is_worse: bool, slack: float, tolerance: float) -> bool:
+    if current is None or baseline is None:
+        return False
+    change = current - baseline if higher_is_worse else baseline - current
+    return change > slack and change > tolerance * abs(baseline)
+
+
+def compare_to_baseline(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.2) -> List[str]:
+    """Regressions of results against a saved baseline, as human readable lines."""
+    regressions = []
+    for name, scenario in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            continue
+        if scenario["succeeded"] < base["succeeded"]:
+            regressions.append(f"{name}: succeeded {base['succeeded']} -> {scenario['succeeded']}")
+        for metric, (higher_is_worse, slack) in COMPARED_METRICS.items():
+            if _regressed(scenario.get(metric), base.get(metric), higher_is_worse, slack, tolerance):
+                regressions.append(f"{name}: {metric} {base[metric]} -> {scenario[metric]}")
+        for agent_name, row in scenario["agents"].items():
+            base_row = base.get("agents", {}).get(agent_name, {})
+            for metric, (higher_is_worse, slack) in COMPARED_AGENT_METRICS.items():
+                if _regressed(row.get(metric), base_row.get(metric), higher_is_worse, slack, tolerance):
+                    regressions.append(f"{name}: {agent_name} {metric} {base_row[metric]} -> {row[metric]}")
+    return regressions
+
+
+def format_results(results: Dict[str, Any]) -> str:
+    header = (
+        f"{'scenario':<10} {'ok':>9} {'wall_s':>8} {'sess/min':>9} {'p50_s':>8} {'p95_s':>8} "
+        f"{'p99_s':>8} {'fit_p50':>8} {'peak_mb':>8} {'llm':>5}"
+    )
+    lines = [header, "-" * len(header)]
+    for name, s in results["scenarios"].items():
+        peak = f"{s['peak_traced_mb']:>8.1f}" if s["peak_traced_mb"] is not None else f"{'-':>8}"
+        lines.append(
+            f"{name:<10} {s['succeeded']:>4}/{s['sessions']:<4} {s['wall_s']:>8.3f} {s['sessions_per_min']:>9.1f} "
+            f"{s['p50_s']:>8.3f} {s['p95_s']:>8.3f} {s['p99_s']:>8.3f} {s.get('fit_p50_s', 0.0):>8.3f} {peak} "
+            f"{s['llm_calls']:>5}"
+        )
+    for name, s in results["scenarios"].items():
+        lines.append(f"\n{name} per agent")
+        lines.append(f"  {'agent':<32} {'p50_s':>8} {'p95_s':>8} {'p99_s':>8} {'peak_mb':>8} {'tok_in':>8}")
+        for agent_name, row in sorted(s["agents"].items(), key=lambda kv: -kv[1]["p95_s"]):
+            peak = f"{row['peak_mb']:>8.1f}" if row["peak_mb"] is not None else f"{'-':>8}"
+            lines.append(
+                f"  {agent_name:<32} {row['p50_s']:>8.3f} {row['p95_s']:>8.3f} {row['p99_s']:>8.3f} {peak} "
+                f"{row.get('prompt_tokens', 0):>8}"
+            )
+    return "\n".join(lines)
+
+
+# -------------------------------------------------------------------
+# Prompt sizes with and without context pruning
+# -------------------------------------------------------------------
+# The LLM variant of every stage whose scripted stand-in can play it (the consumption LLM
+# writes its records as structured output, so it keeps its fast path).
+PROMPT_REPORT_ENV = {"STRUCTURED_INPUT": "false", "REGRESSION_FAST_PATH": "false", "PREDICTION_FAST_PATH": "false"}
+
+
+def prompt_report(windows: List[str], session_backend: str = "sqlite") -> Dict[str, Any]:
+    """
+    Per-agent prompt tokens per session with CONTEXT_PRUNING off and on.
+
+    Agents are built at import time, so each setting runs the scenarios in its
+    own interpreter, one conversational session per window.
+    """
+    report: Dict[str, Any] = {"windows": windows}
+    with tempfile.TemporaryDirectory(prefix="adk-prompt-report-") as tmp:
+        for label, pruning in (("before", "false"), ("after", "true")):
+            output = os.path.join(tmp, f"{label}.json")
+            subprocess.run(
+                [
+                    sys.executable, os.path.abspath(__file__), "--windows", *windows, "--concurrency", "1",
+                    "--no-memory", "--session-backend", session_backend, "--output", output,
+                ],
+                env={**os.environ, **PROMPT_REPORT_ENV, "CONTEXT_PRUNING": pruning},
+                check=True, stdout=subprocess.DEVNULL,
+            )
+            with open(output, encoding="utf-8") as f:
+                scenarios = json.load(f)["scenarios"]
+            failed = [name for name, scenario in scenarios.items() if scenario["succeeded"] < scenario["sessions"]]
+            if failed:
+                raise RuntimeError(f"Sessions failed with CONTEXT_PRUNING={pruning} in {', '.join(failed)}")
+            report[label] = {
+                window: {
+                    agent: row["prompt_tokens"]
+                    for agent, row in scenarios[f"{window}x1"]["agents"].items() if row.get("prompt_tokens")
+                }
+                for window in windows
+            }
+    return report
+
+
+def format_prompt_report(report: Dict[str, Any]) -> str:
+    windows = report["windows"]
+    agents = sorted({a for label in ("before", "after") for w in windows for a in report[label][w]})
+    header = f"{'prompt tokens per session':<28}" + "".join(f" {w + ' before':>12} {w + ' after':>12}" for w in windows)
+    lines = [header, "-" * len(header)]
+    for agent in agents + ["total"]:
+        cells = []
+        for window in windows:
+            for label in ("before", "after"):
+                tokens = report[label][window]
+                cells.append(sum(tokens.values()) if agent == "total" else tokens.get(agent, 0))
+        lines.append(f"{agent:<28}" + "".join(f" {c:>12}" for c in cells))
+    return "\n".join(lines)
+
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark with a scripted LLM and local weather server.")
+    parser.add_argument(
+        "--windows", nargs="+", choices=list(SCENARIO_WINDOWS), default=list(SCENARIO_WINDOWS),
+        help="Baseline window scenarios to run",
+    )
+    parser.add_argument(
+        "--concurrency", nargs="+", type=int, default=list(SCENARIO_CONCURRENCY), help="Concurrent session levels"
+    )
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated latency of every LLM call")
+    parser.add_argument("--llm-ms-per-token", type=float, default=0.0, help="Simulated latency per output token")
+    parser.add_argument("--weather-latency-ms", type=float, default=0.0, help="Simulated Open-Meteo response time")
+    parser.add_argument("--session-backend", choices=["sqlite", "memory"], default="sqlite", help="Session store to benchmark")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc pass (no memory numbers)")
+    parser.add_argument(
+        "--conversational", action="store_true", help="Start sessions at the coordinator instead of seeding session state"
+    )
+    parser.add_argument(
+        "--prompt-report", action="store_true",
+        help="Compare per-agent prompt tokens with CONTEXT_PRUNING off and on (LLM variants of every stage)",
+    )
+    parser.add_argument("--output", default=os.path.join(".cache", "benchmarks", "latest.json"), help="Results JSON file")
+    parser.add_argument("--save-baseline", help="Also save the results as a baseline JSON file")
+    parser.add_argument("--baseline", help="Baseline JSON file to compare against; exits 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Relative change flagged as a regression")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="[%(levelname)s] %(message)s")
+    logger.setLevel(logging.INFO)
+    if args.prompt_report:
+        report = prompt_report(args.windows, args.session_backend)
+        print(format_prompt_report(report))
+        _write_json(args.output, report)
+        sys.exit(0)
+    workdir = tempfile.mkdtemp(prefix="adk-benchmark-")
+    configure_environment(workdir, args.session_backend)
+    if args.conversational:
+        os.environ["STRUCTURED_INPUT"] = "false"
+    try:
+        results = asyncio.run(run_benchmark(
+            windows={name: SCENARIO_WINDOWS[name] for name in args.windows},
+            concurrency_levels=args.concurrency,
+            llm_latency_s=args.llm_latency_ms / 1000,
+            llm_seconds_per_token=args.llm_ms_per_token / 1000,
+            weather_latency_s=args.weather_latency_ms / 1000,
+            trace_memory=not args.no_memory,
+        ))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(format_results(results))
+    _write_json(args.output, results)
+    if args.save_baseline:
+        _write_json(args.save_baseline, results)
+        print(f"\nBaseline saved to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regressions against {args.baseline}:")
+            print("\n".join(f"  {line}" for line in regressions))
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")
@@ -0,0 +1,48 @@
+"""
+Build the memory-mapped weather archive from downloaded files.
+
+    python build_weather_archive.py --output .cache/weather_archive downloads/*.csv downloads/*.json
+
+The inputs are long CSV or Parquet tables (latitude, longitude, date and the
+weather fields) or saved Open-Meteo daily responses; see weather_archive.py for
+the accepted columns. Point WEATHER_ARCHIVE_DIR at the output directory to have
+get_weather_daily, batch.py and rebaseline.py read covered windows from it.
+"""
+import glob
+import json
+import logging
+import os
+
+from config.settings import WEATHER_ARCHIVE_DIR, WEATHER_ARCHIVE_GRID_DEG
+from coordinator_agent.sub_agents.baseline_agent_sequential.sub_agents.baseline_data_agent_parallel.sub_agents.weather_data_agent.weather_archive import (
+    build_archive,
+)
+from coordinator_agent.sub_agents.baseline_agent_sequential.sub_agents.baseline_data_agent_parallel.sub_agents.weather_data_agent.weather_cache import (
+    WEATHER_COLUMNS,
+)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the gridded daily weather archive from downloaded files.")
+    parser.add_argument("paths", nargs="+", help="CSV, Parquet or Open-Meteo JSON files (glob patterns are expanded)")
+    parser.add_argument(
+        "--output",
+        default=WEATHER_ARCHIVE_DIR or os.path.join(".cache", "weather_archive"),
+        help="Archive directory (replaced if it exists)",
+    )
+    parser.add_argument("--grid-deg", type=float, default=WEATHER_ARCHIVE_GRID_DEG, help="Grid cell size in degrees")
+    parser.add_argument(
+        "--dtype",
+        choices=["float32", "float64"],
+        default="float64",
+        help="Value type; float64 archives are read without any copy, float32 ones take half the disk "
+        "and are read back at 7 significant digits",
+    )
+    parser.add_argument("--fields", nargs="+", default=list(WEATHER_COLUMNS), help="Weather fields to store")
+    args = parser.parse_args()
+
+    paths = sorted({p for pattern in args.paths for p in (glob.glob(pattern) or [pattern])})
+    meta = build_archive(paths, args.output, grid_deg=args.grid_deg, fields=args.fields, dtype=args.dtype)
+    print(json.dumps(meta, indent=2))
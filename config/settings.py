@@ -1,7 +1,136 @@
-from google.genai import types
-SHARED_RETRY_CONFIG = types.HttpRetryOptions(
-    attempts=5,  # Maximum retry attempts
-    exp_base=7,  # Delay multiplier (exponential backoff)
-    initial_delay=1, # Initial delay in seconds
-    http_status_codes=[429, 500, 503, 504], # Retry on these HTTP errors
-)
\ No newline at end of file
+import os
+
+
+def __getattr__(name):
+    # SHARED_RETRY_CONFIG is built on first use: google.genai.types takes most of
+    # a second to import, and plain settings readers (CLI parsing) do not need it.
+    if name == "SHARED_RETRY_CONFIG":
+        from google.genai import types
+        globals()[name] = types.HttpRetryOptions(
+            attempts=5,  # Maximum retry attempts
+            exp_base=2,  # Delay multiplier (exponential backoff): ~1, 2, 4, 8s
+            initial_delay=1, # Initial delay in seconds
+            max_delay=20,  # Cap on a single backoff delay in seconds
+            http_status_codes=[429, 500, 503, 504], # Retry on these HTTP errors
+        )
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    """Read a boolean switch from the environment (1/true/yes/on)."""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# main.py / batch.py: seed session state from the structured arguments and start the baseline
+# pipeline directly, skipping the CoordinatorAgent and InputAgent LLM turns.
+STRUCTURED_INPUT = _env_flag("STRUCTURED_INPUT", True)
+
+# Analytical LLM agents (weather, consumption, regression, prediction) see a short summary of
+# session state instead of the session history (see baseline_agent_sequential/sub_agents/context_summary.py).
+CONTEXT_PRUNING = _env_flag("CONTEXT_PRUNING", True)
+
+# Regression stage: fit directly from session state without an LLM turn.
+REGRESSION_FAST_PATH = _env_flag("REGRESSION_FAST_PATH", True)
+# Also fit ASHRAE Guideline 14 change-point models (2P/3P/4P/5P) on temperature.
+REGRESSION_CHANGE_POINT = _env_flag("REGRESSION_CHANGE_POINT", True)
+
+# Model selection stage (regression_agent/model_selection.py): score T / HDD / CDD, humidity,
+# dewpoint and day-of-week candidates with blocked time-series CV, and pick the lowest CV(RMSE)
+# among those within the CV(RMSE) and |NMBE| limits. Large problems use MODEL_SELECTION_N_JOBS
+# worker processes (-1 = all cores).
+MODEL_SELECTION_ENABLED = _env_flag("MODEL_SELECTION_ENABLED", True)
+MODEL_SELECTION_FOLDS = int(os.getenv("MODEL_SELECTION_FOLDS", "5"))
+MODEL_SELECTION_MAX_CV_RMSE = float(os.getenv("MODEL_SELECTION_MAX_CV_RMSE", "0.25"))
+MODEL_SELECTION_MAX_NMBE = float(os.getenv("MODEL_SELECTION_MAX_NMBE", "0.05"))
+MODEL_SELECTION_BALANCE_C = float(os.getenv("MODEL_SELECTION_BALANCE_C", "18"))
+MODEL_SELECTION_N_JOBS = int(os.getenv("MODEL_SELECTION_N_JOBS", "-1"))
+
+# Prediction stage: register the fitted baseline and compute savings without an LLM turn.
+PREDICTION_FAST_PATH = _env_flag("PREDICTION_FAST_PATH", True)
+# Versioned baseline models (see regression_agent/model_registry.py).
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", "model_registry")
+
+# Hourly baselines (regression_agent/hourly_regression.py): also fit an hourly time-of-week and
+# temperature model from hourly weather and consumption, accumulating the normal equations
+# HOURLY_CHUNK_ROWS rows at a time. Occupied hours are HOURLY_OCCUPIED_HOURS (start-end, end
+# exclusive) on HOURLY_OCCUPIED_DAYS (0 = Monday).
+BASELINE_HOURLY = _env_flag("BASELINE_HOURLY", False)
+HOURLY_CHUNK_ROWS = int(os.getenv("HOURLY_CHUNK_ROWS", "65536"))
+HOURLY_OCCUPIED_HOURS = os.getenv("HOURLY_OCCUPIED_HOURS", "8-18")
+HOURLY_OCCUPIED_DAYS = os.getenv("HOURLY_OCCUPIED_DAYS", "0-4")
+
+# Persistent weather store used by get_weather_daily (see weather_data_agent/weather_cache.py).
+WEATHER_CACHE_ENABLED = _env_flag("WEATHER_CACHE_ENABLED", True)
+WEATHER_CACHE_DIR = os.getenv("WEATHER_CACHE_DIR", os.path.join(".cache", "weather"))
+WEATHER_CACHE_GRID_DEG = float(os.getenv("WEATHER_CACHE_GRID_DEG", "0.1"))
+WEATHER_CACHE_MAX_BYTES = int(float(os.getenv("WEATHER_CACHE_MAX_MB", "256")) * 1024 * 1024)
+# Days newer than this when fetched (the reanalysis lag) may still be revised upstream; they and
+# days with missing values are refetched once they are older than WEATHER_CACHE_PROVISIONAL_TTL_HOURS.
+WEATHER_CACHE_FINAL_AFTER_DAYS = int(os.getenv("WEATHER_CACHE_FINAL_AFTER_DAYS", "7"))
+WEATHER_CACHE_PROVISIONAL_TTL_S = float(os.getenv("WEATHER_CACHE_PROVISIONAL_TTL_HOURS", "24")) * 3600
+
+# Optional memory-mapped gridded daily weather archive (see weather_data_agent/weather_archive.py),
+# built from downloaded files with build_weather_archive.py. Windows it covers are read from it
+# before the weather cache and Open-Meteo. Empty disables it. The grid size applies when building.
+WEATHER_ARCHIVE_DIR = os.getenv("WEATHER_ARCHIVE_DIR", "")
+WEATHER_ARCHIVE_GRID_DEG = float(os.getenv("WEATHER_ARCHIVE_GRID_DEG", "0.25"))
+
+# Async Open-Meteo client (see weather_data_agent/weather_client.py).
+WEATHER_HTTP_TIMEOUT = float(os.getenv("WEATHER_HTTP_TIMEOUT", "30"))
+WEATHER_MAX_CONNECTIONS = int(os.getenv("WEATHER_MAX_CONNECTIONS", "20"))
+WEATHER_MAX_CONCURRENCY = int(os.getenv("WEATHER_MAX_CONCURRENCY", "8"))
+WEATHER_CHUNK_DAYS = int(os.getenv("WEATHER_CHUNK_DAYS", "92"))
+WEATHER_RETRY_ATTEMPTS = int(os.getenv("WEATHER_RETRY_ATTEMPTS", "3"))
+
+# Offline geocoder: minimum trigram similarity for a fuzzy city match (1.0 = exact).
+GEOCODER_MIN_SCORE = float(os.getenv("GEOCODER_MIN_SCORE", "0.6"))
+
+# Session storage for main.py and batch.py: "sqlite" (persistent, see session_store.py) or "memory".
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "sqlite")
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+
+# Portfolio batch mode (batch.py): facilities processed concurrently.
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+# Baseline HTTP service (server.py): baselines run at once, how long finished results are
+# reused for identical requests, and how many job records are kept for polling.
+SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8080"))
+SERVICE_CONCURRENCY = int(os.getenv("SERVICE_CONCURRENCY", str(BATCH_CONCURRENCY)))
+SERVICE_RESULT_TTL_S = float(os.getenv("SERVICE_RESULT_TTL_MIN", "60")) * 60
+SERVICE_MAX_JOBS = int(os.getenv("SERVICE_MAX_JOBS", "10000"))
+
+# Consumption stage: build energy_consumption_data without an LLM turn.
+CONSUMPTION_FAST_PATH = _env_flag("CONSUMPTION_FAST_PATH", True)
+# "synthetic" (degree-day model driven by weather), "csv" (daily meter files in METER_DATA_DIR)
+# or "interval" (15-min / hourly CSV or Parquet files in METER_DATA_DIR rolled up to daily).
+CONSUMPTION_SOURCE = os.getenv("CONSUMPTION_SOURCE", "synthetic")
+METER_DATA_DIR = os.getenv("METER_DATA_DIR", os.path.join("data", "meters"))
+# IANA timezone used for daily boundaries and DST handling of interval meter data.
+METER_TIMEZONE = os.getenv("METER_TIMEZONE") or None
+
+# Run instrumentation (instrumentation.py): span exporter "none", "console", "file" (JSON lines
+# in TELEMETRY_FILE) or "otlp" (OTEL_EXPORTER_OTLP_* endpoint), and the per-stage table after each run.
+TELEMETRY_EXPORTER = os.getenv("TELEMETRY_EXPORTER", "none")
+TELEMETRY_FILE = os.getenv("TELEMETRY_FILE", os.path.join(".cache", "telemetry", "spans.jsonl"))
+TELEMETRY_RUN_REPORT = _env_flag("TELEMETRY_RUN_REPORT", True)
+
+# Opt-in on-disk cache of LLM responses (llm_cache.py), keyed by the normalized request.
+LLM_CACHE_ENABLED = _env_flag("LLM_CACHE_ENABLED", False)
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", os.path.join(".cache", "llm"))
+LLM_CACHE_TTL_S = float(os.getenv("LLM_CACHE_TTL_HOURS", "168")) * 3600
+LLM_CACHE_MAX_BYTES = int(float(os.getenv("LLM_CACHE_MAX_MB", "64")) * 1024 * 1024)
+
+# Upstream protection (resilience.py): process-wide token buckets in requests per minute (0 = unlimited),
+# circuit breakers, and the per-baseline deadline budget that caps total time including retries.
+GEMINI_RATE_PER_MIN = float(os.getenv("GEMINI_RATE_PER_MIN", "300"))
+GEMINI_BURST = int(os.getenv("GEMINI_BURST", "10"))
+OPEN_METEO_RATE_PER_MIN = float(os.getenv("OPEN_METEO_RATE_PER_MIN", "600"))
+OPEN_METEO_BURST = int(os.getenv("OPEN_METEO_BURST", "20"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_S = float(os.getenv("BREAKER_RESET_S", "30"))
+BASELINE_DEADLINE_S = float(os.getenv("BASELINE_DEADLINE_S", "300"))
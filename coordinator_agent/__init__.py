@@ -1,2 +1,15 @@
-from . import agent
-#from . import sub_agents
\ No newline at end of file
+"""
+Energy baseline coordinator.
+
+`root_agent` (and the whole agent tree under it) is built on first access, so
+importing this package, or a helper module inside it, does not pull in the agents.
+"""
+import importlib
+
+
+def __getattr__(name):
+    if name == "agent":
+        return importlib.import_module(".agent", __name__)
+    if name == "root_agent":
+        return importlib.import_module(".agent", __name__).root_agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
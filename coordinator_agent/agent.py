@@ -1,10 +1,8 @@
 from config.settings import SHARED_RETRY_CONFIG
-from .sub_agents import baseline_agent_sequential
-from .sub_agents import input_agent
+from .sub_agents.baseline_agent_sequential.agent import baseline_agent_sequential
+from .sub_agents.input_agent.agent import input_agent
 from google.adk.agents import Agent
-from google.adk.agents import LlmAgent
 from google.adk.models.google_llm import Gemini
-from google.adk.plugins.logging_plugin import LoggingPlugin
 
 root_agent = Agent(
     name="CoordinatorAgent",
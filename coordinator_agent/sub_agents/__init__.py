@@ -1,3 +1,4 @@
-"""Subagents for the lead  pipeline."""
-from .baseline_agent_sequential.agent import baseline_agent_sequential
-from .input_agent.agent import input_agent
\ No newline at end of file
+"""Subagents for the lead  pipeline.
+
+Agents are built when their agent module is first imported, not with the package.
+"""
@@ -1,23 +1,14 @@
 from google.adk.agents import SequentialAgent
-import pandas as pd
-import numpy as np
-import json
 import logging
-from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
-from google.adk.plugins.logging_plugin import LoggingPlugin
 
 #from .sub_agents import input_agent
 #from .sub_agents import latlong_agent
 from .sub_agents.regression_agent.agent import regression_agent
+from .sub_agents.model_selection_agent.agent import model_selection_agent
 from .sub_agents.prediction_agent.agent import prediction_agent
 from .sub_agents.baseline_data_agent_parallel.agent import baseline_data_agent_parallel
-from config.settings import SHARED_RETRY_CONFIG
+from config.settings import MODEL_SELECTION_ENABLED
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="[%(levelname)s] %(message)s"
-)
 logger = logging.getLogger(__name__)
 logger.info("Instantiated baseline_agent_sequential")
 
@@ -31,6 +22,9 @@ baseline_agent_sequential = SequentialAgent(
     "2)Provide latitude and longitude of the city in strict JSON format"\
     "3) Generate sample energy consumption data and fetch weather data for the given date range in strict JSON format."\
     "4) Fit regression model (model training) and produce tomorrow's energy consumption data (model testing)."\
-    "5) Test the regression equation by running prediction on a sample data point.",
-    sub_agents=[baseline_data_agent_parallel,regression_agent,prediction_agent] 
+    "   Optionally cross-validate alternative models (HDD/CDD, humidity, day-of-week terms) and pick the best."\
+    "5) Apply the registered baseline to the reporting period and compute avoided energy.",
+    sub_agents=[baseline_data_agent_parallel, regression_agent]
+    + ([model_selection_agent] if MODEL_SELECTION_ENABLED else [])
+    + [prediction_agent]
 )
@@ -1,4 +1,4 @@
-"""Subagents for the lead  pipeline."""
-from .baseline_data_agent_parallel.agent import baseline_data_agent_parallel
-from .regression_agent.agent import regression_agent
-from .prediction_agent.agent import prediction_agent
\ No newline at end of file
+"""Subagents for the lead  pipeline.
+
+Agents are built when their agent module is first imported, not with the package.
+"""
@@ -1,16 +1,10 @@
 from google.adk.agents import ParallelAgent
 #from .sub_agents.input_agent.agent import input_agent as InputAgentInstance
 #from .sub_agents.latlong_agent.agent import latlong_agent as LatLongAgentInstance
-from .sub_agents import consumption_data_agent, weather_data_agent
+from .sub_agents.consumption_data_agent.agent import consumption_data_agent
+from .sub_agents.weather_data_agent.agent import weather_data_agent
 import logging
 
-# -------------------------------------------------------------------
-# Logging Setup
-# -------------------------------------------------------------------
-logging.basicConfig(
-    level=logging.INFO,
-    format="[%(levelname)s] %(message)s"
-)
 log = logging.getLogger(__name__)
 log.info("Instantiated baseline_data_agent_parallel")
 
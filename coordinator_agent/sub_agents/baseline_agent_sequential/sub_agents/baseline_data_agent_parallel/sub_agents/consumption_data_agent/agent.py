@@ -2,27 +2,38 @@ import asyncio
 import logging
 import re
 from datetime import date, datetime, timedelta
-from typing import List, Optional
+from typing import AsyncGenerator, Dict, List, Optional
 
-from dateutil.parser import parse, ParserError
+import numpy as np
 from pydantic import BaseModel, Field
-from config.settings import SHARED_RETRY_CONFIG 
+from config.settings import (
+    SHARED_RETRY_CONFIG,
+    CONSUMPTION_FAST_PATH,
+    CONSUMPTION_SOURCE,
+    HOURLY_OCCUPIED_DAYS,
+    HOURLY_OCCUPIED_HOURS,
+    METER_DATA_DIR,
+)
 
-from google.adk.agents import Agent
+from google.adk.agents import Agent, BaseAgent
 from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
 from google.adk.models.google_llm import Gemini
 from google.adk.models import LlmRequest, LlmResponse
-from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
 from google.genai import types
 
+from ....context_summary import context_options
+from ....daily_series import DailySeries
+from ....hourly_series import HourlySeries, hour_of_week, occupied_mask
+from ..weather_data_agent.agent import load_hourly_weather, load_weather_series
+from ..weather_data_agent.weather_client import WeatherFetchError
+from .consumption_generator import generate_consumption, generate_hourly_consumption, get_meter_source, location_seed
+from . import meter_ingest  # Registers the "interval" meter data source
+
 # -------------------------------------------------------------------
 # Logging Setup
 # -------------------------------------------------------------------
-logging.basicConfig(
-    level=logging.INFO,
-    format="[%(levelname)s] %(message)s"
-)
 log = logging.getLogger(__name__)
 log.info("Instantiated consumption_data_agent")
 
@@ -49,6 +60,8 @@ def date_check_before_before_model_call(
         return d < datetime.now().date()
 
     def extract_past_dates(text: str) -> list[date]:
+        from dateutil.parser import parse, ParserError  # only needed once a date check runs
+
         patterns = [
             r"\d{4}-\d{2}-\d{2}",
             r"\d{2}/\d{2}/\d{4}",
@@ -102,23 +115,147 @@ class MultiDayEnergyData(BaseModel):
     daily_records: List[DailyEnergyRecord]
 
 
+# -------------------------------------------------------------------
+# Deterministic consumption (no LLM)
+# -------------------------------------------------------------------
+METER_SOURCE = get_meter_source(CONSUMPTION_SOURCE, METER_DATA_DIR)
+
+
+def to_energy_data(dates: np.ndarray, kwh: np.ndarray) -> DailySeries:
+    """Date/kWh arrays as the energy_consumption_data state value (serializes like MultiDayEnergyData)."""
+    return DailySeries(date_field="record_date", dates=dates, columns={"consumption_kwh": np.round(kwh, 3)})
+
+
+async def build_consumption_data(state: Dict[str, object]) -> DailySeries:
+    """
+    Fill energy_consumption_data for the baseline window in session state.
+
+    Uses the configured meter data source when it has readings for the meter
+    (state key meter_id, falling back to city); otherwise generates synthetic
+    consumption from the location's weather.
+    """
+    start_date = state.get("baseline_from_date")
+    end_date = state.get("baseline_end_date")
+    if not start_date or not end_date:
+        raise ValueError("baseline_from_date and baseline_end_date must be set in session state.")
+    city = str(state.get("city") or "")
+
+    if METER_SOURCE is not None:
+        meter_id = str(state.get("meter_id") or city)
+        readings = await asyncio.to_thread(METER_SOURCE.load_daily, meter_id, start_date, end_date)
+        if readings is not None and len(readings["date"]):
+            return to_energy_data(readings["date"], readings["consumption_kwh"])
+        log.warning(f"No meter readings for '{meter_id}', generating synthetic consumption instead")
+
+    latitude = state.get("latitude")
+    longitude = state.get("longitude")
+    if latitude is None or longitude is None:
+        raise ValueError("latitude and longitude must be set in session state.")
+    weather = (await load_weather_series(latitude, longitude, start_date, end_date)).dropna(["temperature", "humidity"])
+    kwh = generate_consumption(
+        weather.dates, weather["temperature"], weather["humidity"], seed=location_seed(city or f"{latitude},{longitude}")
+    )
+    log.info(f"Generated {len(kwh)} days of synthetic consumption for '{city}'")
+    return to_energy_data(weather.dates, kwh)
+
+
+async def build_hourly_consumption(state: Dict[str, object], weather: Optional[HourlySeries] = None) -> HourlySeries:
+    """
+    Hourly consumption_kwh for the baseline window in session state.
+
+    Same sources as build_consumption_data: the meter data source's hourly
+    readings when it has them, otherwise the synthetic hourly model driven by
+    `weather` (loaded when not given). Not stored in session state.
+    """
+    start_date = state.get("baseline_from_date")
+    end_date = state.get("baseline_end_date")
+    if not start_date or not end_date:
+        raise ValueError("baseline_from_date and baseline_end_date must be set in session state.")
+    city = str(state.get("city") or "")
+
+    if METER_SOURCE is not None:
+        meter_id = str(state.get("meter_id") or city)
+        readings = await asyncio.to_thread(METER_SOURCE.load_hourly, meter_id, start_date, end_date)
+        if readings is not None and len(readings["time"]):
+            return HourlySeries(times=readings["time"], columns={"consumption_kwh": readings["consumption_kwh"]})
+        log.warning(f"No hourly meter readings for '{meter_id}', generating synthetic consumption instead")
+
+    latitude = state.get("latitude")
+    longitude = state.get("longitude")
+    if weather is None:
+        if latitude is None or longitude is None:
+            raise ValueError("latitude and longitude must be set in session state.")
+        weather = await load_hourly_weather(latitude, longitude, start_date, end_date)
+    weather = weather.dropna(["temperature", "humidity"])
+    occupied = occupied_mask(hour_of_week(weather.times), HOURLY_OCCUPIED_HOURS, HOURLY_OCCUPIED_DAYS)
+    kwh = generate_hourly_consumption(
+        weather.times, weather["temperature"], occupied, weather["humidity"],
+        seed=location_seed(city or f"{latitude},{longitude}"),
+    )
+    log.info(f"Generated {len(kwh)} hours of synthetic consumption for '{city}'")
+    return HourlySeries(times=weather.times, columns={"consumption_kwh": kwh})
+
+
+class DeterministicConsumptionAgent(BaseAgent):
+    """Consumption stage that fills energy_consumption_data without calling the LLM."""
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        try:
+            energy_data = await build_consumption_data(ctx.session.state)
+        except (ValueError, WeatherFetchError) as e:
+            log.error(f"Error building consumption data: {e}")
+            yield Event(
+                author=self.name,
+                invocation_id=ctx.invocation_id,
+                branch=ctx.branch,
+                content=types.Content(
+                    role="model",
+                    parts=[types.Part(text=f"Consumption data unavailable: {e}")],
+                ),
+            )
+            return
+
+        yield Event(
+            author=self.name,
+            invocation_id=ctx.invocation_id,
+            branch=ctx.branch,
+            content=types.Content(
+                role="model",
+                parts=[types.Part(
+                    text=f"Prepared {len(energy_data)} days of energy consumption data"
+                    + (f" from {energy_data.dates[0]} to {energy_data.dates[-1]}." if len(energy_data) else ".")
+                )],
+            ),
+            actions=EventActions(state_delta={"energy_consumption_data": energy_data}),
+        )
+
+
 # -------------------------------------------------------------------
 # Agent Definition
 # -------------------------------------------------------------------
-consumption_data_agent = Agent(
+consumption_llm_agent = Agent(
     name="ConsumptionDataAgent",
     model= Gemini (model="gemini-2.5-flash", retry_options=SHARED_RETRY_CONFIG),
     description="Produces daily energy consumption data.",
-    instruction="""
+    **context_options("""
     You MUST read the dates baseline start date from session state key baseline_from_date 
     and baseline end date from state key baseline_end_date before proceeding. You also MUST read city from session state key city.
     Generate energy consumption data between two dates baseline from date and baseline end date including both days for the location denoted by city .
-    """,
+    """),
     output_schema=MultiDayEnergyData,
     output_key="energy_consumption_data",
    #before_model_callback=date_check_before_before_model_call,
 )
 
+consumption_fast_agent = DeterministicConsumptionAgent(
+    name="ConsumptionDataAgent",
+    description="Produces daily energy consumption data from meter readings or a degree-day model.",
+)
+
+consumption_data_agent = consumption_fast_agent if CONSUMPTION_FAST_PATH else consumption_llm_agent
+
 
 # # -------------------------------------------------------------------
 # # Session + Runner Setup
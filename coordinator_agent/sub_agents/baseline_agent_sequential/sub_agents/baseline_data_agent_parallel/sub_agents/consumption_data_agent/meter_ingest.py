@@ -0,0 +1,433 @@
+"""
+Streaming ingestion of interval meter data (15-min / hourly CSV or Parquet).
+
+Files are read as Arrow record batches and rolled up to daily kWh per meter,
+so memory stays flat regardless of file size: besides the daily totals, only
+a short window of recent interval keys per meter is kept for de-duplication.
+
+Timestamps are interval start times. Timezone-aware timestamps are converted
+to `timezone` for day boundaries. Naive timestamps are read as wall-clock time
+in `timezone`; in the repeated hour at the end of daylight saving time the
+second reading of a wall-clock time is kept as the second pass of that hour.
+Any other repeated (meter, instant) reading is a duplicate and is dropped.
+Days with fewer intervals than expected (23/24/25 hours worth) are scaled up
+to a full day when coverage is at least `min_coverage`, and dropped otherwise.
+
+With `IngestOptions.hourly` the same pass rolls up to local wall-clock hours
+instead (`IntervalAggregator.hourly`), with the same coverage rule per hour.
+The repeated hour at the end of daylight saving time holds both passes.
+"""
+import csv
+import logging
+from dataclasses import dataclass, field, replace
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+from config.settings import METER_TIMEZONE
+
+from .consumption_generator import MeterDataSource, METER_SOURCES
+
+log = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 86400
+SECONDS_PER_HOUR = 3600
+DEFAULT_METER = "meter"
+
+
+@dataclass
+class IngestOptions:
+    timestamp_column: str = "timestamp"
+    value_column: str = "kwh"
+    meter_column: Optional[str] = "meter_id"
+    timezone: Optional[str] = None          # None: timestamps are used as-is (no DST)
+    interval_minutes: Optional[int] = None  # None: inferred from the first batch
+    min_coverage: float = 0.9
+    fill_gaps: bool = True
+    batch_rows: int = 262144
+    dedupe_window_hours: int = 48
+    hourly: bool = False                    # Roll up to local hours instead of days
+
+
+@dataclass
+class IngestStats:
+    rows: int = 0
+    null_rows: int = 0
+    duplicate_rows: int = 0
+    dst_repeated_rows: int = 0
+    dropped_days: int = 0
+    filled_days: int = 0
+
+
+@dataclass
+class _Totals:
+    """Running per-(meter, day or hour) sums; this is the only state that grows, and only with time."""
+    kwh: Dict[int, float] = field(default_factory=dict)
+    count: Dict[int, int] = field(default_factory=dict)
+
+
+def iter_interval_batches(path: str, options: IngestOptions) -> Iterator[pa.RecordBatch]:
+    """Yield record batches from a CSV or Parquet interval file without loading it whole."""
+    columns = [options.timestamp_column, options.value_column]
+    if options.meter_column:
+        columns.append(options.meter_column)
+    if str(path).endswith(".parquet"):
+        parquet_file = pq.ParquetFile(path)
+        available = set(parquet_file.schema_arrow.names)
+        yield from parquet_file.iter_batches(
+            batch_size=options.batch_rows, columns=[c for c in columns if c in available]
+        )
+        return
+    with open(path, encoding="utf-8", newline="") as f:
+        header = next(csv.reader(f), [])
+    column_types = {options.value_column: pa.float64()}
+    if options.meter_column and options.meter_column in header:
+        column_types[options.meter_column] = pa.string()
+    reader = pacsv.open_csv(
+        path,
+        read_options=pacsv.ReadOptions(block_size=1 << 22),
+        convert_options=pacsv.ConvertOptions(
+            include_columns=[c for c in columns if c in header],
+            column_types=column_types,
+        ),
+    )
+    yield from reader
+
+
+class IntervalAggregator:
+    """Fold interval record batches into daily kWh per meter."""
+
+    def __init__(self, options: Optional[IngestOptions] = None):
+        self.options = options or IngestOptions()
+        self.zone = ZoneInfo(self.options.timezone) if self.options.timezone else None
+        self.stats = IngestStats()
+        self.meter_ids: List[str] = []
+        self._meter_index: Dict[str, int] = {}
+        self._totals = _Totals()
+        self._recent_keys = np.empty(0, dtype=np.int64)
+        self._meter_max_minute = np.empty(0, dtype=np.int64)
+        self.interval_minutes = self.options.interval_minutes
+
+    # ---------------------------------------------------------------
+    # Batch processing
+    # ---------------------------------------------------------------
+    def add_batch(self, batch: pa.RecordBatch) -> None:
+        opts = self.options
+        self.stats.rows += batch.num_rows
+        ts = batch.column(batch.schema.get_field_index(opts.timestamp_column))
+        values = batch.column(batch.schema.get_field_index(opts.value_column)).cast(pa.float64())
+        meter_idx = self._meter_codes(batch, opts)
+
+        if not pa.types.is_timestamp(ts.type):
+            ts = ts.cast(pa.timestamp("s"))
+        instant, late, local = self._instants(ts)
+
+        valid = ~(pc.is_null(ts).to_numpy(zero_copy_only=False) | pc.is_null(values).to_numpy(zero_copy_only=False))
+        kwh = values.fill_null(np.nan).to_numpy(zero_copy_only=False)
+        valid &= np.isfinite(kwh)
+        self.stats.null_rows += int((~valid).sum())
+        meter_idx, instant, local, kwh = meter_idx[valid], instant[valid], local[valid], kwh[valid]
+        if late is not None:
+            late = late[valid]
+        if not len(kwh):
+            return
+
+        if self.interval_minutes is None:
+            self.interval_minutes = self._infer_interval(meter_idx, instant)
+
+        keep, instant = self._dedupe(meter_idx, instant, late)
+        meter_idx, local, kwh = meter_idx[keep], local[keep], kwh[keep]
+
+        # Aggregate to (meter, local day or hour) with one bincount per column.
+        bucket = SECONDS_PER_HOUR if opts.hourly else SECONDS_PER_DAY
+        group = (meter_idx.astype(np.int64) << 20) | np.floor_divide(local, bucket)
+        groups, inverse = np.unique(group, return_inverse=True)
+        sums = np.bincount(inverse, weights=kwh)
+        counts = np.bincount(inverse)
+        totals = self._totals
+        for g, s, c in zip(groups.tolist(), sums.tolist(), counts.tolist()):
+            totals.kwh[g] = totals.kwh.get(g, 0.0) + s
+            totals.count[g] = totals.count.get(g, 0) + c
+
+    def _meter_codes(self, batch: pa.RecordBatch, opts: IngestOptions) -> np.ndarray:
+        if not opts.meter_column or opts.meter_column not in batch.schema.names:
+            return np.full(batch.num_rows, self._meter_code(DEFAULT_METER), dtype=np.int64)
+        encoded = pc.dictionary_encode(batch.column(batch.schema.get_field_index(opts.meter_column)).cast(pa.string()))
+        # Map the batch dictionary (a handful of meters) to global meter indexes.
+        mapping = np.array(
+            [self._meter_code(str(m)) for m in encoded.dictionary.to_pylist()] or [0], dtype=np.int64
+        )
+        return mapping[encoded.indices.fill_null(0).to_numpy(zero_copy_only=False)]
+
+    def _meter_code(self, meter_id: str) -> int:
+        code = self._meter_index.get(meter_id)
+        if code is None:
+            code = len(self.meter_ids)
+            self._meter_index[meter_id] = code
+            self.meter_ids.append(meter_id)
+            self._meter_max_minute = np.append(self._meter_max_minute, np.iinfo(np.int64).min)
+        return code
+
+    def _instants(self, ts: pa.Array):
+        """
+        Return (instant, late, local) epoch seconds for each timestamp.
+
+        instant is the absolute time, local the wall-clock time used for day
+        boundaries. late is only set for naive timestamps with a timezone: the
+        standard-time instant of ambiguous wall-clock times (equal to instant elsewhere).
+        """
+        seconds = lambda a: a.cast(pa.timestamp("s", tz=a.type.tz)).cast(pa.int64()).fill_null(0).to_numpy(zero_copy_only=False)
+        if ts.type.tz is not None:
+            if self.zone is not None:
+                ts = ts.cast(pa.timestamp(ts.type.unit, tz=self.options.timezone))
+            return seconds(ts), None, seconds(pc.local_timestamp(ts))
+        local = seconds(ts)
+        if self.zone is None:
+            return local, None, local
+        late = seconds(pc.assume_timezone(ts, self.options.timezone, ambiguous="latest", nonexistent="earliest"))
+        early = seconds(pc.assume_timezone(ts, self.options.timezone, ambiguous="earliest", nonexistent="earliest"))
+        return early, late, local
+
+    def _infer_interval(self, meter_idx: np.ndarray, instant: np.ndarray) -> int:
+        first = np.unique(instant[meter_idx == meter_idx[0]])
+        steps = np.diff(first)
+        steps = steps[steps > 0]
+        minutes = int(np.median(steps) // 60) if len(steps) else 15
+        log.info(f"Inferred meter interval of {minutes} minutes")
+        return max(minutes, 1)
+
+    def _dedupe(self, meter_idx: np.ndarray, instant: np.ndarray, late: Optional[np.ndarray]):
+        """Drop repeated (meter, instant) readings, moving DST repeated-hour readings to the second pass."""
+        key = (meter_idx << 32) | (instant // 60)
+
+        if late is not None:
+            ambiguous = late != instant
+            if ambiguous.any():
+                # Second occurrence of an ambiguous wall-clock time -> the later (standard time) instant.
+                order = np.argsort(key, kind="stable")
+                sorted_key = key[order]
+                repeat = np.zeros(len(key), dtype=bool)
+                repeat[order[1:]] = sorted_key[1:] == sorted_key[:-1]
+                seen_before = np.isin(key, self._recent_keys)
+                move = ambiguous & (repeat | seen_before)
+                instant = np.where(move, late, instant)
+                key = (meter_idx << 32) | (instant // 60)
+                self.stats.dst_repeated_rows += int(move.sum())
+
+        _, first = np.unique(key, return_index=True)
+        keep = np.zeros(len(key), dtype=bool)
+        keep[first] = True
+        keep &= ~np.isin(key, self._recent_keys)
+        self.stats.duplicate_rows += int(len(key) - keep.sum())
+
+        # Remember only a sliding window of keys per meter for cross-batch duplicates.
+        minute = instant // 60
+        np.maximum.at(self._meter_max_minute, meter_idx, minute)
+        window = self.options.dedupe_window_hours * 60
+        recent = np.concatenate([self._recent_keys, key[keep]])
+        recent_meter = recent >> 32
+        recent_minute = recent & 0xFFFFFFFF
+        self._recent_keys = recent[recent_minute >= self._meter_max_minute[recent_meter] - window]
+        return keep, instant
+
+    # ---------------------------------------------------------------
+    # Results
+    # ---------------------------------------------------------------
+    def expected_intervals(self, day: date) -> int:
+        """Intervals in a local day: 23, 24 or 25 hours worth depending on DST."""
+        minutes = 1440
+        if self.zone is not None:
+            start = datetime(day.year, day.month, day.day, tzinfo=self.zone)
+            end = start + timedelta(days=1)
+            minutes = int((end.timestamp() - start.timestamp()) // 60)
+        return max(minutes // (self.interval_minutes or 15), 1)
+
+    def daily(self) -> Dict[str, Dict[str, np.ndarray]]:
+        """
+        Daily totals per meter.
+
+        Returns:
+            {meter_id: {"date": datetime64[D], "consumption_kwh": float64, "coverage": float64}}
+        """
+        opts = self.options
+        if opts.hourly:
+            raise ValueError("daily() needs an aggregator built with hourly=False; use hourly()")
+        result = {}
+        for meter, groups in self._groups_per_meter().items():
+            days = np.array([g & ((1 << 20) - 1) for g in groups], dtype="datetime64[D]")
+            kwh = np.array([self._totals.kwh[g] for g in groups])
+            counts = np.array([self._totals.count[g] for g in groups], dtype=np.float64)
+            expected = np.array([self.expected_intervals(d) for d in days.astype(object)], dtype=np.float64)
+            coverage = counts / expected
+            keep = coverage >= opts.min_coverage
+            self.stats.dropped_days += int((~keep).sum())
+            if opts.fill_gaps:
+                partial = keep & (coverage < 1.0)
+                self.stats.filled_days += int(partial.sum())
+                kwh = np.where(partial, kwh / coverage, kwh)
+            result[self.meter_ids[meter]] = {
+                "date": days[keep],
+                "consumption_kwh": kwh[keep],
+                "coverage": np.minimum(coverage[keep], 1.0),
+            }
+        return result
+
+    def hourly(self) -> Dict[str, Dict[str, np.ndarray]]:
+        """
+        Hourly totals per meter (aggregator built with hourly=True).
+
+        Returns:
+            {meter_id: {"time": datetime64[h], "consumption_kwh": float32, "coverage": float32}}
+        """
+        opts = self.options
+        if not opts.hourly:
+            raise ValueError("hourly() needs an aggregator built with hourly=True")
+        expected = max(60 // (self.interval_minutes or 15), 1)
+        result = {}
+        for meter, groups in self._groups_per_meter().items():
+            hours = np.array([g & ((1 << 20) - 1) for g in groups], dtype="datetime64[h]")
+            kwh = np.array([self._totals.kwh[g] for g in groups])
+            coverage = np.array([self._totals.count[g] for g in groups], dtype=np.float64) / expected
+            keep = coverage >= opts.min_coverage
+            self.stats.dropped_days += int((~keep).sum())
+            if opts.fill_gaps:
+                partial = keep & (coverage < 1.0)
+                self.stats.filled_days += int(partial.sum())
+                kwh = np.where(partial, kwh / coverage, kwh)
+            result[self.meter_ids[meter]] = {
+                "time": hours[keep],
+                "consumption_kwh": kwh[keep].astype(np.float32),
+                "coverage": np.minimum(coverage[keep], 1.0).astype(np.float32),
+            }
+        return result
+
+    def _groups_per_meter(self) -> Dict[int, list]:
+        per_meter: Dict[int, list] = {}
+        for g in sorted(self._totals.kwh):
+            per_meter.setdefault(g >> 20, []).append(g)
+        return per_meter
+
+
+def ingest_interval_file(path: str, options: Optional[IngestOptions] = None) -> Dict[str, Dict[str, np.ndarray]]:
+    """Stream an interval file and return daily kWh per meter (see IntervalAggregator.daily)."""
+    aggregator = IntervalAggregator(options)
+    for batch in iter_interval_batches(path, aggregator.options):
+        aggregator.add_batch(batch)
+    log.info(f"Ingested {path}: {aggregator.stats}")
+    return aggregator.daily()
+
+
+def write_daily_csvs(daily: Dict[str, Dict[str, np.ndarray]], out_dir: str) -> List[Path]:
+    """Write one `<meter_id>.csv` per meter in the layout read by CsvMeterDataSource."""
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for meter_id, columns in daily.items():
+        path = out / f"{''.join(ch if ch.isalnum() or ch in '-_.' else '_' for ch in meter_id)}.csv"
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["record_date", "consumption_kwh", "coverage"])
+            writer.writerows(zip(
+                columns["date"].astype(str).tolist(),
+                np.round(columns["consumption_kwh"], 4).tolist(),
+                np.round(columns["coverage"], 4).tolist(),
+            ))
+        paths.append(path)
+    return paths
+
+
+def meter_columns(per_meter: Dict[str, Dict[str, np.ndarray]], meter_id: str, path: Path) -> Optional[Dict[str, np.ndarray]]:
+    """
+    The requested meter's columns. A single-meter file is taken whatever its id
+    column says; a multi-meter file without the meter gives None.
+    """
+    if meter_id in per_meter:
+        return per_meter[meter_id]
+    if len(per_meter) == 1:
+        return next(iter(per_meter.values()))
+    log.warning(f"Meter '{meter_id}' is not among the {len(per_meter)} meters in {path}")
+    return None
+
+
+class IntervalMeterDataSource(MeterDataSource):
+    """Interval readings from `<directory>/<meter_id>.parquet` or `.csv`, rolled up to daily on load."""
+
+    def __init__(self, directory: str, options: Optional[IngestOptions] = None):
+        self.directory = Path(directory)
+        self.options = options or IngestOptions(timezone=METER_TIMEZONE)
+
+    def _path(self, meter_id: str) -> Optional[Path]:
+        safe_id = "".join(ch if ch.isalnum() or ch in "-_." else "_" for ch in meter_id.strip())
+        for suffix in (".parquet", ".csv"):
+            path = self.directory / f"{safe_id}{suffix}"
+            if path.exists():
+                return path
+        log.info(f"No interval meter file for meter '{meter_id}' in {self.directory}")
+        return None
+
+    def load_daily(self, meter_id: str, start_date: str, end_date: str) -> Optional[Dict[str, np.ndarray]]:
+        path = self._path(meter_id)
+        if path is None:
+            return None
+        daily = ingest_interval_file(str(path), self.options)
+        if not daily:
+            return None
+        columns = meter_columns(daily, meter_id, path)
+        if columns is None:
+            return None
+        mask = (columns["date"] >= np.datetime64(start_date)) & (columns["date"] <= np.datetime64(end_date))
+        return {"date": columns["date"][mask], "consumption_kwh": columns["consumption_kwh"][mask]}
+
+    def load_hourly(self, meter_id: str, start_date: str, end_date: str) -> Optional[Dict[str, np.ndarray]]:
+        path = self._path(meter_id)
+        if path is None:
+            return None
+        aggregator = IntervalAggregator(replace(self.options, hourly=True))
+        for batch in iter_interval_batches(str(path), aggregator.options):
+            aggregator.add_batch(batch)
+        hourly = aggregator.hourly()
+        if not hourly:
+            return None
+        columns = meter_columns(hourly, meter_id, path)
+        if columns is None:
+            return None
+        days = columns["time"].astype("datetime64[D]")
+        mask = (days >= np.datetime64(start_date)) & (days <= np.datetime64(end_date))
+        return {"time": columns["time"][mask], "consumption_kwh": columns["consumption_kwh"][mask]}
+
+
+METER_SOURCES["interval"] = IntervalMeterDataSource
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Roll interval meter data up to daily kWh per meter.")
+    parser.add_argument("--input", required=True, help="Interval CSV or Parquet file")
+    parser.add_argument("--output_dir", required=True, help="Directory for per-meter daily CSV files")
+    parser.add_argument("--timestamp_column", default="timestamp")
+    parser.add_argument("--value_column", default="kwh")
+    parser.add_argument("--meter_column", default="meter_id")
+    parser.add_argument("--timezone", default=None, help="IANA timezone for day boundaries, e.g. America/New_York")
+    parser.add_argument("--interval_minutes", type=int, default=None)
+    parser.add_argument("--min_coverage", type=float, default=0.9)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+    daily = ingest_interval_file(args.input, IngestOptions(
+        timestamp_column=args.timestamp_column,
+        value_column=args.value_column,
+        meter_column=args.meter_column or None,
+        timezone=args.timezone,
+        interval_minutes=args.interval_minutes,
+        min_coverage=args.min_coverage,
+    ))
+    for path in write_daily_csvs(daily, args.output_dir):
+        print(path)
@@ -1,11 +1,33 @@
 from google.adk.agents import Agent
 from google.adk.models.google_llm import Gemini
+from google.adk.tools.tool_context import ToolContext
 import logging
-import requests
 from typing import Any, Dict, List
 from datetime import date # Changed from datetime imported date directly
 from pydantic import BaseModel, Field
-from config.settings import SHARED_RETRY_CONFIG 
+from config.settings import (
+    CONTEXT_PRUNING,
+    SHARED_RETRY_CONFIG,
+    WEATHER_ARCHIVE_DIR,
+    WEATHER_CACHE_DIR,
+    WEATHER_CACHE_ENABLED,
+    WEATHER_CACHE_FINAL_AFTER_DAYS,
+    WEATHER_CACHE_GRID_DEG,
+    WEATHER_CACHE_MAX_BYTES,
+    WEATHER_CACHE_PROVISIONAL_TTL_S,
+    WEATHER_CHUNK_DAYS,
+    WEATHER_HTTP_TIMEOUT,
+    WEATHER_MAX_CONCURRENCY,
+    WEATHER_MAX_CONNECTIONS,
+    WEATHER_RETRY_ATTEMPTS,
+)
+from resilience import BREAKERS, LIMITERS
+from ....context_summary import context_options
+from ....daily_series import DailySeries
+from ....hourly_series import HourlySeries
+from .weather_archive import WeatherArchive
+from .weather_cache import HourlyWeatherCache, WeatherCache
+from .weather_client import AsyncWeatherClient, WeatherFetchError
 
 
 # Assuming this log object exists in your file
@@ -28,65 +50,152 @@ class MultiDayWeatherData(BaseModel):
     # Renamed the field to match what the function will now return
     daily_records: List[DailyWeatherRecord] = Field(..., description="A list of daily weather records.")
 
+WEATHER_FIELDS = ["temperature", "humidity", "dewpoint"]
+
 # -------------------------------------------------------------------
-def get_weather_daily(geo_location:Dict[str, float], start_date: str, end_date: str) -> Dict[str, Any]:
+OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
+
+WEATHER_CLIENT = AsyncWeatherClient(
+    base_url=OPEN_METEO_URL,
+    timeout=WEATHER_HTTP_TIMEOUT,
+    max_connections=WEATHER_MAX_CONNECTIONS,
+    max_concurrency=WEATHER_MAX_CONCURRENCY,
+    chunk_days=WEATHER_CHUNK_DAYS,
+    attempts=WEATHER_RETRY_ATTEMPTS,
+    limiter=LIMITERS["open_meteo"],
+    breaker=BREAKERS["open_meteo"],
+)
+
+WEATHER_CACHE = WeatherCache(
+    cache_dir=WEATHER_CACHE_DIR,
+    grid_deg=WEATHER_CACHE_GRID_DEG,
+    max_bytes=WEATHER_CACHE_MAX_BYTES,
+    final_after_days=WEATHER_CACHE_FINAL_AFTER_DAYS,
+    provisional_ttl_s=WEATHER_CACHE_PROVISIONAL_TTL_S,
+)
+
+# Opened once per process; its pages are shared with every other process mapping it.
+WEATHER_ARCHIVE = WeatherArchive.open(WEATHER_ARCHIVE_DIR) if WEATHER_ARCHIVE_DIR else None
+
+HOURLY_WEATHER_CACHE = HourlyWeatherCache(
+    cache_dir=WEATHER_CACHE_DIR,
+    grid_deg=WEATHER_CACHE_GRID_DEG,
+    max_bytes=WEATHER_CACHE_MAX_BYTES,
+    final_after_days=WEATHER_CACHE_FINAL_AFTER_DAYS,
+    provisional_ttl_s=WEATHER_CACHE_PROVISIONAL_TTL_S,
+)
+
+
+async def load_weather_columns(latitude: float, longitude: float, start_date: str, end_date: str) -> Dict[str, list]:
+    """
+    Daily weather for [start_date, end_date] as columns, read through the weather cache.
+
+    Returns:
+        dict with "date", "temperature", "humidity" and "dewpoint" lists.
+
+    Raises:
+        WeatherFetchError: if the upstream fetch fails.
+    """
+    if WEATHER_CACHE_ENABLED:
+        columns = await WEATHER_CACHE.aget_or_fetch(
+            latitude, longitude, start_date, end_date, WEATHER_CLIENT.fetch_daily
+        )
+        log.info(f"Weather cache stats: {WEATHER_CACHE.stats()}")
+        return columns
+    return await WEATHER_CLIENT.fetch_daily(latitude, longitude, start_date, end_date)
+
+
+async def load_weather_series(latitude: float, longitude: float, start_date: str, end_date: str) -> DailySeries:
+    """
+    Daily weather for [start_date, end_date] as a DailySeries; missing values are NaN.
+
+    Windows covered by the weather archive are sliced from it without network access.
+    """
+    if WEATHER_ARCHIVE is not None:
+        series = WEATHER_ARCHIVE.window(latitude, longitude, start_date, end_date)
+        if series is not None:
+            return series
+    columns = await load_weather_columns(latitude, longitude, start_date, end_date)
+    return DailySeries.from_columns(columns, fields=WEATHER_FIELDS)
+
+
+async def load_hourly_weather(latitude: float, longitude: float, start_date: str, end_date: str) -> HourlySeries:
+    """Hourly weather (local time) for the days [start_date, end_date] as float32 columns."""
+    if WEATHER_CACHE_ENABLED:
+        columns = await HOURLY_WEATHER_CACHE.aget_or_fetch(
+            latitude, longitude, start_date, end_date, WEATHER_CLIENT.fetch_hourly
+        )
+    else:
+        columns = await WEATHER_CLIENT.fetch_hourly(latitude, longitude, start_date, end_date)
+    return HourlySeries.from_columns(columns, fields=WEATHER_FIELDS)
+
+
+async def get_weather_daily(geo_location:Dict[str, float], start_date: str, end_date: str) -> Dict[str, Any]:
     """
     Fetch daily weather data and format it to match the MultiDayWeatherData schema.
     """
 
     try:
-        url = "https://api.open-meteo.com/v1/forecast"
-
-        params = {
-            "latitude": geo_location.get("latitude"),
-            "longitude": geo_location.get("longitude"),
-            "start_date": start_date,
-            "end_date": end_date,
-            "daily": [
-                "temperature_2m_mean",
-                "relative_humidity_2m_mean",
-                "dew_point_2m_mean"
-            ],
-            "timezone": "auto"
-        }
-        log.info(f"Fetching weather data with params: {params}")
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        data = response.json()
-
-        # Extract arrays
-        dates = data["daily"]["time"]
-        temps = data["daily"]["temperature_2m_mean"]
-        hums = data["daily"]["relative_humidity_2m_mean"]
-        dews = data["daily"]["dew_point_2m_mean"]
-
-        weather_records = []
-        for d, t, h, dp in zip(dates, temps, hums, dews):
-            record = DailyWeatherRecord(
-                date=d,
-                temperature=t,
-                humidity=h,
-                dewpoint=dp
-            )
-            weather_records.append(record.model_dump()) # Convert Pydantic object back to a dictionary
-
-        
+        series = await load_weather_series(
+            geo_location.get("latitude"), geo_location.get("longitude"), start_date, end_date
+        )
+        # Validated as columns in one pass; days with missing values are dropped.
+        weather_records = series.dropna().to_records()
+
         return {
+            "status": "success",
             "daily_records": weather_records
         }
 
-    except Exception as e:
+    except (WeatherFetchError, ValueError) as e:
         log.error(f"Error fetching weather data: {e}")
         return {
+            "status": "error",
+            "message": str(e),
             "daily_records": [] # Return an empty list if schema must be matched
         }
 
 
+async def fetch_baseline_weather(tool_context: ToolContext) -> Dict[str, Any]:
+    """
+    Fetch daily weather for the location and baseline window in session state.
+
+    The series is saved to session state key `weather_data`; only its size and
+    date range are returned.
+
+    Returns:
+        dict with status and either days, from_date and to_date or an error message.
+    """
+    state = tool_context.state
+    latitude, longitude = state.get("latitude"), state.get("longitude")
+    start_date, end_date = state.get("baseline_from_date"), state.get("baseline_end_date")
+    if latitude is None or longitude is None or not start_date or not end_date:
+        return {
+            "status": "error",
+            "message": "latitude, longitude, baseline_from_date and baseline_end_date must be set in session state.",
+        }
+    try:
+        series = (await load_weather_series(latitude, longitude, start_date, end_date)).dropna()
+    except (WeatherFetchError, ValueError) as e:
+        log.error(f"Error fetching weather data: {e}")
+        return {"status": "error", "message": str(e)}
+
+    tool_context.state["weather_data"] = series
+    if not len(series):
+        return {"status": "error", "message": f"No weather data between {start_date} and {end_date}."}
+    return {
+        "status": "success",
+        "days": len(series),
+        "from_date": str(series.dates[0]),
+        "to_date": str(series.dates[-1]),
+    }
+
+
 # -------------------------------------------------------------------
 # Agent Definition
 # -------------------------------------------------------------------
 
-weather_data_agent = Agent(
+weather_records_agent = Agent(
     name="WeatherDataAgent",
     # https://ai.google.dev/gemini-api/docs/models
     model= Gemini (model="gemini-2.5-flash", retry_options=SHARED_RETRY_CONFIG),
@@ -98,10 +207,26 @@ weather_data_agent = Agent(
     The output must conform strictly to the provided JSON schema.
     Generate 1 record per day. weather data points include date, temperature, relative humidity, and dew point.
     To fetch the weather data,use get_weather_daily tool.
-    The tool returns a dictionary with keys 'status' and either 'weather_data' (on success) or 'message' (on error).
+    The tool returns a dictionary with keys 'status' and 'daily_records', plus 'message' on error.
     No explaination required. Do not ask any quetsions
     """,
       tools=[get_weather_daily],
       output_schema=MultiDayWeatherData,
       output_key="weather_data",
 )
+
+# With CONTEXT_PRUNING the records go straight to session state; the LLM never sees or repeats them.
+weather_pruned_agent = Agent(
+    name="WeatherDataAgent",
+    model= Gemini (model="gemini-2.5-flash", retry_options=SHARED_RETRY_CONFIG),
+    description="An agent that provides historic weather data of a location",
+    tools=[fetch_baseline_weather],
+    **context_options("""
+    Fetch the daily weather (temperature, relative humidity and dew point) for the location and
+    baseline window given below by calling the fetch_baseline_weather tool. The tool saves the data
+    to session state itself. Reply with one sentence giving the number of days and the date range
+    it returned, or its error message. No explanation required. Do not ask any questions.
+    """),
+)
+
+weather_data_agent = weather_pruned_agent if CONTEXT_PRUNING else weather_records_agent
@@ -0,0 +1,347 @@
+"""
+Memory-mapped gridded daily weather archive.
+
+An archive is a directory holding:
+ - one .npy array per weather field, shaped (lat cells, lon cells, days) in C order;
+ - coverage.npy, a (lat cells, lon cells) mask of the cells that have data;
+ - archive.json, describing the grid (cell size, first cell, shape) and the first day.
+
+Cells are integer grid cells as in the weather cache (`grid_cell`), at the
+archive's own cell size. The arrays are opened with
+np.load(mmap_mode="r"). A site's days are contiguous within its cell, so a
+lookup is an index computation and a slice: the result is a view of the
+mapped file, and only the pages it touches are read. Read-only mappings of the
+same files share the OS page cache, so every process that opens the archive
+(batch workers, server workers, joblib pools) uses the same physical pages.
+
+A window is served only if its cell has data, its days lie inside the
+archive and none of its values are missing (NaN). Otherwise the caller falls
+back to the weather cache and Open-Meteo. Archives are float64 by default.
+float32 archives take half the disk; their values are read back at float32's
+7 significant digits, so 1.1 is returned as 1.1 rather than 1.10000002.
+
+`build_archive` creates an archive from downloaded files without holding them
+all in memory. A first pass reads the coordinates and dates to size the grid,
+and a second pass writes the values file by file. Cells without data are never
+written, so the arrays stay sparse on disk. Accepted inputs:
+    .csv / .parquet   long tables with latitude, longitude, date (or time) and the
+                      weather fields; Open-Meteo variable names such as
+                      temperature_2m_mean are accepted as well
+    .json             saved Open-Meteo responses with a "daily" block, either one
+                      location or a list of them (multi-location requests)
+
+    python build_weather_archive.py --output .cache/weather_archive --grid-deg 0.25 downloads/*.csv
+"""
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pyarrow.csv as pv
+import pyarrow.parquet as pq
+
+from ....daily_series import DailySeries
+from .weather_cache import WEATHER_COLUMNS
+from .weather_client import DAILY_VARIABLES
+
+log = logging.getLogger(__name__)
+
+META_FILE = "archive.json"
+COVERAGE_FILE = "coverage.npy"
+ARCHIVE_VERSION = 1
+# Column names accepted for the coordinates and the day, besides the canonical ones.
+COLUMN_ALIASES = {"latitude": ("lat",), "longitude": ("lon", "lng"), "date": ("time", "record_date")}
+
+
+def _widen(values: np.ndarray) -> np.ndarray:
+    """Values as float64; float32 ones rounded to 7 significant digits so they read back as stored."""
+    if values.dtype == np.float64:
+        return values
+    values = values.astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = 10.0 ** (6 - np.floor(np.log10(np.abs(values))))
+        rounded = np.round(values * scale) / scale
+    return np.where(np.isfinite(rounded), rounded, values)
+
+
+class WeatherArchive:
+    """Read-only, memory-mapped view of a built archive."""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        with open(self.path / META_FILE, encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != ARCHIVE_VERSION:
+            raise ValueError(f"Unsupported weather archive version {self.meta.get('version')} in {path}")
+        self.grid_deg = float(self.meta["grid_deg"])
+        self.first_cell = np.array(self.meta["first_cell"], dtype=np.int64)
+        self.shape = tuple(self.meta["shape"])
+        self.start = np.datetime64(self.meta["start_date"], "D")
+        self.fields = list(self.meta["fields"])
+        self.coverage = np.load(self.path / COVERAGE_FILE, mmap_mode="r")
+        self.arrays = {name: np.load(self.path / f"{name}.npy", mmap_mode="r") for name in self.fields}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def open(cls, path: str) -> Optional["WeatherArchive"]:
+        """The archive at path, or None (with a warning) if there is none."""
+        if not (Path(path) / META_FILE).exists():
+            log.warning(f"No weather archive at '{path}'; weather comes from the cache and Open-Meteo")
+            return None
+        archive = cls(path)
+        log.info(
+            f"Weather archive {path}: {int(archive.coverage.sum())} cells at {archive.grid_deg}°, "
+            f"{archive.shape[2]} days from {archive.start}"
+        )
+        return archive
+
+    @property
+    def end(self) -> np.datetime64:
+        return self.start + np.timedelta64(self.shape[2] - 1, "D")
+
+    # ---------------------------------------------------------------
+    # Lookups
+    # ---------------------------------------------------------------
+    def cells(self, latitudes: Sequence[float], longitudes: Sequence[float]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Archive row/column index of each site and whether its cell has data."""
+        lat = np.round(np.asarray(latitudes, dtype=np.float64) / self.grid_deg).astype(np.int64) - self.first_cell[0]
+        lon = np.round(np.asarray(longitudes, dtype=np.float64) / self.grid_deg).astype(np.int64) - self.first_cell[1]
+        inside = (lat >= 0) & (lat < self.shape[0]) & (lon >= 0) & (lon < self.shape[1])
+        lat, lon = np.where(inside, lat, 0), np.where(inside, lon, 0)
+        covered = inside & np.asarray(self.coverage[lat, lon], dtype=bool)
+        return lat, lon, covered
+
+    def _days(self, start_date: str, end_date: str) -> Tuple[int, int]:
+        first = int((np.datetime64(start_date[:10], "D") - self.start).astype(np.int64))
+        last = int((np.datetime64(end_date[:10], "D") - self.start).astype(np.int64))
+        if last < first:
+            raise ValueError(f"end_date {end_date} is before start_date {start_date}")
+        return first, last + 1
+
+    def window(self, latitude: float, longitude: float, start_date: str, end_date: str) -> Optional[DailySeries]:
+        """
+        Daily weather for [start_date, end_date] at the site's cell, or None if
+        the archive does not cover it or any of its values are missing.
+
+        With a float64 archive the columns are views of the mapped arrays, held
+        by the DailySeries without a copy.
+        """
+        first, stop = self._days(start_date, end_date)
+        lat, lon, covered = self.cells([latitude], [longitude])
+        if not covered[0] or first < 0 or stop > self.shape[2]:
+            self.misses += 1
+            return None
+        columns = {name: self.arrays[name][lat[0], lon[0], first:stop] for name in self.fields}
+        if not all(np.isfinite(values).all() for values in columns.values()):
+            self.misses += 1
+            return None
+        self.hits += 1
+        columns = {name: _widen(values) for name, values in columns.items()}
+        dates = self.start + np.arange(first, stop)
+        return DailySeries(dates=dates, columns=columns)
+
+    def windows(
+        self, latitudes: Sequence[float], longitudes: Sequence[float], start_date: str, end_date: str
+    ) -> Dict[str, np.ndarray]:
+        """
+        (sites, days) arrays of every field for many sites at once.
+
+        Sites outside the archive, and days before or after it, are NaN. Also
+        returns "covered": whether each site's cell has data for the whole
+        window with no missing values.
+        """
+        first, stop = self._days(start_date, end_date)
+        lat, lon, covered = self.cells(latitudes, longitudes)
+        lo, hi = max(first, 0), min(stop, self.shape[2])
+        sites = np.flatnonzero(covered)
+        result: Dict[str, np.ndarray] = {}
+        for name in self.fields:
+            values = np.full((len(lat), stop - first), np.nan)
+            if hi > lo and len(sites):
+                values[sites, lo - first:hi - first] = _widen(self.arrays[name][lat[sites], lon[sites], lo:hi])
+            result[name] = values
+        complete = np.all([np.isfinite(result[name]).all(axis=1) for name in self.fields], axis=0)
+        result["covered"] = covered & (first >= 0) & (stop <= self.shape[2]) & complete
+        return result
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+# -------------------------------------------------------------------
+# Building
+# -------------------------------------------------------------------
+def _pick(names: Iterable[str], wanted: str, fields: Sequence[str]) -> Optional[str]:
+    """The input column for canonical name `wanted` (case-insensitive, aliases and Open-Meteo names)."""
+    lookup = {n.lower(): n for n in names}
+    candidates = (wanted,) + COLUMN_ALIASES.get(wanted, ())
+    if wanted in fields and wanted in DAILY_VARIABLES:
+        candidates += (DAILY_VARIABLES[wanted],)
+    for candidate in candidates:
+        if candidate in lookup:
+            return lookup[candidate]
+    return None
+
+
+def _day_column(values: np.ndarray) -> np.ndarray:
+    values = np.asarray(values)
+    if values.dtype.kind == "M":
+        return values.astype("datetime64[D]")
+    return np.array([str(v)[:10] for v in values], dtype="datetime64[D]")
+
+
+def _valid_rows(table: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    keep = np.isfinite(table["latitude"]) & np.isfinite(table["longitude"]) & ~np.isnat(table["date"])
+    return table if keep.all() else {name: values[keep] for name, values in table.items()}
+
+
+def _read_json(path: Path, fields: Sequence[str]) -> Dict[str, np.ndarray]:
+    with open(path, encoding="utf-8") as f:
+        responses = json.load(f)
+    if isinstance(responses, dict):
+        responses = [responses]
+    parts: Dict[str, List[np.ndarray]] = {"latitude": [], "longitude": [], "date": [], **{n: [] for n in fields}}
+    for response in responses:
+        daily = response.get("daily") or {}
+        days = len(daily.get("time") or [])
+        parts["latitude"].append(np.full(days, float(response["latitude"])))
+        parts["longitude"].append(np.full(days, float(response["longitude"])))
+        parts["date"].append(np.array([str(d)[:10] for d in daily.get("time") or []], dtype="datetime64[D]"))
+        for name in fields:
+            column = _pick(daily, name, fields)
+            values = daily.get(column) if column else None
+            parts[name].append(
+                np.array([np.nan if v is None else v for v in values], dtype=np.float64) if values else np.full(days, np.nan)
+            )
+    return {name: np.concatenate(chunks) if chunks else np.empty(0) for name, chunks in parts.items()}
+
+
+def read_weather_file(path: str, fields: Sequence[str] = WEATHER_COLUMNS, values: bool = True) -> Dict[str, np.ndarray]:
+    """
+    latitude, longitude and date (datetime64[D]) columns of one downloaded file,
+    plus the weather fields when values is set (missing fields are NaN).
+    """
+    path = Path(path)
+    if path.suffix == ".json":
+        return _valid_rows(_read_json(path, fields))
+    if path.suffix == ".parquet":
+        names = pq.read_schema(path).names
+    elif path.suffix == ".csv":
+        names = pv.open_csv(path).schema.names
+    else:
+        raise ValueError(f"Unsupported weather file '{path}'; expected .csv, .parquet or .json")
+
+    wanted = ["latitude", "longitude", "date"] + (list(fields) if values else [])
+    columns = {name: _pick(names, name, fields) for name in wanted}
+    for name in ("latitude", "longitude", "date"):
+        if columns[name] is None:
+            raise ValueError(f"'{path}' has no {name} column")
+    present = [c for c in columns.values() if c is not None]
+    if path.suffix == ".parquet":
+        table = pq.read_table(path, columns=present)
+    else:
+        table = pv.read_csv(path, convert_options=pv.ConvertOptions(include_columns=present))
+
+    result = {}
+    for name, column in columns.items():
+        if column is None:
+            result[name] = np.full(table.num_rows, np.nan)
+        elif name == "date":
+            result[name] = _day_column(table[column].to_numpy())
+        else:
+            result[name] = table[column].to_numpy().astype(np.float64)
+    return _valid_rows(result)
+
+
+def build_archive(
+    paths: Sequence[str],
+    output: str,
+    grid_deg: float = 0.25,
+    fields: Sequence[str] = WEATHER_COLUMNS,
+    dtype: str = "float64",
+) -> Dict[str, object]:
+    """
+    Build an archive at `output` from downloaded files and return its metadata.
+
+    Rows falling in the same cell and day overwrite each other in file order.
+    The archive is written next to `output` and moved into place at the end, so
+    readers never see a partial archive.
+    """
+    if not paths:
+        raise ValueError("No weather files given")
+    started = time.perf_counter()
+
+    # Pass 1: extent of the grid and of the days.
+    lo_cell = np.array([np.iinfo(np.int64).max] * 2)
+    hi_cell = np.array([np.iinfo(np.int64).min] * 2)
+    first_day, last_day = None, None
+    rows = 0
+    for path in paths:
+        table = read_weather_file(path, fields, values=False)
+        if not len(table["date"]):
+            continue
+        cells = np.stack([np.round(table[k] / grid_deg).astype(np.int64) for k in ("latitude", "longitude")])
+        lo_cell = np.minimum(lo_cell, cells.min(axis=1))
+        hi_cell = np.maximum(hi_cell, cells.max(axis=1))
+        first_day = min(first_day, table["date"].min()) if first_day is not None else table["date"].min()
+        last_day = max(last_day, table["date"].max()) if last_day is not None else table["date"].max()
+        rows += len(table["date"])
+    if first_day is None:
+        raise ValueError("The weather files hold no rows")
+    shape = (int(hi_cell[0] - lo_cell[0] + 1), int(hi_cell[1] - lo_cell[1] + 1), int((last_day - first_day).astype(int)) + 1)
+
+    # Pass 2: values. A cell is set to NaN the first time it gets data; untouched cells stay sparse.
+    staging = Path(f"{output}.building")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    arrays = {
+        name: np.lib.format.open_memmap(staging / f"{name}.npy", mode="w+", dtype=dtype, shape=shape)
+        for name in fields
+    }
+    coverage = np.zeros(shape[:2], dtype=bool)
+    for path in paths:
+        table = read_weather_file(path, fields)
+        lat = np.round(table["latitude"] / grid_deg).astype(np.int64) - lo_cell[0]
+        lon = np.round(table["longitude"] / grid_deg).astype(np.int64) - lo_cell[1]
+        day = (table["date"] - first_day).astype(np.int64)
+        new = np.unique(np.stack([lat, lon], axis=1)[~coverage[lat, lon]], axis=0)
+        for name in fields:
+            arrays[name][new[:, 0], new[:, 1], :] = np.nan
+            arrays[name][lat, lon, day] = table[name]
+        coverage[new[:, 0], new[:, 1]] = True
+        log.info(f"Added {len(day)} rows from {path}")
+    for array in arrays.values():
+        array.flush()
+    del arrays
+    np.save(staging / COVERAGE_FILE, coverage)
+
+    meta = {
+        "version": ARCHIVE_VERSION,
+        "grid_deg": grid_deg,
+        "first_cell": [int(lo_cell[0]), int(lo_cell[1])],
+        "shape": list(shape),
+        "start_date": str(first_day),
+        "fields": list(fields),
+        "dtype": dtype,
+        "rows": rows,
+        "cells": int(coverage.sum()),
+        "sources": len(paths),
+        "built": date.today().isoformat(),
+    }
+    with open(staging / META_FILE, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    if os.path.exists(output):
+        shutil.rmtree(output)
+    os.replace(staging, output)
+    log.info(
+        f"Built weather archive {output}: {meta['cells']} cells, {shape[2]} days, {rows} rows "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+    return meta
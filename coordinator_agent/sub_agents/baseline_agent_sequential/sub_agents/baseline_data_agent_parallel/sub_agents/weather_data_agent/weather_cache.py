@@ -0,0 +1,391 @@
+"""
+Persistent on-disk weather store for get_weather_daily.
+
+Daily weather is stored as one Parquet file per rounded lat/long grid cell.
+A request only fetches the days that are missing from the cell, merges them
+in and rewrites the file. Files are evicted least-recently-used first once
+the store grows beyond its size budget.
+
+Every stored day records when it was fetched. A day that was complete and
+older than the upstream's reanalysis lag (`final_after_days`) when fetched is
+kept for good. Days that came back with missing values, or that were still
+inside the lag and may be revised, are kept for `provisional_ttl_s` and then
+fetched again; until then they are served from the store (days with missing
+values are left out of the result), so they do not cost a request every time.
+
+`HourlyWeatherCache` does the same for hourly weather, with float32 columns.
+A day counts as cached once any of its hours is stored, and is refetched when
+any of its hours has expired. Its cells are kept as
+arrays rather than per-row dicts, since a site-year is 8,760 rows.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+log = logging.getLogger(__name__)
+
+# Value columns stored per day, in the order returned by get_weather_daily.
+WEATHER_COLUMNS = ["temperature", "humidity", "dewpoint"]
+
+# fetcher(latitude, longitude, start_date, end_date) -> {"date": [...], "temperature": [...], ...}
+AsyncFetcher = Callable[[float, float, str, str], Awaitable[Dict[str, list]]]
+
+
+def grid_cell(latitude: float, longitude: float, grid_deg: float) -> Tuple[int, int]:
+    """Snap a coordinate to the integer index of its grid cell."""
+    return int(round(latitude / grid_deg)), int(round(longitude / grid_deg))
+
+
+def missing_ranges(requested: List[date], cached: set) -> List[Tuple[date, date]]:
+    """Group requested days that are not cached into contiguous (start, end) ranges."""
+    ranges = []
+    for d in requested:
+        if d in cached:
+            continue
+        if ranges and ranges[-1][1] == d - timedelta(days=1):
+            ranges[-1] = (ranges[-1][0], d)
+        else:
+            ranges.append((d, d))
+    return ranges
+
+
+def is_final(days: np.ndarray, fetched_at: np.ndarray, final_after_days: int) -> np.ndarray:
+    """Whether each day (datetime64[D]) was past the reanalysis lag when fetched (epoch seconds)."""
+    fetched_day = np.asarray(fetched_at, dtype=np.float64).astype("datetime64[s]").astype("datetime64[D]")
+    return np.asarray(days, dtype="datetime64[D]") <= fetched_day - np.timedelta64(final_after_days, "D")
+
+
+class WeatherCache:
+    """Parquet backed daily weather store keyed by (grid cell, date)."""
+
+    FILE_PREFIX = "cell"
+
+    def __init__(
+        self,
+        cache_dir: str,
+        grid_deg: float = 0.1,
+        max_bytes: int = 256 * 1024 * 1024,
+        final_after_days: int = 7,
+        provisional_ttl_s: float = 24 * 3600,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.grid_deg = grid_deg
+        self.max_bytes = max_bytes
+        self.final_after_days = final_after_days
+        self.provisional_ttl_s = provisional_ttl_s
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._inflight: Dict[tuple, "asyncio.Future"] = {}
+
+    # ---------------------------------------------------------------
+    # Public API
+    # ---------------------------------------------------------------
+    async def aget_or_fetch(
+        self,
+        latitude: float,
+        longitude: float,
+        start_date: str,
+        end_date: str,
+        fetcher: AsyncFetcher,
+    ) -> Dict[str, list]:
+        """
+        Return daily weather columns for [start_date, end_date], fetching only missing or expired days.
+
+        File IO runs in a worker thread and gaps are fetched concurrently.
+
+        Identical concurrent requests (e.g. the weather and consumption branches of
+        the parallel data agent) share one in-flight fetch.
+        """
+        key = (self._cell_path(latitude, longitude), start_date, end_date)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+        task = asyncio.ensure_future(self._aget_or_fetch(latitude, longitude, start_date, end_date, fetcher))
+        self._inflight[key] = task
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if task.done():
+                self._inflight.pop(key, None)
+            else:
+                task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+    async def _aget_or_fetch(self, latitude, longitude, start_date, end_date, fetcher):
+        path, requested, cell, gaps = await asyncio.to_thread(
+            self._plan, latitude, longitude, start_date, end_date
+        )
+        if gaps:
+            results = await asyncio.gather(
+                *(fetcher(latitude, longitude, a.isoformat(), b.isoformat()) for a, b in gaps)
+            )
+            cell = await asyncio.to_thread(self._merge, path, self._collect(results))
+        else:
+            self._touch(path)
+        return self._slice(requested, cell)
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters (in days) and current on-disk size."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "size_bytes": sum(size for _, size, _ in self._files()),
+        }
+
+    def clear(self) -> None:
+        """Remove every cached cell."""
+        with self._lock:
+            for path, _, _ in self._files():
+                path.unlink(missing_ok=True)
+
+    # ---------------------------------------------------------------
+    # Storage helpers
+    # ---------------------------------------------------------------
+    def _cell_path(self, latitude: float, longitude: float) -> Path:
+        lat_cell, lon_cell = grid_cell(latitude, longitude, self.grid_deg)
+        return self.cache_dir / f"{self.FILE_PREFIX}_{self.grid_deg:g}_{lat_cell}_{lon_cell}.parquet"
+
+    def _plan(self, latitude: float, longitude: float, start_date: str, end_date: str):
+        """Load the cell and work out which requested days are missing."""
+        start = date.fromisoformat(start_date)
+        end = date.fromisoformat(end_date)
+        requested = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        path = self._cell_path(latitude, longitude)
+        with self._lock:
+            cell = self._read_cell(path)
+            gaps = missing_ranges(requested, self._current_days(cell))
+            n_missing = sum((b - a).days + 1 for a, b in gaps)
+            self.hits += len(requested) - n_missing
+            self.misses += n_missing
+        if gaps:
+            log.info(f"Weather cache miss for {n_missing} of {len(requested)} days in {path.name}: {gaps}")
+        else:
+            log.info(f"Weather cache hit for all {len(requested)} days in {path.name}")
+        return path, requested, cell, gaps
+
+    def _merge(self, path: Path, fetched: Dict[date, Tuple[float, ...]]) -> Dict[date, Tuple[float, ...]]:
+        """Merge fetched days into the cell on disk and return the merged cell."""
+        with self._lock:
+            cell = self._read_cell(path)
+            cell.update(fetched)
+            self._write_cell(path, cell)
+            self._evict(keep=path)
+        return cell
+
+    def _current_days(self, cell: Dict[date, Tuple[float, ...]]) -> set:
+        """Days that can be served without a refetch: final ones, and recent fetches of the rest."""
+        if not cell:
+            return set()
+        days = list(cell)
+        rows = np.array([cell[d] for d in days], dtype=np.float64)
+        fetched_at = rows[:, -1]
+        final = is_final(np.array(days, dtype="datetime64[D]"), fetched_at, self.final_after_days)
+        final &= np.isfinite(rows[:, :-1]).all(axis=1)
+        current = final | (time.time() - fetched_at < self.provisional_ttl_s)
+        return {d for d, ok in zip(days, current) if ok}
+
+    @staticmethod
+    def _slice(requested: List[date], cell: Dict[date, Tuple[float, ...]]) -> Dict[str, list]:
+        days = [d for d in requested if d in cell and np.isfinite(cell[d][:-1]).all()]
+        result = {"date": [d.isoformat() for d in days]}
+        for i, column in enumerate(WEATHER_COLUMNS):
+            result[column] = [cell[d][i] for d in days]
+        return result
+
+    def _collect(self, results: List[Dict[str, list]]) -> Dict[date, Tuple[float, ...]]:
+        """Fetched column dicts (one per gap) as rows to merge into the cell."""
+        fetched = {}
+        for columns in results:
+            fetched.update(self._rows(columns))
+        return fetched
+
+    @staticmethod
+    def _rows(columns: Dict[str, list]) -> Dict[date, Tuple[float, ...]]:
+        """Convert fetched columns to {day: (*values, fetched_at)}; missing values are NaN."""
+        fetched_at = time.time()
+        dates = columns.get("date") or []
+        values = np.array(
+            [[np.nan if v is None else v for v in (columns.get(c) or [None] * len(dates))] for c in WEATHER_COLUMNS],
+            dtype=np.float64,
+        ).reshape(len(WEATHER_COLUMNS), len(dates))
+        return {
+            date.fromisoformat(str(d)[:10]): (*(float(v) for v in values[:, i]), fetched_at)
+            for i, d in enumerate(dates)
+        }
+
+    def _read_cell(self, path: Path) -> Dict[date, Tuple[float, ...]]:
+        if not path.exists():
+            return {}
+        try:
+            table = pq.read_table(path).to_pydict()
+        except (OSError, pa.ArrowException) as e:
+            log.warning(f"Discarding unreadable weather cache file {path}: {e}")
+            path.unlink(missing_ok=True)
+            return {}
+        # Files written before fetch times were stored count as fetched when last written.
+        fetched_at = table.get("fetched_at") or [path.stat().st_mtime] * len(table["date"])
+        return {
+            d: (*(np.nan if table[c][i] is None else table[c][i] for c in WEATHER_COLUMNS), fetched_at[i])
+            for i, d in enumerate(table["date"])
+        }
+
+    def _write_cell(self, path: Path, cell: Dict[date, Tuple[float, ...]]) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        days = sorted(cell)
+        arrays = {"date": pa.array(days, type=pa.date32())}
+        for i, column in enumerate(WEATHER_COLUMNS):
+            arrays[column] = pa.array([cell[d][i] for d in days], type=pa.float64())
+        arrays["fetched_at"] = pa.array([cell[d][-1] for d in days], type=pa.float64())
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        pq.write_table(pa.table(arrays), tmp_path)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _touch(path: Path) -> None:
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _files(self) -> List[Tuple[Path, int, float]]:
+        if not self.cache_dir.exists():
+            return []
+        files = []
+        for path in self.cache_dir.glob(f"{self.FILE_PREFIX}_*.parquet"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            files.append((path, st.st_size, st.st_mtime))
+        return files
+
+    def _evict(self, keep: Optional[Path] = None) -> None:
+        """Delete least-recently-used cells until the store fits in max_bytes."""
+        files = sorted(self._files(), key=lambda f: f[2])
+        total = sum(size for _, size, _ in files)
+        for path, size, _ in files:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+            self.evictions += 1
+            log.info(f"Evicted weather cache file {path.name}")
+
+
+
+class HourlyWeatherCache(WeatherCache):
+    """Parquet backed hourly weather store keyed by (grid cell, hour), with float32 values."""
+
+    FILE_PREFIX = "hourly"
+
+    def _plan(self, latitude: float, longitude: float, start_date: str, end_date: str):
+        start = date.fromisoformat(start_date)
+        end = date.fromisoformat(end_date)
+        requested = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        path = self._cell_path(latitude, longitude)
+        with self._lock:
+            cell = self._read_cell(path)
+            gaps = missing_ranges(requested, self._current_days(cell))
+            n_missing = sum((b - a).days + 1 for a, b in gaps)
+            self.hits += len(requested) - n_missing
+            self.misses += n_missing
+        if gaps:
+            log.info(f"Hourly weather cache miss for {n_missing} of {len(requested)} days in {path.name}: {gaps}")
+        else:
+            log.info(f"Hourly weather cache hit for all {len(requested)} days in {path.name}")
+        return path, requested, cell, gaps
+
+    def _merge(self, path: Path, fetched: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        with self._lock:
+            cell = self._read_cell(path)
+            # Fetched rows go first so np.unique keeps them for hours stored twice.
+            times, index = np.unique(np.concatenate([fetched["time"], cell["time"]]), return_index=True)
+            merged = {"time": times}
+            for column in WEATHER_COLUMNS + ["fetched_at"]:
+                merged[column] = np.concatenate([fetched[column], cell[column]])[index]
+            self._write_cell(path, merged)
+            self._evict(keep=path)
+        return merged
+
+    def _current_days(self, cell: Dict[str, np.ndarray]) -> set:
+        days = cell["time"].astype("datetime64[D]")
+        finite = np.isfinite(np.stack([cell[c] for c in WEATHER_COLUMNS])).all(axis=0)
+        current = (is_final(days, cell["fetched_at"], self.final_after_days) & finite) | (
+            time.time() - cell["fetched_at"] < self.provisional_ttl_s
+        )
+        return set(np.setdiff1d(days, days[~current]).astype(object).tolist())
+
+    @staticmethod
+    def _slice(requested: List[date], cell: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        days = cell["time"].astype("datetime64[D]")
+        mask = (days >= np.datetime64(requested[0], "D")) & (days <= np.datetime64(requested[-1], "D"))
+        mask &= np.isfinite(np.stack([cell[c] for c in WEATHER_COLUMNS])).all(axis=0)
+        return {name: cell[name][mask] for name in ["time"] + WEATHER_COLUMNS}
+
+    def _collect(self, results: List[Dict[str, list]]) -> Dict[str, np.ndarray]:
+        parts = [self._rows(columns) for columns in results]
+        return {
+            name: np.concatenate([part[name] for part in parts]) for name in ["time"] + WEATHER_COLUMNS + ["fetched_at"]
+        }
+
+    @staticmethod
+    def _rows(columns: Dict[str, list]) -> Dict[str, np.ndarray]:
+        """Fetched hourly columns as arrays; missing values are NaN."""
+        times = np.array([str(t)[:16] for t in columns.get("time") or []], dtype="datetime64[m]").astype("datetime64[h]")
+        values = np.array(
+            [[np.nan if v is None else v for v in (columns.get(c) or [None] * len(times))] for c in WEATHER_COLUMNS],
+            dtype=np.float64,
+        ).reshape(len(WEATHER_COLUMNS), len(times))
+        rows = {"time": times, "fetched_at": np.full(len(times), time.time())}
+        rows.update({c: values[i].astype(np.float32) for i, c in enumerate(WEATHER_COLUMNS)})
+        return rows
+
+    @staticmethod
+    def _empty() -> Dict[str, np.ndarray]:
+        return {
+            "time": np.empty(0, dtype="datetime64[h]"),
+            "fetched_at": np.empty(0),
+            **{c: np.empty(0, dtype=np.float32) for c in WEATHER_COLUMNS},
+        }
+
+    def _read_cell(self, path: Path) -> Dict[str, np.ndarray]:
+        if not path.exists():
+            return self._empty()
+        try:
+            table = pq.read_table(path)
+        except (OSError, pa.ArrowException) as e:
+            log.warning(f"Discarding unreadable weather cache file {path}: {e}")
+            path.unlink(missing_ok=True)
+            return self._empty()
+        cell = {"time": table["time"].to_numpy().astype("datetime64[h]")}
+        cell.update({c: table[c].to_numpy().astype(np.float32) for c in WEATHER_COLUMNS})
+        # Files written before fetch times were stored count as fetched when last written.
+        if "fetched_at" in table.column_names:
+            cell["fetched_at"] = table["fetched_at"].to_numpy().astype(np.float64)
+        else:
+            cell["fetched_at"] = np.full(len(cell["time"]), path.stat().st_mtime)
+        return cell
+
+    def _write_cell(self, path: Path, cell: Dict[str, np.ndarray]) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        arrays = {"time": pa.array(cell["time"].astype("datetime64[s]"), type=pa.timestamp("s"))}
+        arrays.update({c: pa.array(cell[c], type=pa.float32()) for c in WEATHER_COLUMNS})
+        arrays["fetched_at"] = pa.array(cell["fetched_at"], type=pa.float64())
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        pq.write_table(pa.table(arrays), tmp_path)
+        os.replace(tmp_path, path)
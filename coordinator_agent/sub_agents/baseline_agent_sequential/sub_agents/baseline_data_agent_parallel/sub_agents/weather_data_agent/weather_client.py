@@ -0,0 +1,282 @@
+"""
+Async Open-Meteo client with a shared connection pool.
+
+Long date ranges are split into chunks that are fetched concurrently under a
+semaphore, retried individually and stitched back together in date order.
+Requests go through the process-wide Open-Meteo rate limiter and circuit
+breaker. Timeouts and retry backoff stop at the current baseline's deadline.
+
+The connection pool belongs to the event loop that created it and is closed on
+that loop when it shuts down, so callers that start a new loop per run (e.g.
+asyncio.run or ADK's synchronous Runner.run) do not leak sockets.
+"""
+import asyncio
+import logging
+from datetime import date, timedelta
+from typing import AsyncGenerator, Dict, List, Optional, Tuple
+
+import httpx
+
+from resilience import CircuitBreaker, CircuitOpenError, DeadlineExceeded, TokenBucket, current_deadline
+
+log = logging.getLogger(__name__)
+
+DAILY_VARIABLES = {
+    "temperature": "temperature_2m_mean",
+    "humidity": "relative_humidity_2m_mean",
+    "dewpoint": "dew_point_2m_mean",
+}
+
+HOURLY_VARIABLES = {
+    "temperature": "temperature_2m",
+    "humidity": "relative_humidity_2m",
+    "dewpoint": "dew_point_2m",
+}
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class WeatherFetchError(Exception):
+    """Raised when a weather chunk still fails after all retries."""
+
+
+def split_range(start_date: str, end_date: str, chunk_days: int) -> List[Tuple[str, str]]:
+    """Split an inclusive ISO date range into consecutive chunks of at most chunk_days."""
+    start = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date)
+    if end < start:
+        raise ValueError(f"end_date {end_date} is before start_date {start_date}")
+    chunks = []
+    while start <= end:
+        chunk_end = min(start + timedelta(days=chunk_days - 1), end)
+        chunks.append((start.isoformat(), chunk_end.isoformat()))
+        start = chunk_end + timedelta(days=1)
+    return chunks
+
+
+async def _close_on_shutdown(client: httpx.AsyncClient) -> AsyncGenerator[None, None]:
+    # Kept suspended at the yield; the loop finalizes live async generators on
+    # shutdown (loop.shutdown_asyncgens), which closes the client on its own loop.
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+
+class AsyncWeatherClient:
+    """Pooled, chunked and retried access to Open-Meteo daily and hourly data."""
+
+    def __init__(
+        self,
+        base_url: str = "https://api.open-meteo.com/v1/forecast",
+        timeout: float = 30.0,
+        max_connections: int = 20,
+        max_concurrency: int = 8,
+        chunk_days: int = 92,
+        attempts: int = 3,
+        initial_delay: float = 0.5,
+        limiter: Optional[TokenBucket] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.chunk_days = chunk_days
+        self.attempts = attempts
+        self.initial_delay = initial_delay
+        self.limiter = limiter
+        self.breaker = breaker
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lifetime: Optional[AsyncGenerator[None, None]] = None
+
+    async def _ensure_client(self) -> httpx.AsyncClient:
+        # httpx pools and asyncio primitives are bound to the loop that created them.
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop or self._client.is_closed:
+            if self._client is not None and not self._client.is_closed:
+                self._close_stale(self._client, self._loop)
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+            # Runs to its yield without suspending, so no other fetch sees a half-set-up client.
+            self._lifetime = _close_on_shutdown(self._client)
+            await self._lifetime.__anext__()
+        return self._client
+
+    @staticmethod
+    def _close_stale(client: httpx.AsyncClient, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        """Close a client whose event loop is no longer the current one."""
+        if loop is not None and loop.is_running():
+            # Still serving another thread: close the pool there.
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+        else:
+            # Only a loop closed without finalizing its async generators gets here.
+            log.warning("Weather HTTP client outlived its event loop; its connections could not be closed")
+
+    async def aclose(self) -> None:
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+        self._lifetime = None
+
+    async def fetch_daily(
+        self, latitude: float, longitude: float, start_date: str, end_date: str
+    ) -> Dict[str, list]:
+        """
+        Fetch daily means for [start_date, end_date].
+
+        Returns:
+            dict with "date" plus one list per DAILY_VARIABLES key, in date order.
+
+        Raises:
+            WeatherFetchError: if any chunk fails after all retries.
+        """
+        return await self._fetch_range(latitude, longitude, start_date, end_date, "daily", DAILY_VARIABLES, "date")
+
+    async def fetch_hourly(
+        self, latitude: float, longitude: float, start_date: str, end_date: str
+    ) -> Dict[str, list]:
+        """
+        Fetch hourly values for every hour of the days [start_date, end_date], in local time.
+
+        Returns:
+            dict with "time" (ISO hours) plus one list per HOURLY_VARIABLES key, in time order.
+
+        Raises:
+            WeatherFetchError: if any chunk fails after all retries.
+        """
+        return await self._fetch_range(latitude, longitude, start_date, end_date, "hourly", HOURLY_VARIABLES, "time")
+
+    async def _fetch_range(
+        self,
+        latitude: float,
+        longitude: float,
+        start_date: str,
+        end_date: str,
+        block: str,
+        variables: Dict[str, str],
+        time_key: str,
+    ) -> Dict[str, list]:
+        await self._ensure_client()
+        chunks = split_range(start_date, end_date, self.chunk_days)
+        if len(chunks) > 1:
+            log.info(f"Fetching {block} weather {start_date}..{end_date} in {len(chunks)} chunks")
+        results = await asyncio.gather(
+            *(self._fetch_chunk(latitude, longitude, s, e, block, variables, time_key) for s, e in chunks)
+        )
+
+        stitched = {time_key: []}
+        stitched.update({name: [] for name in variables})
+        for chunk in results:
+            for key, values in chunk.items():
+                stitched[key].extend(values)
+        return stitched
+
+    async def _fetch_chunk(
+        self,
+        latitude: float,
+        longitude: float,
+        start_date: str,
+        end_date: str,
+        block: str = "daily",
+        variables: Dict[str, str] = DAILY_VARIABLES,
+        time_key: str = "date",
+    ) -> Dict[str, list]:
+        params = {
+            "latitude": latitude,
+            "longitude": longitude,
+            "start_date": start_date,
+            "end_date": end_date,
+            block: ",".join(variables.values()),
+            "timezone": "auto",
+        }
+        delay = self.initial_delay
+        last_error: Optional[Exception] = None
+        for attempt in range(1, self.attempts + 1):
+            timeout = self._admit(start_date, end_date)
+            try:
+                if self.limiter is not None:
+                    await self.limiter.acquire(current_deadline())
+                async with self._semaphore:
+                    response = await self._client.get(self.base_url, params=params, timeout=timeout)
+                if response.status_code in RETRY_STATUS_CODES:
+                    raise httpx.HTTPStatusError(
+                        f"Retryable status {response.status_code}",
+                        request=response.request,
+                        response=response,
+                    )
+                response.raise_for_status()
+                data = response.json()[block]
+                chunk = {time_key: data["time"]}
+                for name, variable in variables.items():
+                    chunk[name] = data[variable]
+                self._record(success=True)
+                return chunk
+            except DeadlineExceeded as e:
+                raise WeatherFetchError(f"Weather request {start_date}..{end_date} not sent: {e}") from e
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code not in RETRY_STATUS_CODES:
+                    self._record(success=True)  # Open-Meteo answered; the request was bad
+                    raise WeatherFetchError(
+                        f"Weather request {start_date}..{end_date} failed: {e.response.status_code} {e.response.text[:200]}"
+                    ) from e
+                self._record(success=False)
+                last_error = e
+            except (httpx.TransportError, KeyError, ValueError) as e:
+                self._record(success=False)
+                last_error = e
+            deadline = current_deadline()
+            if deadline is not None and delay >= deadline.remaining():
+                break
+            if attempt < self.attempts:
+                log.warning(
+                    f"Weather chunk {start_date}..{end_date} attempt {attempt} failed: {last_error}; retrying in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+                delay *= 2
+        if last_error is None:
+            reason = "deadline budget exhausted"
+        else:
+            # Timeouts and the like can have an empty message; name the type instead.
+            reason = str(last_error) or type(last_error).__name__
+        raise WeatherFetchError(
+            f"Weather request {start_date}..{end_date} failed after {attempt} attempts: {reason}"
+        ) from last_error
+
+    def _admit(self, start_date: str, end_date: str) -> float:
+        """
+        Check the breaker and deadline before an attempt.
+
+        Returns:
+            the timeout for the attempt, capped at the remaining deadline budget.
+
+        Raises:
+            WeatherFetchError: if the circuit is open or the deadline has passed.
+        """
+        try:
+            if self.breaker is not None:
+                self.breaker.check()
+            deadline = current_deadline()
+            if deadline is None:
+                return self.timeout
+            deadline.check(f"Weather request {start_date}..{end_date}")
+            return min(self.timeout, deadline.remaining())
+        except (CircuitOpenError, DeadlineExceeded) as e:
+            raise WeatherFetchError(str(e)) from e
+
+    def _record(self, success: bool) -> None:
+        if self.breaker is None:
+            return
+        if success:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
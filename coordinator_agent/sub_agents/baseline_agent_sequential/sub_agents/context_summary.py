@@ -0,0 +1,107 @@
+"""
+Compact, state-derived context for the LLM agents of the baseline pipeline.
+
+By default an LlmAgent's prompt holds the whole session history: the
+coordinator and input turns, and every weather and consumption record returned
+by a tool or written as structured output. Its size grows with the baseline
+window even though the analytical agents read their data from session state
+through their tools.
+
+With CONTEXT_PRUNING the analytical agents are built with include_contents
+"none" and their instruction ends with `summarize_state`: a few lines naming
+the location, the windows and the data and models already in session state.
+The prompt is then the same size whatever the window length.
+"""
+import json
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from google.adk.agents.readonly_context import ReadonlyContext
+from pydantic import BaseModel
+
+from config.settings import CONTEXT_PRUNING
+
+from .daily_series import RECORDS_FIELD, DailySeries
+
+
+def series_span(value: Any, date_field: str = "date") -> Optional[Tuple[int, str, str]]:
+    """
+    (days, first date, last date) of a daily series state value, without building the series.
+
+    `date_field` names the date of serialized records: "date" for weather,
+    "record_date" for consumption.
+    """
+    if value is None:
+        return None
+    if isinstance(value, DailySeries):
+        if not len(value):
+            return 0, "", ""
+        return len(value), str(value.dates[0]), str(value.dates[-1])
+    if isinstance(value, BaseModel):
+        value = value.model_dump()
+    elif isinstance(value, str):
+        value = json.loads(value)
+    records = list((value or {}).get(RECORDS_FIELD) or []) if isinstance(value, Mapping) else []
+    if not records:
+        return 0, "", ""
+    first, last = records[0], records[-1]
+    return len(records), str(first.get(date_field, "")), str(last.get(date_field, ""))
+
+
+def _describe_series(label: str, value: Any, date_field: str) -> Optional[str]:
+    span = series_span(value, date_field)
+    if span is None:
+        return None
+    days, first, last = span
+    return f"{label}: {days} days in session state" + (f" ({first} to {last})." if days else ".")
+
+
+def summarize_state(state: Mapping[str, Any]) -> str:
+    """A few lines of context from session state; no data records."""
+    lines: List[str] = []
+    user_name = (state.get("user:user_data") or {}).get("name")
+    if state.get("city") or user_name:
+        lines.append(f"Facility: {user_name or 'unnamed'} in {state.get('city') or 'unknown city'}.")
+    if state.get("latitude") is not None and state.get("longitude") is not None:
+        lines.append(f"Location: latitude {state.get('latitude')}, longitude {state.get('longitude')}.")
+    if state.get("baseline_from_date") and state.get("baseline_end_date"):
+        lines.append(
+            f"Baseline window: {state.get('baseline_from_date')} to {state.get('baseline_end_date')}."
+        )
+    if state.get("reporting_from_date") and state.get("reporting_end_date"):
+        lines.append(
+            f"Reporting window: {state.get('reporting_from_date')} to {state.get('reporting_end_date')}."
+        )
+    for label, key, date_field in (
+        ("Weather data", "weather_data", "date"),
+        ("Consumption data", "energy_consumption_data", "record_date"),
+    ):
+        line = _describe_series(label, state.get(key), date_field)
+        if line:
+            lines.append(line)
+    record: Optional[Dict[str, Any]] = state.get("regression_record")
+    if record:
+        lines.append(
+            f"Fitted baseline: {record.get('regression_equation')} "
+            f"(R² {record.get('r2', 0.0):.4f}, NMBE {record.get('nmbe', 0.0):.4f})."
+        )
+    selection = state.get("model_selection")
+    if selection:
+        winner = selection.get("winner") or {}
+        lines.append(f"Selected model: {winner.get('name')} (CV(RMSE) {winner.get('cv_rmse', 0.0):.4f}).")
+    return "\n".join(lines) if lines else "Session state is empty."
+
+
+def with_state_summary(instruction: str):
+    """Instruction provider: the static instruction followed by the current state summary."""
+
+    def provider(context: ReadonlyContext) -> str:
+        return f"{instruction.rstrip()}\n\nContext from session state:\n{summarize_state(context.state)}"
+
+    return provider
+
+
+def context_options(instruction: str) -> Dict[str, Any]:
+    """`instruction` and `include_contents` keyword arguments for an analytical LlmAgent."""
+    if not CONTEXT_PRUNING:
+        return {"instruction": instruction}
+    return {"instruction": with_state_summary(instruction), "include_contents": "none"}
@@ -0,0 +1,174 @@
+"""
+Compact daily time series shared by the data agents and the regression stage.
+
+A `DailySeries` is one datetime64[D] date array plus float64 value columns,
+validated once for the whole series instead of per record. It is what the
+fast data agents put in session state. It serializes to the same
+{"daily_records": [...]} shape as MultiDayWeatherData / MultiDayEnergyData,
+so events, the LLM agents and older session data all stay compatible, and
+`from_state` accepts either form.
+"""
+import json
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Type
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict, model_serializer, model_validator
+
+RECORDS_FIELD = "daily_records"
+
+
+class DailySeries(BaseModel):
+    """Dates plus equally long float64 columns, one row per day."""
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    date_field: str = "date"
+    dates: np.ndarray
+    columns: Dict[str, np.ndarray]
+
+    @model_validator(mode="after")
+    def _check(self):
+        self.dates = np.asarray(self.dates, dtype="datetime64[D]")
+        if self.dates.ndim != 1:
+            raise ValueError("dates must be one-dimensional")
+        n = len(self.dates)
+        for name, values in self.columns.items():
+            column = np.asarray(values, dtype=np.float64)
+            if column.shape != (n,):
+                raise ValueError(f"column '{name}' has shape {column.shape}, expected ({n},)")
+            self.columns[name] = column
+        return self
+
+    # ---------------------------------------------------------------
+    # Construction
+    # ---------------------------------------------------------------
+    @classmethod
+    def from_columns(
+        cls, columns: Mapping[str, Sequence[Any]], date_field: str = "date", fields: Optional[Iterable[str]] = None
+    ) -> "DailySeries":
+        """From {date_field: [...], name: [...]} lists; None values become NaN."""
+        names = list(fields) if fields is not None else [k for k in columns if k != date_field]
+        return cls(
+            date_field=date_field,
+            dates=np.array([str(d)[:10] for d in columns[date_field]], dtype="datetime64[D]"),
+            columns={name: np.array(columns[name], dtype=np.float64) for name in names},
+        )
+
+    @classmethod
+    def from_records(
+        cls, records: Sequence[Mapping[str, Any]], date_field: str = "date", fields: Optional[Iterable[str]] = None
+    ) -> "DailySeries":
+        """From a list of record dicts such as MultiDayWeatherData.model_dump()["daily_records"]."""
+        if fields is None:
+            fields = [k for k in (records[0] if records else {}) if k != date_field]
+        names = list(fields)
+        dates = np.array([str(r[date_field])[:10] for r in records], dtype="datetime64[D]")
+        values = np.array([[r.get(name) for name in names] for r in records], dtype=np.float64)
+        values = values.reshape(len(records), len(names))
+        return cls(date_field=date_field, dates=dates, columns={name: values[:, i] for i, name in enumerate(names)})
+
+    @classmethod
+    def from_state(
+        cls, value: Any, date_field: str = "date", fields: Optional[Iterable[str]] = None
+    ) -> "DailySeries":
+        """
+        From a session state value: a DailySeries, a pydantic model or dict with
+        `daily_records`, or its JSON string. Missing values give an empty series.
+        """
+        if isinstance(value, DailySeries):
+            return value
+        if isinstance(value, BaseModel):
+            value = value.model_dump()
+        elif isinstance(value, str):
+            value = json.loads(value)
+        records = list((value or {}).get(RECORDS_FIELD) or [])
+        return cls.from_records(records, date_field=date_field, fields=fields)
+
+    # ---------------------------------------------------------------
+    # Access
+    # ---------------------------------------------------------------
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, DailySeries):
+            return NotImplemented
+        return (
+            self.date_field == other.date_field
+            and np.array_equal(self.dates, other.dates)
+            and self.names == other.names
+            and all(np.array_equal(self.columns[n], other.columns[n], equal_nan=True) for n in self.names)
+        )
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.columns)
+
+    @property
+    def nbytes(self) -> int:
+        return self.dates.nbytes + sum(c.nbytes for c in self.columns.values())
+
+    def values(self, names: Optional[Sequence[str]] = None) -> np.ndarray:
+        """Columns stacked as an (n, len(names)) float64 matrix."""
+        names = list(names) if names is not None else self.names
+        return np.column_stack([self.columns[n] for n in names]) if names else np.empty((len(self), 0))
+
+    def take(self, index: np.ndarray) -> "DailySeries":
+        """Rows selected by an integer or boolean index."""
+        return DailySeries.model_construct(
+            date_field=self.date_field,
+            dates=self.dates[index],
+            columns={name: column[index] for name, column in self.columns.items()},
+        )
+
+    def dropna(self, names: Optional[Sequence[str]] = None) -> "DailySeries":
+        """Drop days where any of `names` (default all columns) is missing."""
+        names = list(names) if names is not None else self.names
+        valid = np.ones(len(self), dtype=bool)
+        for name in names:
+            valid &= np.isfinite(self.columns[name])
+        return self if valid.all() else self.take(valid)
+
+    def unique(self) -> "DailySeries":
+        """Sorted by date, keeping the last row for repeated dates."""
+        _, index = np.unique(self.dates[::-1], return_index=True)
+        return self.take(len(self) - 1 - index)
+
+    def between(self, start: Any, end: Any) -> "DailySeries":
+        """Rows with start <= date <= end."""
+        mask = (self.dates >= np.datetime64(str(start)[:10], "D")) & (self.dates <= np.datetime64(str(end)[:10], "D"))
+        return self.take(mask)
+
+    def join(self, other: "DailySeries") -> "DailySeries":
+        """Inner join on date (last row wins for repeated dates); columns of both, dates of self."""
+        left, right = self.unique(), other.unique()
+        _, li, ri = np.intersect1d(left.dates, right.dates, assume_unique=True, return_indices=True)
+        columns = {name: column[li] for name, column in left.columns.items()}
+        columns.update({name: column[ri] for name, column in right.columns.items()})
+        return DailySeries.model_construct(date_field=self.date_field, dates=left.dates[li], columns=columns)
+
+    # ---------------------------------------------------------------
+    # Conversion to the record schemas
+    # ---------------------------------------------------------------
+    def to_records(self) -> List[Dict[str, Any]]:
+        """Record dicts with ISO date strings; NaN values become None."""
+        names = self.names
+        columns = [
+            [None if v != v else v for v in self.columns[name].tolist()]  # v != v only for NaN
+            for name in names
+        ]
+        return [
+            {self.date_field: d, **dict(zip(names, row))}
+            for d, row in zip(self.dates.astype(str).tolist(), zip(*columns) if names else [()] * len(self))
+        ]
+
+    def to_model(self, model_cls: Type[BaseModel]) -> BaseModel:
+        """Validate into a MultiDay*Data style model with a `daily_records` field."""
+        return model_cls.model_validate({RECORDS_FIELD: self.to_records()})
+
+    @model_serializer
+    def _serialize(self) -> Dict[str, Any]:
+        # Dumps (events, session JSON, API responses) use the record schema.
+        return {RECORDS_FIELD: self.to_records()}
@@ -0,0 +1,128 @@
+"""
+Compact hourly time series for hourly-resolution baselines.
+
+The hourly counterpart of `DailySeries`: one datetime64[h] time array plus
+float32 value columns, about 8,760 rows per site-year. Values are float32 to
+halve memory and storage; sums over them (the regression's normal equations)
+are accumulated in float64. Hourly series are not put in session state. The
+regression stage loads them itself and only the fitted model is stored.
+
+Times are local wall-clock hours as returned by Open-Meteo with
+`timezone=auto`, which is what hour-of-week and occupancy are defined on.
+"""
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict, model_validator
+
+HOURS_PER_WEEK = 168
+
+
+def parse_span(span: str, upper: int) -> Tuple[int, int]:
+    """Parse "start-end" (e.g. "8-18") into ints; a single number gives (n, n)."""
+    start, _, end = str(span).partition("-")
+    start, end = int(start), int(end or start)
+    if not 0 <= start <= end <= upper:
+        raise ValueError(f"Invalid span {span!r}, expected 'start-end' within 0-{upper}")
+    return start, end
+
+
+def hour_of_week(times: np.ndarray) -> np.ndarray:
+    """0 for Monday 00:00 up to 167 for Sunday 23:00."""
+    hours = np.asarray(times, dtype="datetime64[h]").astype(np.int64)
+    # 1970-01-01 was a Thursday, 72 hours after the Monday-based week start.
+    return (hours + 72) % HOURS_PER_WEEK
+
+
+def occupied_mask(how: np.ndarray, occupied_hours: str = "8-18", occupied_days: str = "0-4") -> np.ndarray:
+    """True for hours of week inside the occupancy schedule (hours end-exclusive, days inclusive)."""
+    first_hour, last_hour = parse_span(occupied_hours, 24)
+    first_day, last_day = parse_span(occupied_days, 6)
+    day, hour = how // 24, how % 24
+    return (day >= first_day) & (day <= last_day) & (hour >= first_hour) & (hour < last_hour)
+
+
+class HourlySeries(BaseModel):
+    """Hours plus equally long float32 columns, one row per hour."""
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    times: np.ndarray
+    columns: Dict[str, np.ndarray]
+
+    @model_validator(mode="after")
+    def _check(self):
+        self.times = np.asarray(self.times, dtype="datetime64[h]")
+        if self.times.ndim != 1:
+            raise ValueError("times must be one-dimensional")
+        n = len(self.times)
+        for name, values in self.columns.items():
+            column = np.asarray(values, dtype=np.float32)
+            if column.shape != (n,):
+                raise ValueError(f"column '{name}' has shape {column.shape}, expected ({n},)")
+            self.columns[name] = column
+        return self
+
+    @classmethod
+    def from_columns(
+        cls, columns: Mapping[str, Sequence[Any]], time_field: str = "time", fields: Optional[Sequence[str]] = None
+    ) -> "HourlySeries":
+        """From {"time": ["2024-01-01T00:00", ...], name: [...]}; None values become NaN."""
+        names = list(fields) if fields is not None else [k for k in columns if k != time_field]
+        times = np.asarray(columns[time_field])
+        if times.dtype.kind != "M":
+            times = np.array([str(t)[:16] for t in times], dtype="datetime64[m]")
+        return cls(
+            times=times.astype("datetime64[h]"),
+            columns={name: np.array(columns[name], dtype=np.float64).astype(np.float32) for name in names},
+        )
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.columns)
+
+    @property
+    def nbytes(self) -> int:
+        return self.times.nbytes + sum(c.nbytes for c in self.columns.values())
+
+    def take(self, index: Any) -> "HourlySeries":
+        """Rows selected by an integer or boolean index, or a slice (a view)."""
+        return HourlySeries.model_construct(
+            times=self.times[index], columns={name: column[index] for name, column in self.columns.items()}
+        )
+
+    def dropna(self, names: Optional[Sequence[str]] = None) -> "HourlySeries":
+        """Drop hours where any of `names` (default all columns) is missing."""
+        valid = np.ones(len(self), dtype=bool)
+        for name in (names if names is not None else self.names):
+            valid &= np.isfinite(self.columns[name])
+        return self if valid.all() else self.take(valid)
+
+    def unique(self) -> "HourlySeries":
+        """Sorted by time, keeping the last row for repeated hours."""
+        _, index = np.unique(self.times[::-1], return_index=True)
+        return self.take(len(self) - 1 - index)
+
+    def between(self, start_date: Any, end_date: Any) -> "HourlySeries":
+        """Hours on the days start_date..end_date inclusive."""
+        days = self.times.astype("datetime64[D]")
+        mask = (days >= np.datetime64(str(start_date)[:10], "D")) & (days <= np.datetime64(str(end_date)[:10], "D"))
+        return self.take(mask)
+
+    def join(self, other: "HourlySeries") -> "HourlySeries":
+        """Inner join on time (last row wins for repeated hours); columns of both."""
+        left, right = self.unique(), other.unique()
+        _, li, ri = np.intersect1d(left.times, right.times, assume_unique=True, return_indices=True)
+        columns = {name: column[li] for name, column in left.columns.items()}
+        columns.update({name: column[ri] for name, column in right.columns.items()})
+        return HourlySeries.model_construct(times=left.times[li], columns=columns)
+
+    def iter_chunks(self, rows: int) -> Iterator["HourlySeries"]:
+        """Consecutive views of at most `rows` hours."""
+        for start in range(0, len(self), max(int(rows), 1)):
+            yield self.take(slice(start, start + rows))
@@ -0,0 +1,52 @@
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.genai import types
+from typing import AsyncGenerator
+import asyncio
+import logging
+
+from ..regression_agent.agent import join_on_date, series_from_state
+from ..regression_agent.model_selection import format_selection_summary, select_model
+
+log = logging.getLogger(__name__)
+
+
+class DeterministicModelSelectionAgent(BaseAgent):
+    """Model selection stage: cross-validates candidate baseline models on the data in session state."""
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        try:
+            dates, X_values, Y_values = join_on_date(*series_from_state(ctx.session.state))
+            selection = await asyncio.to_thread(select_model, dates, X_values, Y_values)
+        except (ValueError, KeyError, TypeError) as e:
+            log.error(f"Error selecting baseline model: {e}")
+            yield Event(
+                author=self.name,
+                invocation_id=ctx.invocation_id,
+                branch=ctx.branch,
+                content=types.Content(
+                    role="model",
+                    parts=[types.Part(text=f"Model selection failed: {e}")],
+                ),
+            )
+            return
+
+        yield Event(
+            author=self.name,
+            invocation_id=ctx.invocation_id,
+            branch=ctx.branch,
+            content=types.Content(
+                role="model",
+                parts=[types.Part(text=format_selection_summary(selection))],
+            ),
+            actions=EventActions(state_delta={"model_selection": selection.model_dump()}),
+        )
+
+
+model_selection_agent = DeterministicModelSelectionAgent(
+    name="ModelSelectionAgent",
+    description="Scores candidate baseline models with blocked time-series cross-validation and picks the best.",
+)
@@ -1,31 +1,155 @@
-from google.adk.agents import Agent
+from google.adk.agents import Agent, BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
 from google.adk.models.google_llm import Gemini
-from google.adk.code_executors import BuiltInCodeExecutor
-import json
-from typing import Dict, Any, List
-from config.settings import SHARED_RETRY_CONFIG
+from google.adk.tools.tool_context import ToolContext
+from google.genai import types
+from typing import Any, AsyncGenerator, Dict, Mapping
+from config.settings import SHARED_RETRY_CONFIG, PREDICTION_FAST_PATH, MODEL_REGISTRY_DIR
 import logging
+import numpy as np
+
+from ..baseline_data_agent_parallel.sub_agents.consumption_data_agent.agent import build_consumption_data
+from ..context_summary import context_options
+from ..baseline_data_agent_parallel.sub_agents.weather_data_agent.agent import load_weather_series
+from ..baseline_data_agent_parallel.sub_agents.weather_data_agent.weather_client import WeatherFetchError
+from ..regression_agent.model_registry import ModelRegistry, register_from_state
+from .savings import SavingsResult, compute_savings
+
 log = logging.getLogger(__name__)
-# New weather data for which Agent 2 will make a prediction
-NEW_WEATHER_DATA = {
-    "temperature": 21.5,  # New Temperature
-    "humidity": 70.0, # New Humidity
-    "dewpoint": 20  # New Dewpoint
-}
-prediction_agent = Agent(
+
+MODEL_REGISTRY = ModelRegistry(MODEL_REGISTRY_DIR)
+
+
+async def compute_savings_from_state(state: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    Register the fitted baseline and compute avoided energy for the reporting period.
+
+    The reporting period is state keys reporting_from_date / reporting_end_date,
+    defaulting to the baseline window (a fit check where avoided energy should be ~0).
+
+    Returns:
+        dict with "baseline_model" (registry key info), "summary" and "daily_records".
+    """
+    model = register_from_state(MODEL_REGISTRY, state)
+    start_date = str(state.get("reporting_from_date") or state.get("baseline_from_date"))
+    end_date = str(state.get("reporting_end_date") or state.get("baseline_end_date"))
+    latitude, longitude = state.get("latitude"), state.get("longitude")
+    if latitude is None or longitude is None:
+        raise ValueError("latitude and longitude must be set in session state.")
+
+    weather = await load_weather_series(latitude, longitude, start_date, end_date)
+    # ADK's session State is not a Mapping; tool calls pass one in.
+    values = state.to_dict() if hasattr(state, "to_dict") else dict(state)
+    consumption = await build_consumption_data(
+        {**values, "baseline_from_date": start_date, "baseline_end_date": end_date}
+    )
+    consumption = consumption.unique()
+    actual = np.full(len(weather), np.nan)
+    _, w_pos, c_pos = np.intersect1d(weather.dates, consumption.dates, return_indices=True)
+    actual[w_pos] = consumption["consumption_kwh"][c_pos]
+
+    result: SavingsResult = compute_savings(model, weather.dates, weather.columns, actual)
+    summary = result.summary()
+    log.info(f"Savings for {model.key}: {summary}")
+    return {
+        "baseline_model": {
+            "key": model.key,
+            "facility_id": model.facility_id,
+            "version": model.version,
+            "primary": model.primary,
+            "selected_model": model.selection.name if model.selection is not None else None,
+        },
+        "summary": summary,
+        "daily_records": result.daily_records(),
+    }
+
+
+def format_savings_summary(savings: Dict[str, Any]) -> str:
+    model, summary = savings["baseline_model"], savings["summary"]
+    fraction = summary["savings_fraction"]
+    primary = model["primary"] + (f": {model['selected_model']}" if model.get("selected_model") else "")
+    return (
+        f"Baseline model {model['key']} ({primary}) over "
+        f"{summary['reporting_from_date']} to {summary['reporting_to_date']} ({summary['n_days']} days):\n"
+        f"Adjusted baseline: {summary['adjusted_baseline_kwh']:.1f} kWh, "
+        f"actual: {summary['actual_kwh']:.1f} kWh, "
+        f"avoided energy: {summary['avoided_energy_kwh']:.1f} kWh"
+        + (f" ({fraction:.2%})." if fraction is not None else ".")
+    )
+
+
+async def compute_baseline_savings(tool_context: ToolContext) -> Dict[str, Any]:
+    """
+    Register the fitted baseline model and compute adjusted baseline, actual and
+    avoided energy for every day of the reporting period.
+
+    The result is saved to session state key `savings`.
+
+    Returns:
+        dict with status and either the savings summary or an error message.
+    """
+    try:
+        savings = await compute_savings_from_state(tool_context.state)
+    except (ValueError, KeyError, WeatherFetchError) as e:
+        log.error(f"Error computing savings: {e}")
+        return {"status": "error", "message": str(e)}
+    tool_context.state["savings"] = savings
+    return {"status": "success", "baseline_model": savings["baseline_model"], "summary": savings["summary"]}
+
+
+class DeterministicPredictionAgent(BaseAgent):
+    """Prediction stage that computes reporting-period savings without calling the LLM."""
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        try:
+            savings = await compute_savings_from_state(ctx.session.state)
+        except (ValueError, KeyError, WeatherFetchError) as e:
+            log.error(f"Error computing savings: {e}")
+            yield Event(
+                author=self.name,
+                invocation_id=ctx.invocation_id,
+                branch=ctx.branch,
+                content=types.Content(
+                    role="model",
+                    parts=[types.Part(text=f"Prediction failed: {e}")],
+                ),
+            )
+            return
+
+        yield Event(
+            author=self.name,
+            invocation_id=ctx.invocation_id,
+            branch=ctx.branch,
+            content=types.Content(
+                role="model",
+                parts=[types.Part(text=format_savings_summary(savings))],
+            ),
+            actions=EventActions(state_delta={"savings": savings}),
+        )
+
+
+prediction_llm_agent = Agent(
     name="PredictionAgent",
     model= Gemini (model="gemini-2.5-flash", retry_options=SHARED_RETRY_CONFIG),
-    description="Agent that reads multiple regression parameters from history and makes a prediction.",
-    instruction=f"""
-    Your goal is to predict energy consumption for the new weather data: {json.dumps(NEW_WEATHER_DATA)}.
-    
-    1. **Examine the conversation history:** Look at the preceding message from the 'Regression_Agent'.
-    2. **Extract parameters:** Use the BuiltInCodeExecutor and string parsing to find the numerical values 
-       sandwiched between the [INTERCEPT_START], [TEMP_COEF_START], [HUMIDITY_COEF_START], and [DEWPOINT_COEF_START] tags.
-    3. **Perform Prediction:** Use the extracted intercept and coefficients along with the new weather data 
-       (T={NEW_WEATHER_DATA['temperature']}, H={NEW_WEATHER_DATA['humidity']}, D={NEW_WEATHER_DATA['dewpoint']})
-       to calculate the predicted consumption.
-    4. **Respond:** State the final predicted consumption value clearly.
-    """,
-    code_executor=BuiltInCodeExecutor(),
+    description="Agent that applies the fitted baseline to the reporting period and reports avoided energy.",
+    **context_options("""
+    Your goal is to report the energy savings of the reporting period against the fitted baseline.
+
+    1. **Compute:** Call the compute_baseline_savings tool. It registers the fitted baseline model, predicts the
+       adjusted baseline for every reporting day from that day's weather and compares it with actual consumption.
+       Do not compute anything yourself.
+    2. **Respond:** State the baseline model key, the reporting period, the adjusted baseline, actual consumption
+       and avoided energy in kWh, and the savings percentage returned by the tool.
+    """),
+    tools=[compute_baseline_savings],
 )
+
+prediction_fast_agent = DeterministicPredictionAgent(
+    name="PredictionAgent",
+    description="Applies the fitted baseline to the reporting period and computes avoided energy.",
+)
+
+prediction_agent = prediction_fast_agent if PREDICTION_FAST_PATH else prediction_llm_agent
@@ -1,21 +1,27 @@
-from google.adk.agents import Agent
+from google.adk.agents import Agent, BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
 from google.adk.tools.tool_context import ToolContext
 from google.adk.models.google_llm import Gemini
-from google.adk.code_executors import BuiltInCodeExecutor
-from config.settings import SHARED_RETRY_CONFIG
-from typing import Dict, Any, List
-from datetime import date, datetime, timedelta
-from dateutil.parser import parse, ParserError
+from google.genai import types
+from config.settings import SHARED_RETRY_CONFIG, REGRESSION_FAST_PATH, REGRESSION_CHANGE_POINT, BASELINE_HOURLY
+from typing import Any, AsyncGenerator, Dict, Optional, Tuple
+from datetime import datetime
 from pydantic import BaseModel, Field
 import logging
 import numpy as np
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import r2_score, mean_absolute_percentage_error
 import traceback
 
-logging.basicConfig(level=logging.INFO)
+from ..context_summary import context_options
+from ..daily_series import DailySeries
+from .change_point import ChangePointModel, fit_change_point
+
 log = logging.getLogger(__name__)
-logging.info("Instantiated regression_agent")
+log.info("Instantiated regression_agent")
+
+# Independent variables read from each weather record, in design-matrix order.
+WEATHER_FEATURES = ["temperature", "humidity", "dewpoint"]
+TARGET_NAME = "consumption_kwh"
 
 # -------------------------------------------------------------------
 # Output Schema
@@ -23,13 +29,69 @@ logging.info("Instantiated regression_agent")
 class RegressionRecord(BaseModel):
     record_date: str
     regression_equation: str
+    intercept: float = 0.0
+    coefficients: Dict[str, float] = Field(default_factory=dict)
     nmbe:float
-    mape:float  
+    mape:float
     r2:float
-    
+    n_observations: int = 0
+    # Best ASHRAE change-point model on temperature alone, when enabled.
+    change_point: Optional[ChangePointModel] = None
+
+
+def fit_ols(X_values: np.ndarray, Y_values: np.ndarray) -> Dict[str, Any]:
+    """
+    Fit ordinary least squares with an intercept using a single lstsq solve.
+
+    Parameters:
+        X_values (np.ndarray): design matrix of shape (n_samples, n_features)
+        Y_values (np.ndarray): dependent variable of shape (n_samples,)
+
+    Returns:
+        dict containing intercept, coef (np.ndarray), predictions, r2, nmbe, mape
+    """
+    X_values = np.asarray(X_values, dtype=np.float64)
+    Y_values = np.asarray(Y_values, dtype=np.float64)
+    if X_values.ndim == 1:
+        X_values = X_values[:, None]
+
+    design = np.empty((X_values.shape[0], X_values.shape[1] + 1))
+    design[:, 0] = 1.0
+    design[:, 1:] = X_values
+    beta, *_ = np.linalg.lstsq(design, Y_values, rcond=None)
+    predictions = design @ beta
+
+    residuals = Y_values - predictions
+    ss_res = float(residuals @ residuals)
+    centered = Y_values - Y_values.mean()
+    ss_tot = float(centered @ centered)
+    r2 = 1.0 - ss_res / ss_tot if ss_tot > 0 else 0.0
+
+    # NMBE = Mean((Actual - Predicted)) / Mean(Actual)
+    nmbe = float(residuals.mean() / Y_values.mean())
+    # MAPE as a fraction, matching sklearn's mean_absolute_percentage_error
+    eps = np.finfo(np.float64).eps
+    mape = float(np.mean(np.abs(residuals) / np.maximum(np.abs(Y_values), eps)))
+
+    return {
+        "intercept": float(beta[0]),
+        "coef": beta[1:],
+        "predictions": predictions,
+        "r2": r2,
+        "nmbe": nmbe,
+        "mape": mape,
+    }
+
+
+def format_equation(target_name: str, intercept: float, coefficients: Dict[str, float]) -> str:
+    """Render a fitted model as `target = b0 + (b1 * x1) + ...`."""
+    coef_eq_parts = [f"({coef:.4f} * {name})" for name, coef in coefficients.items()]
+    return f"{target_name} = {intercept:.4f} + " + " + ".join(coef_eq_parts)
+
+
 def run_regression_generic(X: dict, Y: dict):
     """
-    Generic Regression tool. 
+    Generic Regression tool.
     Given data of indepedant and depdenat variables, it gives regression equation with its accuracy metrics
 
     Parameters:
@@ -40,70 +102,42 @@ def run_regression_generic(X: dict, Y: dict):
         dict containing:
             status: "success" or "error"
             regression_equation: str
+            intercept: float
+            coefficients: dict
             r2: float
             nmbe: float
             mape: float
     """
 
     try:
-        #print("\n[REGRESSION AGENT] Starting regression...")
-        log.info("\n[REGRESSION AGENT] Starting regression...") 
+        log.info("\n[REGRESSION AGENT] Starting regression...")
 
         # Convert dictionary objects to numpy arrays
-        X_values = np.array(list(X.values())).T  # shape (n_samples, n_features)
-        Y_values = np.array(list(Y.values()))
+        X_values = np.array(list(X.values()), dtype=np.float64).T  # shape (n_samples, n_features)
+        Y_values = np.array(list(Y.values())[0], dtype=np.float64)
         feature_names = list(X.keys())
         target_name = list(Y.keys())[0] if len(Y.keys()) == 1 else "target"
         record_date = datetime.now().date()
 
-        #print(f"[INFO] Independent Variables: {feature_names}")
         log.info(f"[INFO] Independent Variables: {feature_names}")
-        #print(f"[INFO] Dependent Variable: {target_name}")
-        # print("\n[INFO] X Values:")
-        # print(X_values)
-        # print("\n[INFO] Y Values:")
-        # print(Y_values)
 
-        # Train regression model
-        model = LinearRegression()
-        model.fit(X_values, Y_values)
+        fit = fit_ols(X_values, Y_values)
+        coefficients = {name: float(c) for name, c in zip(feature_names, fit["coef"])}
+        equation = format_equation(target_name, fit["intercept"], coefficients)
 
-        predictions = model.predict(X_values)
-
-        # Calculate metrics
-        r2 = r2_score(Y_values, predictions)
-        mape = mean_absolute_percentage_error(Y_values, predictions)
-
-        # NMBE = Mean((Actual - Predicted)) / Mean(Actual)
-        nmbe = np.mean(Y_values - predictions) / np.mean(Y_values)
-
-        # Generate regression equation dynamically
-        coef_eq_parts = []
-        for coef, name in zip(model.coef_, feature_names):
-            coef_eq_parts.append(f"({coef:.4f} * {name})")
-
-        equation = " + ".join(coef_eq_parts)
-        equation = f"{target_name} = {model.intercept_:.4f} + " + equation
-
-        #print("\n[REGRESSION EQUATION]")
         log.info(f"REGRESSION EQUATION- {equation}")
-        log.info(f"R² Score: {r2}")
-        log.info(f"NMBE: {nmbe}")
-        log.info(f"MAPE: {mape}")
-
-        log.info(equation)
-        # print(equation)
-        # print("\n[METRICS]")
-        # print(f"R² Score: {r2}")
-        # print(f"NMBE: {nmbe}")
-        # print(f"MAPE: {mape}")
+        log.info(f"R² Score: {fit['r2']}")
+        log.info(f"NMBE: {fit['nmbe']}")
+        log.info(f"MAPE: {fit['mape']}")
         return {
             "status": "success",
             "regression_equation": equation,
-            "r2": r2,
-            "nmbe": nmbe,
-            "mape": mape,
-            "record_date":record_date
+            "intercept": fit["intercept"],
+            "coefficients": coefficients,
+            "r2": fit["r2"],
+            "nmbe": fit["nmbe"],
+            "mape": fit["mape"],
+            "record_date": record_date.isoformat()
         }
     except Exception as e:
         error_msg = str(e)
@@ -113,35 +147,197 @@ def run_regression_generic(X: dict, Y: dict):
         return {
             "status": "error",
             "message": error_msg
-        }   
-regression_agent = Agent(
+        }
+
+
+# -------------------------------------------------------------------
+# Session-state regression (no conversation history, no code executor)
+# -------------------------------------------------------------------
+def series_from_state(state: Any) -> Tuple[DailySeries, DailySeries]:
+    """Consumption and weather DailySeries from `energy_consumption_data` and `weather_data`."""
+    energy = DailySeries.from_state(
+        state.get("energy_consumption_data"), date_field="record_date", fields=[TARGET_NAME]
+    )
+    weather = DailySeries.from_state(state.get("weather_data"), date_field="date", fields=WEATHER_FEATURES)
+    return energy, weather
+
+
+def join_on_date(energy: DailySeries, weather: DailySeries) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Inner-join consumption and weather on date, keeping the last row per date on either side.
+
+    Returns:
+        (dates, X, Y) where X has one column per WEATHER_FEATURES entry.
+    """
+    # Drop days where the weather API returned nulls.
+    joined = energy.join(weather).dropna([TARGET_NAME] + WEATHER_FEATURES)
+    return joined.dates, joined.values(WEATHER_FEATURES), joined[TARGET_NAME]
+
+
+def fit_baseline_from_state(state: Any) -> RegressionRecord:
+    """
+    Fit Consumption ~ Temperature + Humidity + Dewpoint from session state.
+
+    Reads `energy_consumption_data` and `weather_data`, joins them on date and
+    returns a RegressionRecord. Raises ValueError if there is not enough data.
+    """
+    energy, weather = series_from_state(state)
+    dates, X_values, Y_values = join_on_date(energy, weather)
+    n_features = len(WEATHER_FEATURES)
+    if len(dates) <= n_features:
+        raise ValueError(
+            f"Need more than {n_features} overlapping days of consumption and weather data, "
+            f"got {len(dates)} (consumption={len(energy)}, weather={len(weather)})."
+        )
+
+    fit = fit_ols(X_values, Y_values)
+    coefficients = {name: float(c) for name, c in zip(WEATHER_FEATURES, fit["coef"])}
+    equation = format_equation(TARGET_NAME, fit["intercept"], coefficients)
+    log.info(f"REGRESSION EQUATION- {equation} (R²={fit['r2']:.4f}, NMBE={fit['nmbe']:.4f}, MAPE={fit['mape']:.4f})")
+    change_point = None
+    if REGRESSION_CHANGE_POINT:
+        change_point = fit_change_point(X_values[:, WEATHER_FEATURES.index("temperature")], Y_values)
+    return RegressionRecord(
+        record_date=datetime.now().date().isoformat(),
+        regression_equation=equation,
+        intercept=fit["intercept"],
+        coefficients=coefficients,
+        nmbe=fit["nmbe"],
+        mape=fit["mape"],
+        r2=fit["r2"],
+        n_observations=int(len(dates)),
+        change_point=change_point,
+    )
+
+
+def format_regression_summary(record: RegressionRecord) -> str:
+    """Human readable summary of the fitted baseline."""
+    change_point = ""
+    if record.change_point is not None:
+        cp = record.change_point
+        change_point = (
+            f"\nChange-point model ({cp.model_type}): {cp.equation()}\n"
+            f"R²: {cp.r2:.4f}, CV(RMSE): {cp.cv_rmse:.4f}, NMBE: {cp.nmbe:.4f}"
+        )
+    return (
+        f"Regression equation: {record.regression_equation}\n"
+        f"R²: {record.r2:.4f}, NMBE: {record.nmbe:.4f}, MAPE: {record.mape:.4f} "
+        f"({record.n_observations} days)"
+        f"{change_point}"
+    )
+
+
+def fit_baseline_regression(tool_context: ToolContext) -> Dict[str, Any]:
+    """
+    Fit the baseline regression on the consumption and weather data in session state.
+
+    The result is saved to session state key `regression_record`.
+
+    Returns:
+        dict with status and either the regression record or an error message.
+    """
+    try:
+        record = fit_baseline_from_state(tool_context.state)
+    except (ValueError, KeyError, TypeError) as e:
+        log.error(f"Error fitting baseline regression: {e}")
+        return {"status": "error", "message": str(e)}
+    tool_context.state["regression_record"] = record.model_dump()
+    return {"status": "success", "regression_record": record.model_dump()}
+
+
+async def fit_hourly_baseline_regression(tool_context: ToolContext) -> Dict[str, Any]:
+    """
+    Fit the hourly baseline (hour-of-week levels plus occupied/unoccupied temperature slopes)
+    for the baseline window and location in session state.
+
+    The result is saved to session state key `hourly_regression_record`.
+
+    Returns:
+        dict with status and either the hourly regression record or an error message.
+    """
+    from .hourly_regression import fit_hourly_baseline_from_state
+
+    try:
+        record = await fit_hourly_baseline_from_state(tool_context.state)
+    except Exception as e:
+        log.error(f"Error fitting hourly baseline regression: {e}")
+        return {"status": "error", "message": str(e)}
+    tool_context.state["hourly_regression_record"] = record.model_dump()
+    return {"status": "success", "hourly_regression_record": record.model_dump()}
+
+
+class DeterministicRegressionAgent(BaseAgent):
+    """Regression stage that fits straight from session state without calling the LLM."""
+
+    async def _run_async_impl(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        try:
+            record = fit_baseline_from_state(ctx.session.state)
+        except (ValueError, KeyError, TypeError) as e:
+            log.error(f"Error fitting baseline regression: {e}")
+            yield Event(
+                author=self.name,
+                invocation_id=ctx.invocation_id,
+                branch=ctx.branch,
+                content=types.Content(
+                    role="model",
+                    parts=[types.Part(text=f"Regression failed: {e}")],
+                ),
+            )
+            return
+
+        state_delta = {"regression_record": record.model_dump()}
+        summary = format_regression_summary(record)
+        if BASELINE_HOURLY:
+            from .hourly_regression import fit_hourly_baseline_from_state, format_hourly_summary
+
+            # The daily baseline stands on its own; an hourly failure is reported, not fatal.
+            try:
+                hourly = await fit_hourly_baseline_from_state(ctx.session.state)
+                state_delta["hourly_regression_record"] = hourly.model_dump()
+                summary += "\n" + format_hourly_summary(hourly)
+            except Exception as e:
+                log.error(f"Error fitting hourly baseline regression: {e}")
+                summary += f"\nHourly baseline failed: {e}"
+
+        yield Event(
+            author=self.name,
+            invocation_id=ctx.invocation_id,
+            branch=ctx.branch,
+            content=types.Content(
+                role="model",
+                parts=[types.Part(text=summary)],
+            ),
+            actions=EventActions(state_delta=state_delta),
+        )
+
+
+regression_llm_agent = Agent(
     name="RegressionAgent",
     # https://ai.google.dev/gemini-api/docs/models
     model= Gemini (model="gemini-2.5-flash", retry_options=SHARED_RETRY_CONFIG),
-    # description="Regression agent",
-    # instruction="""
-    # Perform the regression analysis.
-    # Crucially: Respond ONLY with a valid JSON object that strictly adheres to the provided output_schema.
-    # Do not include any introductory or explanatory text.
-    # """,
     description="Agent that calculates the Multiple Linear Regression equation parameters.",
-    instruction=f"""
-    You are an expert in **Multiple Linear Regression**. Your primary task is to read, combine, and analyze data 
-    from the preceding 'Consumption_Agent' and 'Weather_Agent'.
-    
-    1.  **Read History:** Use the BuiltInCodeExecutor to access the entire conversation history. Identify the last JSON output 
-        from the 'Consumption_Agent' and the 'Weather_Agent'.
-    2.  **Combine Data:** Your Python code must load the JSON outputs, clean/normalize the column names and dates (e.g., merge on date), 
-        and combine them into a single pandas DataFrame.
-    3.  **Perform Regression:** Fit the model: **Consumption (C) ~ Temperature (T) + Humidity (H) + Dewpoint (D)** on the combined DataFrame.
-    4.  **Output Parameters:** The final text response MUST clearly present the calculated intercept and coefficients for T, H, and D.
-    
-    CRUCIALLY: Append the final calculated parameters to your response using these machine-readable tags:
-    [INTERCEPT_START] [INTERCEPT_END]
-    [TEMP_COEF_START] [TEMP_COEF_END]
-    [HUMIDITY_COEF_START] [HUMIDITY_COEF_END]
-    [DEWPOINT_COEF_START] [DEWPOINT_COEF_END]
-    """,
-    code_executor=BuiltInCodeExecutor(),
-    # output_schema and output_key should still be omitted if you use the BuiltInCodeExecutor
-)
\ No newline at end of file
+    **context_options("""
+    You are an expert in **Multiple Linear Regression**. Your task is to fit the energy baseline model
+    **Consumption (C) ~ Temperature (T) + Humidity (H) + Dewpoint (D)**.
+
+    1.  **Fit:** Call the fit_baseline_regression tool. It reads the consumption and weather data from session state,
+        joins them on date and fits the model. Do not re-read or re-compute the data yourself.
+    2.  **Output Parameters:** The final text response MUST clearly present the regression equation,
+        the intercept, the coefficients for T, H and D, and the R², NMBE and MAPE metrics returned by the tool.
+        If the tool also returns a `change_point` model, present its type (2P/3PH/3PC/4P/5P), equation,
+        balance temperatures and CV(RMSE) as well.
+    """ + ("""
+    3.  **Hourly:** Also call the fit_hourly_baseline_regression tool and present its temperature slopes
+        (occupied and unoccupied), humidity and dewpoint coefficients, and its R², CV(RMSE) and NMBE.
+    """ if BASELINE_HOURLY else "")),
+    tools=[fit_baseline_regression] + ([fit_hourly_baseline_regression] if BASELINE_HOURLY else []),
+)
+
+regression_fast_agent = DeterministicRegressionAgent(
+    name="RegressionAgent",
+    description="Fits the Multiple Linear Regression baseline directly from session state.",
+)
+
+regression_agent = regression_fast_agent if REGRESSION_FAST_PATH else regression_llm_agent
@@ -0,0 +1,198 @@
+"""
+Batched least-squares regression for many facilities at once.
+
+Facilities are stacked into an (N, D, F) design array padded to the longest
+window, with a boolean (N, D) mask marking real days. Padded rows are zeroed,
+which leaves each facility's least-squares solution unchanged, so all N
+problems are solved with one batched QR factorization instead of N separate
+model fits. `fit_rows_batch` adds the change-point models (fitted in one
+vectorized pass as well) and returns a RegressionRecord per facility.
+"""
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config.settings import REGRESSION_CHANGE_POINT
+
+from .agent import RegressionRecord, TARGET_NAME, WEATHER_FEATURES, format_equation, join_on_date, series_from_state
+from .change_point import fit_change_point_batch
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchRegressionResult:
+    """Per-facility fit results as arrays aligned with the input stacking order."""
+    intercept: np.ndarray      # (N,)
+    coef: np.ndarray           # (N, F)
+    r2: np.ndarray             # (N,)
+    nmbe: np.ndarray           # (N,)
+    mape: np.ndarray           # (N,)
+    n_observations: np.ndarray  # (N,)
+    predictions: np.ndarray    # (N, D), zero where masked
+
+
+def stack_facilities(
+    facilities: Sequence[Tuple[np.ndarray, np.ndarray]],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pad per-facility (X, y) pairs of different lengths into stacked arrays.
+
+    Returns:
+        X of shape (N, D, F), y of shape (N, D) and mask of shape (N, D).
+    """
+    n = len(facilities)
+    if n == 0:
+        return np.empty((0, 0, 0)), np.empty((0, 0)), np.empty((0, 0), dtype=bool)
+    first = np.asarray(facilities[0][0])
+    n_features = first.shape[1] if first.ndim == 2 else 1
+    max_days = max(len(y) for _, y in facilities)
+    X = np.zeros((n, max_days, n_features))
+    y = np.zeros((n, max_days))
+    mask = np.zeros((n, max_days), dtype=bool)
+    for i, (xi, yi) in enumerate(facilities):
+        d = len(yi)
+        X[i, :d] = np.asarray(xi, dtype=np.float64).reshape(d, n_features)
+        y[i, :d] = yi
+        mask[i, :d] = True
+    return X, y, mask
+
+
+def fit_ols_batch(X: np.ndarray, y: np.ndarray, mask: Optional[np.ndarray] = None) -> BatchRegressionResult:
+    """
+    Fit y ~ intercept + X for every facility in one batched solve.
+
+    Parameters:
+        X: (N, D, F) independent variables
+        y: (N, D) dependent variable
+        mask: (N, D) True for real observations; defaults to all finite rows
+
+    Returns:
+        BatchRegressionResult with coefficients and R², NMBE and MAPE per facility.
+        Facilities with too few observations get NaN results.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n, d, f = X.shape
+    if mask is None:
+        mask = np.ones((n, d), dtype=bool)
+    mask = mask & np.isfinite(y) & np.isfinite(X).all(axis=2)
+    w = mask.astype(np.float64)
+
+    # Intercept column plus features, with masked rows zeroed out.
+    design = np.empty((n, d, f + 1))
+    design[:, :, 0] = w
+    design[:, :, 1:] = np.where(mask[:, :, None], X, 0.0)
+    target = np.where(mask, y, 0.0)
+    counts = w.sum(axis=1)
+
+    beta = np.full((n, f + 1), np.nan)
+    solvable = counts > f
+    if solvable.any():
+        q, r = np.linalg.qr(design[solvable])
+        qty = np.einsum("ndp,nd->np", q, target[solvable])
+        diag = np.abs(np.diagonal(r, axis1=1, axis2=2))
+        well_posed = (diag > 1e-10 * np.maximum(diag.max(axis=1, keepdims=True), 1.0)).all(axis=1)
+        solved = np.full((int(solvable.sum()), f + 1), np.nan)
+        if well_posed.any():
+            solved[well_posed] = np.linalg.solve(r[well_posed], qty[well_posed][..., None])[..., 0]
+        if (~well_posed).any():
+            # Rank-deficient facilities (e.g. constant weather) fall back to the minimum-norm solution.
+            solved[~well_posed] = np.einsum(
+                "npd,nd->np", np.linalg.pinv(design[solvable][~well_posed]), target[solvable][~well_posed]
+            )
+        beta[solvable] = solved
+
+    predictions = np.einsum("ndp,np->nd", design, np.nan_to_num(beta))
+    residuals = np.where(mask, y - predictions, 0.0)
+    safe_counts = np.maximum(counts, 1.0)
+    mean_y = target.sum(axis=1) / safe_counts
+    ss_res = (residuals ** 2).sum(axis=1)
+    ss_tot = (np.where(mask, y - mean_y[:, None], 0.0) ** 2).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r2 = np.where(ss_tot > 0, 1.0 - ss_res / ss_tot, 0.0)
+        nmbe = residuals.sum(axis=1) / safe_counts / mean_y
+        eps = np.finfo(np.float64).eps
+        mape = (np.abs(residuals) / np.maximum(np.abs(np.where(mask, y, 1.0)), eps) * w).sum(axis=1) / safe_counts
+
+    invalid = np.isnan(beta).any(axis=1)
+    r2[invalid] = nmbe[invalid] = mape[invalid] = np.nan
+    return BatchRegressionResult(
+        intercept=beta[:, 0],
+        coef=beta[:, 1:],
+        r2=r2,
+        nmbe=nmbe,
+        mape=mape,
+        n_observations=counts.astype(np.int64),
+        predictions=np.where(mask, predictions, 0.0),
+    )
+
+
+def fit_rows_batch(
+    facilities: Sequence[Tuple[np.ndarray, np.ndarray]], features: Sequence[str] = WEATHER_FEATURES
+) -> List[Optional[RegressionRecord]]:
+    """
+    The RegressionRecord of each (X, y) pair, from one batched solve.
+
+    X columns are `features`. Facilities with no more days than features get None.
+    """
+    if not facilities:
+        return []
+    X, y, mask = stack_facilities(facilities)
+    fit = fit_ols_batch(X, y, mask)
+    change_points: List[Any] = [None] * len(facilities)
+    if REGRESSION_CHANGE_POINT and "temperature" in features:
+        column = list(features).index("temperature")
+        change_points = fit_change_point_batch(
+            [(np.asarray(X_i, dtype=np.float64).reshape(len(y_i), -1)[:, column], y_i) for X_i, y_i in facilities]
+        )
+    record_date = datetime.now().date().isoformat()
+    log.info(f"Fitted {len(facilities)} facilities in one batched solve")
+
+    records: List[Optional[RegressionRecord]] = []
+    for i in range(len(facilities)):
+        if np.isnan(fit.intercept[i]):
+            records.append(None)
+            continue
+        coefficients = {name: float(c) for name, c in zip(features, fit.coef[i])}
+        records.append(RegressionRecord(
+            record_date=record_date,
+            regression_equation=format_equation(TARGET_NAME, float(fit.intercept[i]), coefficients),
+            intercept=float(fit.intercept[i]),
+            coefficients=coefficients,
+            nmbe=float(fit.nmbe[i]),
+            mape=float(fit.mape[i]),
+            r2=float(fit.r2[i]),
+            n_observations=int(fit.n_observations[i]),
+            change_point=change_points[i],
+        ))
+    return records
+
+
+def fit_states_batch(states: Mapping[str, Mapping[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Fit the baseline regression for many facilities from their session-state style dicts.
+
+    Each value must hold `energy_consumption_data` and `weather_data`, as written by
+    the data agents. Returns {facility_id: RegressionRecord dict}, or an error dict
+    for facilities without enough data.
+    """
+    ids = list(states)
+    facilities = []
+    for facility_id in ids:
+        _, X_values, Y_values = join_on_date(*series_from_state(states[facility_id]))
+        facilities.append((X_values, Y_values))
+
+    results = {}
+    for facility_id, (_, y), record in zip(ids, facilities, fit_rows_batch(facilities)):
+        if record is None:
+            results[facility_id] = {
+                "status": "error",
+                "message": f"Need more than {len(WEATHER_FEATURES)} overlapping days, got {len(y)}.",
+            }
+        else:
+            results[facility_id] = record.model_dump()
+    return results
@@ -0,0 +1,467 @@
+"""
+ASHRAE Guideline 14 change-point models of consumption against temperature.
+
+Supported models:
+    2P   y = b0 + b1*T
+    3PH  y = b0 + bh*max(Th - T, 0)                       (heating, bh > 0)
+    3PC  y = b0 + bc*max(T - Tc, 0)                       (cooling, bc > 0)
+    4P   y = b0 + bh*max(Tb - T, 0) + bc*max(T - Tb, 0)   (one change point, free slopes)
+    5P   y = b0 + bh*max(Th - T, 0) + bc*max(T - Tc, 0)   (Th < Tc, bh > 0, bc > 0)
+
+The balance-point search does not refit per candidate. Temperatures are sorted
+once and prefix sums of T, T², y and T·y give, for every candidate balance
+point at once, the sums needed for each model's normal equations. Because
+heating and cooling hinges never overlap, those equations solve in closed
+form element-wise across all candidates, and the best candidate is chosen by
+residual sum of squares. For the 5P grid of (Th, Tc) pairs, the terms that
+depend on one hinge are computed per candidate and only combined per pair.
+Between models, the lowest CV(RMSE) (with n - p degrees of freedom) wins, ties
+going to fewer parameters.
+
+`fit_change_point_batch` runs the same search for many facilities at once, as
+array operations over (facility, candidate) on padded, per-facility sorted data.
+"""
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+
+log = logging.getLogger(__name__)
+
+MODEL_TYPES = ["2P", "3PH", "3PC", "4P", "5P"]
+N_PARAMS = {"2P": 2, "3PH": 3, "3PC": 3, "4P": 4, "5P": 5}
+
+
+class ChangePointModel(BaseModel):
+    model_type: str
+    intercept: float
+    slope: float = 0.0                  # 2P only
+    heating_slope: float = 0.0
+    cooling_slope: float = 0.0
+    heating_balance_c: Optional[float] = None
+    cooling_balance_c: Optional[float] = None
+    r2: float
+    cv_rmse: float
+    nmbe: float
+    n_observations: int
+
+    def predict(self, temperature: np.ndarray) -> np.ndarray:
+        t = np.asarray(temperature, dtype=np.float64)
+        y = np.full(t.shape, self.intercept) + self.slope * t
+        if self.heating_balance_c is not None:
+            y += self.heating_slope * np.maximum(self.heating_balance_c - t, 0.0)
+        if self.cooling_balance_c is not None:
+            y += self.cooling_slope * np.maximum(t - self.cooling_balance_c, 0.0)
+        return y
+
+    def equation(self) -> str:
+        parts = [f"{self.intercept:.4f}"]
+        if self.model_type == "2P":
+            parts.append(f"({self.slope:.4f} * T)")
+        if self.heating_balance_c is not None:
+            parts.append(f"({self.heating_slope:.4f} * max({self.heating_balance_c:.2f} - T, 0))")
+        if self.cooling_balance_c is not None:
+            parts.append(f"({self.cooling_slope:.4f} * max(T - {self.cooling_balance_c:.2f}, 0))")
+        return "consumption_kwh = " + " + ".join(parts)
+
+
+class _SortedSums:
+    """Prefix sums over temperature-sorted data, evaluated at candidate balance points."""
+
+    def __init__(self, t: np.ndarray, y: np.ndarray):
+        order = np.argsort(t, kind="stable")
+        self.t = t[order]
+        self.y = y[order]
+        zero = np.zeros(1)
+        self.c_t = np.concatenate([zero, np.cumsum(self.t)])
+        self.c_tt = np.concatenate([zero, np.cumsum(self.t * self.t)])
+        self.c_y = np.concatenate([zero, np.cumsum(self.y)])
+        self.c_ty = np.concatenate([zero, np.cumsum(self.t * self.y)])
+        self.n = len(t)
+        self.sum_y = self.c_y[-1]
+        self.sum_yy = float(self.y @ self.y)
+
+    def heating(self, cp: np.ndarray):
+        """Sums of h = max(cp - T, 0): (count, Σh, Σh², Σhy) for each candidate."""
+        k = np.searchsorted(self.t, cp, side="left")
+        st, stt, sy, sty = self.c_t[k], self.c_tt[k], self.c_y[k], self.c_ty[k]
+        return k, k * cp - st, k * cp * cp - 2 * cp * st + stt, cp * sy - sty
+
+    def cooling(self, cp: np.ndarray):
+        """Sums of c = max(T - cp, 0): (count, Σc, Σc², Σcy) for each candidate."""
+        k = np.searchsorted(self.t, cp, side="right")
+        m = self.n - k
+        st = self.c_t[-1] - self.c_t[k]
+        stt = self.c_tt[-1] - self.c_tt[k]
+        sy = self.c_y[-1] - self.c_y[k]
+        sty = self.c_ty[-1] - self.c_ty[k]
+        return m, st - m * cp, stt - 2 * cp * st + m * cp * cp, sty - cp * sy
+
+
+def _solve_hinges(n: float, sum_y: float, sum_yy: float, hinges) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Closed-form least squares for an intercept plus hinge features that never overlap.
+
+    Each hinge is (Σf, Σf², Σfy) evaluated for every candidate. Heating and
+    cooling hinges are never both non-zero on the same day, so the normal
+    equations are an arrowhead system that solves element-wise:
+        b_f = (Σfy - Σf * b0) / Σf²
+        b0  = (Σy - Σ_f Σf Σfy / Σf²) / (n - Σ_f (Σf)² / Σf²)
+
+    Returns:
+        beta of shape (m, 1 + len(hinges)) and SSE of shape (m,), inf where singular.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        numerator = np.full(np.shape(hinges[0][0]), sum_y, dtype=np.float64)
+        denominator = np.full(np.shape(hinges[0][0]), n, dtype=np.float64)
+        for f1, f2, fy in hinges:
+            numerator = numerator - f1 * fy / f2
+            denominator = denominator - f1 * f1 / f2
+        b0 = numerator / denominator
+        beta = [b0]
+        fitted = b0 * sum_y
+        for f1, f2, fy in hinges:
+            b = (fy - f1 * b0) / f2
+            beta.append(b)
+            fitted = fitted + b * fy
+        sse = sum_yy - fitted
+        # Hinges with no spread, or (almost) collinear with the intercept, are singular.
+        singular = ~np.isfinite(sse) | (denominator <= 1e-9 * n)
+        for _, f2, _ in hinges:
+            singular |= f2 <= 1e-12
+    sse = np.where(singular, np.inf, np.maximum(sse, 0.0))
+    return np.stack(beta, axis=-1), sse
+
+
+def _hinge_terms(count, f1, f2, fy, min_segment: int):
+    """Per-candidate terms of one hinge in the _solve_hinges solution, and whether the candidate is usable."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return f1 * fy / f2, f1 * f1 / f2, fy * fy / f2, fy / f2, f1 / f2, (count >= min_segment) & (f2 > 1e-12)
+
+
+def _best_hinge_pair(n, sum_y, sum_yy, heating, cooling, i: np.ndarray, j: np.ndarray, min_segment: int):
+    """
+    Best 5P fit over the candidate pairs (i[p], j[p]): heating hinge at i, cooling hinge at j.
+
+    `heating` and `cooling` are (count, Σf, Σf², Σfy) per candidate along the last
+    axis, as _SortedSums gives them. The terms of the _solve_hinges solution that
+    depend on one hinge only are computed per candidate and combined per pair:
+        b0  = (Σy - A_h - A_c) / (n - B_h - B_c)       A = Σf Σfy / Σf², B = (Σf)² / Σf²
+        SSE = Σy² - b0 (Σy - A_h - A_c) - Q_h - Q_c    Q = (Σfy)² / Σf²
+    Both slopes must be positive; they are only solved in full for the best pair.
+
+    Returns:
+        beta (b0, heating slope, cooling slope), SSE (inf if no pair is valid) and
+        the best pair index, each along the leading axes.
+    """
+    a_h, b_h, q_h, u_h, v_h, ok_h = _hinge_terms(*heating, min_segment)
+    a_c, b_c, q_c, u_c, v_c, ok_c = _hinge_terms(*cooling, min_segment)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        numerator = sum_y - a_h[..., i] - a_c[..., j]
+        denominator = n - b_h[..., i] - b_c[..., j]
+        b0 = numerator / denominator
+        sse = sum_yy - b0 * numerator - q_h[..., i] - q_c[..., j]
+        valid = (
+            ok_h[..., i] & ok_c[..., j] & (denominator > 1e-9 * n) & np.isfinite(sse)
+            & (u_h[..., i] - v_h[..., i] * b0 > 0) & (u_c[..., j] - v_c[..., j] * b0 > 0)
+        )
+    sse = np.where(valid, np.maximum(sse, 0.0), np.inf)
+
+    def pick(values: np.ndarray, index: np.ndarray) -> np.ndarray:
+        return np.take_along_axis(values, index[..., None], axis=-1)[..., 0]
+
+    best = np.argmin(sse, axis=-1)
+    b0 = pick(b0, best)
+    _, h1, h2, hy = heating
+    _, c1, c2, cy = cooling
+    with np.errstate(divide="ignore", invalid="ignore"):
+        heating_slope = (pick(hy, i[best]) - pick(h1, i[best]) * b0) / pick(h2, i[best])
+        cooling_slope = (pick(cy, j[best]) - pick(c1, j[best]) * b0) / pick(c2, j[best])
+    return np.stack([b0, heating_slope, cooling_slope], axis=-1), pick(sse, best), best
+
+
+def candidate_balance_points(t: np.ndarray, n_candidates: int = 100, trim: float = 0.1) -> np.ndarray:
+    """Evenly spaced candidates between the trim and 1 - trim temperature quantiles."""
+    lo, hi = np.quantile(t, [trim, 1.0 - trim])
+    if hi <= lo:
+        return np.array([lo])
+    return np.linspace(lo, hi, n_candidates)
+
+
+def _fit_all(
+    t: np.ndarray, y: np.ndarray, candidates: np.ndarray, min_segment: int
+) -> Dict[str, Tuple[np.ndarray, float, float, float]]:
+    """Best (beta, sse, heating_balance, cooling_balance) for each model type."""
+    s = _SortedSums(t, y)
+    n = float(s.n)
+    results = {}
+
+    # 2P: ordinary regression on T.
+    sxx = s.c_tt[-1] - s.c_t[-1] ** 2 / n
+    if sxx > 1e-12:
+        slope = (s.c_ty[-1] - s.c_t[-1] * s.sum_y / n) / sxx
+        b0 = (s.sum_y - slope * s.c_t[-1]) / n
+        sse = max(s.sum_yy - b0 * s.sum_y - slope * s.c_ty[-1], 0.0)
+        results["2P"] = (np.array([b0, slope]), float(sse), None, None)
+
+    kh, h1, h2, hy = s.heating(candidates)
+    kc, c1, c2, cy = s.cooling(candidates)
+
+    # 3PH / 3PC: intercept plus one hinge feature.
+    beta, sse = _solve_hinges(n, s.sum_y, s.sum_yy, [(h1, h2, hy)])
+    sse[(kh < min_segment) | ~(beta[:, 1] > 0)] = np.inf
+    results["3PH"] = _best(beta, sse, candidates, heating=True, cooling=False)
+
+    beta, sse = _solve_hinges(n, s.sum_y, s.sum_yy, [(c1, c2, cy)])
+    sse[(kc < min_segment) | ~(beta[:, 1] > 0)] = np.inf
+    results["3PC"] = _best(beta, sse, candidates, heating=False, cooling=True)
+
+    # 4P: heating and cooling hinges at the same point, slopes unconstrained.
+    beta, sse = _solve_hinges(n, s.sum_y, s.sum_yy, [(h1, h2, hy), (c1, c2, cy)])
+    sse[(kh < min_segment) | (kc < min_segment)] = np.inf
+    results["4P"] = _best(beta, sse, candidates, heating=True, cooling=True)
+
+    # 5P: every (Th, Tc) pair with Th < Tc.
+    i, j = np.triu_indices(len(candidates), k=1)
+    if len(i):
+        beta, sse, b = _best_hinge_pair(
+            n, s.sum_y, s.sum_yy, (kh, h1, h2, hy), (kc, c1, c2, cy), i, j, min_segment
+        )
+        if np.isfinite(sse):
+            results["5P"] = (beta, float(sse), float(candidates[i[b]]), float(candidates[j[b]]))
+    return results
+
+
+def _best(beta, sse, candidates, heating: bool, cooling: bool):
+    if not np.isfinite(sse).any():
+        return None
+    b = int(np.argmin(sse))
+    cp = float(candidates[b])
+    return beta[b], float(sse[b]), cp if heating else None, cp if cooling else None
+
+
+def fit_change_point(
+    temperature: Sequence[float],
+    consumption: Sequence[float],
+    models: Sequence[str] = MODEL_TYPES,
+    n_candidates: int = 100,
+    min_segment: int = 3,
+) -> Optional[ChangePointModel]:
+    """
+    Fit every requested change-point model and return the one with the lowest CV(RMSE).
+
+    Returns:
+        ChangePointModel, or None if there is not enough data.
+    """
+    t = np.asarray(temperature, dtype=np.float64)
+    y = np.asarray(consumption, dtype=np.float64)
+    valid = np.isfinite(t) & np.isfinite(y)
+    t, y = t[valid], y[valid]
+    n = len(y)
+    if n < 6 or y.mean() == 0:
+        return None
+
+    fits = _fit_all(t, y, candidate_balance_points(t, n_candidates), min_segment)
+    ss_tot = float(((y - y.mean()) ** 2).sum())
+    best: Optional[ChangePointModel] = None
+    for model_type in MODEL_TYPES:
+        fit = fits.get(model_type)
+        if model_type not in models or fit is None:
+            continue
+        beta, sse, heating_balance, cooling_balance = fit
+        p = N_PARAMS[model_type]
+        if n <= p or not np.all(np.isfinite(beta)):
+            continue
+        model = ChangePointModel(
+            model_type=model_type,
+            intercept=float(beta[0]),
+            slope=float(beta[1]) if model_type == "2P" else 0.0,
+            heating_slope=float(beta[1]) if heating_balance is not None else 0.0,
+            cooling_slope=float(beta[-1]) if cooling_balance is not None else 0.0,
+            heating_balance_c=heating_balance,
+            cooling_balance_c=cooling_balance,
+            r2=1.0 - sse / ss_tot if ss_tot > 0 else 0.0,
+            cv_rmse=float(np.sqrt(sse / (n - p)) / y.mean()),
+            nmbe=0.0,
+            n_observations=n,
+        )
+        model.nmbe = float((y - model.predict(t)).sum() / ((n - p) * y.mean()))
+        if best is None or model.cv_rmse < best.cv_rmse - 1e-12:
+            best = model
+    if best is not None:
+        log.info(f"Selected {best.model_type} change-point model: {best.equation()} (CV(RMSE)={best.cv_rmse:.4f})")
+    return best
+
+
+# Facilities per vectorized chunk in fit_change_point_batch; bounds the (chunk, pairs) 5P grid.
+BATCH_CHUNK = 64
+
+
+def _quantile_sorted(ts: np.ndarray, lengths: np.ndarray, q: float) -> np.ndarray:
+    """np.quantile(..., q) ("linear") of each row's first `lengths` sorted values."""
+    position = q * (lengths - 1)
+    lo = np.floor(position).astype(np.int64)
+    hi = np.minimum(lo + 1, lengths - 1)
+    gamma = position - lo
+    a = np.take_along_axis(ts, lo[:, None], axis=1)[:, 0]
+    b = np.take_along_axis(ts, hi[:, None], axis=1)[:, 0]
+    diff = b - a
+    return np.where(gamma >= 0.5, b - diff * (1.0 - gamma), a + diff * gamma)
+
+
+def _best_rows(beta: np.ndarray, sse: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Per facility: index of the lowest-SSE candidate, its beta and its SSE (inf if none is valid)."""
+    index = np.argmin(sse, axis=1)
+    rows = np.arange(len(sse))
+    return index, beta[rows, index], sse[rows, index]
+
+
+def _fit_chunk(
+    pairs: Sequence[Tuple[np.ndarray, np.ndarray]], models: Sequence[str], n_candidates: int, min_segment: int
+) -> List[Optional[ChangePointModel]]:
+    """fit_change_point for (t, y) pairs that are finite, at least 6 days long and with non-zero mean."""
+    lengths = np.array([len(y) for _, y in pairs], dtype=np.int64)
+    # Padding sorts last (inf) and adds nothing to the sums (zero).
+    ts = np.full((len(pairs), int(lengths.max())), np.inf)
+    ys = np.zeros(ts.shape)
+    for f, (t, y) in enumerate(pairs):
+        ts[f, :len(t)], ys[f, :len(y)] = t, y
+    order = np.argsort(ts, axis=1, kind="stable")
+    ts, ys = np.take_along_axis(ts, order, axis=1), np.take_along_axis(ys, order, axis=1)
+    tv = np.where(np.isfinite(ts), ts, 0.0)
+
+    zero = np.zeros((len(pairs), 1))
+    c_t = np.concatenate([zero, np.cumsum(tv, axis=1)], axis=1)
+    c_tt = np.concatenate([zero, np.cumsum(tv * tv, axis=1)], axis=1)
+    c_y = np.concatenate([zero, np.cumsum(ys, axis=1)], axis=1)
+    c_ty = np.concatenate([zero, np.cumsum(tv * ys, axis=1)], axis=1)
+    n = lengths.astype(np.float64)
+    sum_t, sum_tt, sum_y, sum_ty = c_t[:, -1], c_tt[:, -1], c_y[:, -1], c_ty[:, -1]
+    sum_yy = np.einsum("nd,nd->n", ys, ys)
+    mean_y = np.array([y.mean() for _, y in pairs])
+
+    # Candidate balance points, as candidate_balance_points gives for each facility.
+    lo, hi = _quantile_sorted(ts, lengths, 0.1), _quantile_sorted(ts, lengths, 0.9)
+    degenerate = ~(hi > lo)
+    cp = np.linspace(lo, np.where(degenerate, lo, hi), n_candidates, axis=-1)
+
+    def take(c: np.ndarray, k: np.ndarray) -> np.ndarray:
+        return np.take_along_axis(c, k, axis=1)
+
+    # Heating and cooling hinge sums for every (facility, candidate), as _SortedSums gives them.
+    kh = (ts[:, None, :] < cp[:, :, None]).sum(axis=2)
+    st, stt, sy, sty = take(c_t, kh), take(c_tt, kh), take(c_y, kh), take(c_ty, kh)
+    h1, h2, hy = kh * cp - st, kh * cp * cp - 2 * cp * st + stt, cp * sy - sty
+    k = (ts[:, None, :] <= cp[:, :, None]).sum(axis=2)
+    kc = lengths[:, None] - k
+    st, stt = sum_t[:, None] - take(c_t, k), sum_tt[:, None] - take(c_tt, k)
+    sy, sty = sum_y[:, None] - take(c_y, k), sum_ty[:, None] - take(c_ty, k)
+    c1, c2, cy = st - kc * cp, stt - 2 * cp * st + kc * cp * cp, sty - cp * sy
+
+    totals = (n[:, None], sum_y[:, None], sum_yy[:, None])
+    zeros, none = np.zeros(len(pairs)), np.full(len(pairs), np.nan)
+    # model type: (intercept, slope, heating slope, cooling slope, heating balance, cooling balance, sse);
+    # a NaN balance means the model has no such hinge.
+    fits: Dict[str, Tuple[np.ndarray, ...]] = {}
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sxx = sum_tt - sum_t ** 2 / n
+        slope = (sum_ty - sum_t * sum_y / n) / sxx
+        b0 = (sum_y - slope * sum_t) / n
+        sse = np.where(sxx > 1e-12, np.maximum(sum_yy - b0 * sum_y - slope * sum_ty, 0.0), np.inf)
+    fits["2P"] = (b0, slope, zeros, zeros, none, none, sse)
+
+    beta, sse = _solve_hinges(*totals, [(h1, h2, hy)])
+    sse[(kh < min_segment) | ~(beta[..., 1] > 0)] = np.inf
+    index, best, sse = _best_rows(beta, sse)
+    fits["3PH"] = (best[:, 0], zeros, best[:, 1], zeros, take(cp, index[:, None])[:, 0], none, sse)
+
+    beta, sse = _solve_hinges(*totals, [(c1, c2, cy)])
+    sse[(kc < min_segment) | ~(beta[..., 1] > 0)] = np.inf
+    index, best, sse = _best_rows(beta, sse)
+    fits["3PC"] = (best[:, 0], zeros, zeros, best[:, 1], none, take(cp, index[:, None])[:, 0], sse)
+
+    beta, sse = _solve_hinges(*totals, [(h1, h2, hy), (c1, c2, cy)])
+    sse[(kh < min_segment) | (kc < min_segment)] = np.inf
+    index, best, sse = _best_rows(beta, sse)
+    balance = take(cp, index[:, None])[:, 0]
+    fits["4P"] = (best[:, 0], zeros, best[:, 1], best[:, 2], balance, balance, sse)
+
+    i, j = np.triu_indices(n_candidates, k=1)
+    best, sse, index = _best_hinge_pair(*totals, (kh, h1, h2, hy), (kc, c1, c2, cy), i, j, min_segment)
+    sse[degenerate] = np.inf            # a single candidate has no (Th, Tc) pairs
+    fits["5P"] = (
+        best[:, 0], zeros, best[:, 1], best[:, 2],
+        take(cp, i[index][:, None])[:, 0], take(cp, j[index][:, None])[:, 0], sse,
+    )
+
+    # Lowest CV(RMSE) across model types, as in fit_change_point.
+    winner = np.full(len(pairs), -1)
+    best_cv = np.full(len(pairs), np.inf)
+    for m, model_type in enumerate(MODEL_TYPES):
+        if model_type not in models:
+            continue
+        fit = fits[model_type]
+        p = N_PARAMS[model_type]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cv = np.sqrt(fit[6] / (n - p)) / mean_y
+        better = np.isfinite(np.stack(fit[:4] + fit[6:])).all(axis=0) & (n > p) & (cv < best_cv - 1e-12)
+        winner[better], best_cv[better] = m, cv[better]
+
+    results: List[Optional[ChangePointModel]] = []
+    for f, m in enumerate(winner):
+        if m < 0:
+            results.append(None)
+            continue
+        model_type = MODEL_TYPES[m]
+        intercept, slope, heating, cooling, hb, cb, sse = (float(v[f]) for v in fits[model_type])
+        t, y = pairs[f]
+        ss_tot = float(((y - mean_y[f]) ** 2).sum())
+        model = ChangePointModel(
+            model_type=model_type,
+            intercept=intercept,
+            slope=slope,
+            heating_slope=heating,
+            cooling_slope=cooling,
+            heating_balance_c=None if np.isnan(hb) else hb,
+            cooling_balance_c=None if np.isnan(cb) else cb,
+            r2=1.0 - sse / ss_tot if ss_tot > 0 else 0.0,
+            cv_rmse=float(best_cv[f]),
+            nmbe=0.0,
+            n_observations=len(y),
+        )
+        p = N_PARAMS[model_type]
+        model.nmbe = float((y - model.predict(t)).sum() / ((len(y) - p) * mean_y[f]))
+        results.append(model)
+    return results
+
+
+def fit_change_point_batch(
+    facilities: Sequence[Tuple[Sequence[float], Sequence[float]]],
+    models: Sequence[str] = MODEL_TYPES,
+    n_candidates: int = 100,
+    min_segment: int = 3,
+) -> List[Optional[ChangePointModel]]:
+    """
+    Fit change-point models for many (temperature, consumption) pairs.
+
+    Facilities are padded to a common length in chunks of BATCH_CHUNK, and the
+    balance-point search and model choice of a whole chunk are array operations
+    over (facility, candidate). The models match fit_change_point on each pair
+    to floating-point rounding; facilities without enough data get None.
+    """
+    pairs = []
+    for temperature, consumption in facilities:
+        t = np.asarray(temperature, dtype=np.float64)
+        y = np.asarray(consumption, dtype=np.float64)
+        valid = np.isfinite(t) & np.isfinite(y)
+        pairs.append((t[valid], y[valid]))
+    fittable = [f for f, (_, y) in enumerate(pairs) if len(y) >= 6 and y.mean() != 0]
+    results: List[Optional[ChangePointModel]] = [None] * len(pairs)
+    for start in range(0, len(fittable), BATCH_CHUNK):
+        chunk = fittable[start:start + BATCH_CHUNK]
+        for f, model in zip(chunk, _fit_chunk([pairs[f] for f in chunk], models, n_candidates, min_segment)):
+            results[f] = model
+    log.info(f"Fitted change-point models for {len(fittable)} of {len(pairs)} facilities")
+    return results
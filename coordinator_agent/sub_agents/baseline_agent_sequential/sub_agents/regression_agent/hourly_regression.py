@@ -0,0 +1,219 @@
+"""
+Hourly baselines fitted out of core from the normal equations.
+
+The model is a time-of-week and temperature model:
+
+    consumption_kwh = a[hour_of_week]
+                      + b_occ * T * occupied + b_unocc * T * (1 - occupied)
+                      + b_h * humidity + b_d * dewpoint
+
+with one level per hour of the week (168, Monday 00:00 = 0) in place of an
+intercept, and separate temperature slopes in occupied and unoccupied hours.
+
+The full design matrix is never built. Rows are read HOURLY_CHUNK_ROWS at a
+time and each chunk's contribution to XᵀX and Xᵀy is added to float64 running
+sums. The one-hot hour-of-week block is accumulated with np.bincount, so a chunk
+costs O(rows × dense features) and the accumulator is a fixed 172 × 172 matrix,
+whatever the number of rows. A second pass over the chunks computes the
+residual metrics (CV(RMSE), NMBE, MAPE and R²). Chunks can come from memory
+(`fit_hourly`) or be re-read from disk (`fit_hourly_chunks`).
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from config.settings import HOURLY_CHUNK_ROWS, HOURLY_OCCUPIED_DAYS, HOURLY_OCCUPIED_HOURS
+
+from ..hourly_series import HOURS_PER_WEEK, HourlySeries, hour_of_week, occupied_mask
+from .agent import TARGET_NAME
+
+log = logging.getLogger(__name__)
+
+HOURLY_FEATURES = ["temperature_occupied", "temperature_unoccupied", "humidity", "dewpoint"]
+HOURLY_WEATHER = ["temperature", "humidity", "dewpoint"]
+
+
+def dense_features(chunk: HourlySeries, occupied: np.ndarray) -> np.ndarray:
+    """(rows, len(HOURLY_FEATURES)) float64 block of the design for one chunk."""
+    temperature = chunk["temperature"].astype(np.float64)
+    dense = np.empty((len(chunk), len(HOURLY_FEATURES)))
+    dense[:, 0] = np.where(occupied, temperature, 0.0)
+    dense[:, 1] = np.where(occupied, 0.0, temperature)
+    dense[:, 2] = chunk["humidity"]
+    dense[:, 3] = chunk["dewpoint"]
+    return dense
+
+
+class HourlyNormalEquations:
+    """Running XᵀX and Xᵀy of the hourly design, one chunk at a time."""
+
+    def __init__(self, occupied_hours: str = HOURLY_OCCUPIED_HOURS, occupied_days: str = HOURLY_OCCUPIED_DAYS):
+        self.occupied_hours = occupied_hours
+        self.occupied_days = occupied_days
+        k = len(HOURLY_FEATURES)
+        self.counts = np.zeros(HOURS_PER_WEEK)            # diagonal of the one-hot block
+        self.cross = np.zeros((HOURS_PER_WEEK, k))        # one-hot × dense block
+        self.dense = np.zeros((k, k))                     # dense × dense block
+        self.how_y = np.zeros(HOURS_PER_WEEK)
+        self.dense_y = np.zeros(k)
+        self.n = 0
+        self.sum_y = 0.0
+        self.chunks = 0
+
+    def add(self, chunk: HourlySeries) -> None:
+        """Fold in one chunk with columns temperature, humidity, dewpoint and consumption_kwh (no NaNs)."""
+        how = hour_of_week(chunk.times)
+        dense = dense_features(chunk, occupied_mask(how, self.occupied_hours, self.occupied_days))
+        y = chunk[TARGET_NAME].astype(np.float64)
+        self.counts += np.bincount(how, minlength=HOURS_PER_WEEK)
+        for j in range(dense.shape[1]):
+            self.cross[:, j] += np.bincount(how, weights=dense[:, j], minlength=HOURS_PER_WEEK)
+        self.dense += dense.T @ dense
+        self.how_y += np.bincount(how, weights=y, minlength=HOURS_PER_WEEK)
+        self.dense_y += dense.T @ y
+        self.n += len(y)
+        self.sum_y += float(y.sum())
+        self.chunks += 1
+
+    def solve(self) -> Dict[str, Any]:
+        """Hour-of-week levels (NaN for hours never seen) and dense coefficients."""
+        seen = self.counts > 0
+        k = len(HOURLY_FEATURES)
+        m = int(seen.sum())
+        xtx = np.zeros((m + k, m + k))
+        xtx[np.arange(m), np.arange(m)] = self.counts[seen]
+        xtx[:m, m:] = self.cross[seen]
+        xtx[m:, :m] = self.cross[seen].T
+        xtx[m:, m:] = self.dense
+        xty = np.concatenate([self.how_y[seen], self.dense_y])
+        if self.n <= m + k:
+            raise ValueError(f"Need more than {m + k} hours of consumption and weather data, got {self.n}.")
+        try:
+            beta = np.linalg.solve(xtx, xty)
+        except np.linalg.LinAlgError:
+            # Rank-deficient weather (e.g. no unoccupied hours): minimum-norm solution, as lstsq gives.
+            beta = np.linalg.pinv(xtx) @ xty
+        levels = np.full(HOURS_PER_WEEK, np.nan)
+        levels[seen] = beta[:m]
+        return {"levels": levels, "coef": beta[m:], "n_params": m + k}
+
+
+class HourlyRegressionRecord(BaseModel):
+    record_date: str
+    # Level per hour of week, 0 = Monday 00:00; None for hours missing from the baseline window.
+    hour_of_week_intercepts: List[Optional[float]]
+    coefficients: Dict[str, float] = Field(default_factory=dict)
+    occupied_hours: str = HOURLY_OCCUPIED_HOURS
+    occupied_days: str = HOURLY_OCCUPIED_DAYS
+    r2: float
+    cv_rmse: float
+    nmbe: float
+    mape: float
+    n_observations: int = 0
+    chunks: int = 0
+
+    def predict(self, chunk: HourlySeries) -> np.ndarray:
+        """Predicted kWh for the hours of `chunk` (temperature, humidity and dewpoint columns)."""
+        how = hour_of_week(chunk.times)
+        levels = np.array([np.nan if v is None else v for v in self.hour_of_week_intercepts])
+        dense = dense_features(chunk, occupied_mask(how, self.occupied_hours, self.occupied_days))
+        coef = np.array([self.coefficients[name] for name in HOURLY_FEATURES])
+        return levels[how] + dense @ coef
+
+
+def fit_hourly_chunks(
+    chunks: Callable[[], Iterable[HourlySeries]],
+    occupied_hours: str = HOURLY_OCCUPIED_HOURS,
+    occupied_days: str = HOURLY_OCCUPIED_DAYS,
+) -> HourlyRegressionRecord:
+    """
+    Fit the hourly model over chunks of joined hourly data.
+
+    `chunks` is called twice (fit pass, then residual pass) and must yield the
+    same rows both times, e.g. by re-reading them from disk.
+    """
+    equations = HourlyNormalEquations(occupied_hours, occupied_days)
+    for chunk in chunks():
+        equations.add(chunk)
+    if equations.n == 0:
+        raise ValueError("No overlapping hours of consumption and weather data.")
+    fit = equations.solve()
+    record = HourlyRegressionRecord(
+        record_date=datetime.now().date().isoformat(),
+        hour_of_week_intercepts=[None if np.isnan(v) else float(v) for v in fit["levels"]],
+        coefficients={name: float(c) for name, c in zip(HOURLY_FEATURES, fit["coef"])},
+        occupied_hours=occupied_hours,
+        occupied_days=occupied_days,
+        r2=0.0, cv_rmse=0.0, nmbe=0.0, mape=0.0,
+        n_observations=equations.n,
+        chunks=equations.chunks,
+    )
+
+    mean_y = equations.sum_y / equations.n
+    ss_res = ss_tot = sum_res = sum_ape = 0.0
+    eps = np.finfo(np.float64).eps
+    for chunk in chunks():
+        y = chunk[TARGET_NAME].astype(np.float64)
+        residuals = y - record.predict(chunk)
+        ss_res += float(residuals @ residuals)
+        ss_tot += float(((y - mean_y) ** 2).sum())
+        sum_res += float(residuals.sum())
+        sum_ape += float((np.abs(residuals) / np.maximum(np.abs(y), eps)).sum())
+
+    n = equations.n
+    record.r2 = 1.0 - ss_res / ss_tot if ss_tot > 0 else 0.0
+    record.cv_rmse = float(np.sqrt(ss_res / max(n - fit["n_params"], 1)) / mean_y) if mean_y else 0.0
+    record.nmbe = sum_res / n / mean_y if mean_y else 0.0
+    record.mape = sum_ape / n
+    log.info(
+        f"Hourly baseline over {n} hours in {equations.chunks} chunks: "
+        f"R²={record.r2:.4f}, CV(RMSE)={record.cv_rmse:.4f}, NMBE={record.nmbe:.4f}"
+    )
+    return record
+
+
+def fit_hourly(
+    data: HourlySeries,
+    chunk_rows: int = HOURLY_CHUNK_ROWS,
+    occupied_hours: str = HOURLY_OCCUPIED_HOURS,
+    occupied_days: str = HOURLY_OCCUPIED_DAYS,
+) -> HourlyRegressionRecord:
+    """Fit the hourly model over joined hourly consumption and weather, chunk_rows hours at a time."""
+    data = data.dropna([TARGET_NAME] + HOURLY_WEATHER)
+    return fit_hourly_chunks(lambda: data.iter_chunks(chunk_rows), occupied_hours, occupied_days)
+
+
+async def fit_hourly_baseline_from_state(state: Any) -> HourlyRegressionRecord:
+    """
+    Load hourly weather and consumption for the baseline window in session state and fit the hourly model.
+
+    The hourly series are loaded here rather than read from session state, so
+    that only the fitted record is stored in the session.
+    """
+    from ..baseline_data_agent_parallel.sub_agents.consumption_data_agent.agent import build_hourly_consumption
+    from ..baseline_data_agent_parallel.sub_agents.weather_data_agent.agent import load_hourly_weather
+
+    start_date = state.get("baseline_from_date")
+    end_date = state.get("baseline_end_date")
+    latitude, longitude = state.get("latitude"), state.get("longitude")
+    if not start_date or not end_date or latitude is None or longitude is None:
+        raise ValueError("baseline_from_date, baseline_end_date, latitude and longitude must be set in session state.")
+    weather = await load_hourly_weather(latitude, longitude, start_date, end_date)
+    energy = await build_hourly_consumption(state, weather)
+    joined = energy.join(weather)
+    log.info(f"Hourly baseline data: {len(joined)} hours, {joined.nbytes / 1e6:.1f} MB")
+    return await asyncio.to_thread(fit_hourly, joined, HOURLY_CHUNK_ROWS)
+
+
+def format_hourly_summary(record: HourlyRegressionRecord) -> str:
+    """Human readable summary of the fitted hourly baseline."""
+    coefficients = ", ".join(f"{name}={value:.4f}" for name, value in record.coefficients.items())
+    return (
+        f"Hourly baseline (hour-of-week + occupancy temperature): {coefficients}\n"
+        f"R²: {record.r2:.4f}, CV(RMSE): {record.cv_rmse:.4f}, NMBE: {record.nmbe:.4f}, MAPE: {record.mape:.4f} "
+        f"({record.n_observations} hours)"
+    )
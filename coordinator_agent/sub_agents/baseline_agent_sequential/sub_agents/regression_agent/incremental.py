@@ -0,0 +1,296 @@
+"""
+Incremental baseline refits from stored sufficient statistics.
+
+A full refit needs the whole window of weather and consumption. The OLS fit
+only depends on a few moments of the joined data: count, means, the centered
+cross products Sxx = Σ(x - x̄)(x - x̄)ᵀ, Sxy and Syy. `Moments` holds those and
+merges or removes a batch of days with the pairwise (Chan et al.) update, so
+folding in new days or dropping old ones costs O(changed days). Coefficients
+and R² are solved from the moments and agree with `fit_ols` to floating-point
+rounding.
+
+`IncrementalFit` stores the moments together with the joined daily rows. MAPE,
+NMBE and the change-point model need per-day residuals, so they are the only
+part recomputed over the stored rows: one vectorized pass with no weather or
+meter I/O. The moments are rebuilt from the rows every RECOMPUTE_EVERY updates,
+so rounding drift from repeated add/remove cannot accumulate.
+`fit_records_batch` does this for many facilities at once, as rebaseline.py does.
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from config.settings import REGRESSION_CHANGE_POINT
+
+from .agent import RegressionRecord, TARGET_NAME, WEATHER_FEATURES, format_equation, join_on_date, series_from_state
+from .batch_regression import stack_facilities
+from .change_point import fit_change_point_batch
+
+log = logging.getLogger(__name__)
+
+RECOMPUTE_EVERY = 64
+
+# Session state keys needed to load more days for the same facility.
+INPUT_KEYS = ("facility_id", "meter_id", "city", "latitude", "longitude")
+
+
+class Moments(BaseModel):
+    """Count, means and centered second moments of the joined (X, y) rows."""
+    n: int = 0
+    mean_x: List[float]
+    mean_y: float = 0.0
+    sxx: List[List[float]]
+    sxy: List[float]
+    syy: float = 0.0
+
+    @classmethod
+    def empty(cls, n_features: int) -> "Moments":
+        return cls(mean_x=[0.0] * n_features, sxx=[[0.0] * n_features for _ in range(n_features)], sxy=[0.0] * n_features)
+
+    @classmethod
+    def of(cls, X: np.ndarray, y: np.ndarray) -> "Moments":
+        """Moments of a batch of rows; X is (n, F) and y is (n,)."""
+        X = np.asarray(X, dtype=np.float64)
+        X = X if X.ndim == 2 else X.reshape(len(y), -1)
+        y = np.asarray(y, dtype=np.float64)
+        if len(y) == 0:
+            return cls.empty(X.shape[1])
+        mean_x, mean_y = X.mean(axis=0), float(y.mean())
+        dx, dy = X - mean_x, y - mean_y
+        return cls(
+            n=len(y), mean_x=mean_x.tolist(), mean_y=mean_y,
+            sxx=(dx.T @ dx).tolist(), sxy=(dx.T @ dy).tolist(), syy=float(dy @ dy),
+        )
+
+    def _arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return np.array(self.mean_x), np.array(self.sxx), np.array(self.sxy)
+
+    def merge(self, other: "Moments") -> "Moments":
+        """Moments of the union of two disjoint sets of rows."""
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            return other
+        n = self.n + other.n
+        mx_a, sxx_a, sxy_a = self._arrays()
+        mx_b, sxx_b, sxy_b = other._arrays()
+        dx, dy = mx_b - mx_a, other.mean_y - self.mean_y
+        w = self.n * other.n / n
+        return Moments(
+            n=n,
+            mean_x=(mx_a + dx * other.n / n).tolist(),
+            mean_y=self.mean_y + dy * other.n / n,
+            sxx=(sxx_a + sxx_b + w * np.outer(dx, dx)).tolist(),
+            sxy=(sxy_a + sxy_b + w * dx * dy).tolist(),
+            syy=self.syy + other.syy + w * dy * dy,
+        )
+
+    def remove(self, other: "Moments") -> "Moments":
+        """Moments after removing a subset of rows whose moments are `other`."""
+        if other.n == 0:
+            return self
+        n = self.n - other.n
+        if n < 0:
+            raise ValueError(f"Cannot remove {other.n} rows from {self.n}.")
+        if n == 0:
+            return Moments.empty(len(self.mean_x))
+        mx, sxx, sxy = self._arrays()
+        mx_b, sxx_b, sxy_b = other._arrays()
+        mx_a = (self.n * mx - other.n * mx_b) / n
+        mean_y_a = (self.n * self.mean_y - other.n * other.mean_y) / n
+        dx, dy = mx_b - mx_a, other.mean_y - mean_y_a
+        w = n * other.n / self.n
+        return Moments(
+            n=n,
+            mean_x=mx_a.tolist(),
+            mean_y=mean_y_a,
+            sxx=(sxx - sxx_b - w * np.outer(dx, dx)).tolist(),
+            sxy=(sxy - sxy_b - w * dx * dy).tolist(),
+            syy=self.syy - other.syy - w * dy * dy,
+        )
+
+    def solve(self) -> Dict[str, Any]:
+        """OLS intercept, coefficients and R² from the moments alone."""
+        mean_x, sxx, sxy = self._arrays()
+        try:
+            coef = np.linalg.solve(sxx, sxy)
+        except np.linalg.LinAlgError:
+            # Rank-deficient weather (e.g. a constant column): minimum-norm solution, as lstsq gives.
+            coef = np.linalg.pinv(sxx) @ sxy
+        ss_res = max(self.syy - float(coef @ sxy), 0.0)
+        return {
+            "intercept": float(self.mean_y - coef @ mean_x),
+            "coef": coef,
+            "r2": 1.0 - ss_res / self.syy if self.syy > 0 else 0.0,
+        }
+
+
+class IncrementalFit(BaseModel):
+    """Moments plus the joined daily rows of one facility's baseline window."""
+    features: List[str] = Field(default_factory=lambda: list(WEATHER_FEATURES))
+    moments: Moments
+    dates: List[str] = Field(default_factory=list)
+    x: List[List[float]] = Field(default_factory=list)
+    y: List[float] = Field(default_factory=list)
+    # facility_id / meter_id / city / latitude / longitude, for loading the next days.
+    inputs: Dict[str, Any] = Field(default_factory=dict)
+    updates_since_recompute: int = 0
+
+    @classmethod
+    def from_rows(
+        cls,
+        dates: Sequence[Any],
+        X: np.ndarray,
+        y: np.ndarray,
+        inputs: Optional[Dict[str, Any]] = None,
+        moments: Optional[Moments] = None,
+    ) -> "IncrementalFit":
+        """Rows sorted by date, with `moments` when they are already known (computed otherwise)."""
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        order = np.argsort(dates, kind="stable")
+        X = np.asarray(X, dtype=np.float64).reshape(len(dates), -1)[order]
+        y = np.asarray(y, dtype=np.float64)[order]
+        return cls(
+            moments=moments if moments is not None else Moments.of(X, y),
+            dates=[str(d) for d in dates[order]],
+            x=X.tolist(),
+            y=y.tolist(),
+            inputs=dict(inputs or {}),
+        )
+
+    @classmethod
+    def from_state(cls, state: Any) -> "IncrementalFit":
+        """From the consumption and weather data in session state, joined as the regression stage does."""
+        dates, X, y = join_on_date(*series_from_state(state))
+        inputs = {key: state.get(key) for key in INPUT_KEYS if state.get(key) is not None}
+        return cls.from_rows(dates, X, y, inputs)
+
+    @property
+    def first_date(self) -> Optional[str]:
+        return self.dates[0] if self.dates else None
+
+    @property
+    def last_date(self) -> Optional[str]:
+        return self.dates[-1] if self.dates else None
+
+    def update(
+        self,
+        dates: Sequence[Any] = (),
+        X: Optional[np.ndarray] = None,
+        y: Optional[np.ndarray] = None,
+        drop_before: Optional[str] = None,
+    ) -> "IncrementalFit":
+        """
+        Fold in new days and/or drop days before `drop_before` (a rolling window).
+
+        A new day that is already in the window replaces the stored one. The moments
+        change by the added and removed rows only; the stored rows are re-sorted.
+        """
+        new_dates = np.asarray(dates, dtype="datetime64[D]")
+        stored = np.asarray(self.dates, dtype="datetime64[D]")
+        keep = ~np.isin(stored, new_dates)
+        if drop_before is not None:
+            keep &= stored >= np.datetime64(str(drop_before)[:10], "D")
+            new_in_window = new_dates >= np.datetime64(str(drop_before)[:10], "D")
+        else:
+            new_in_window = np.ones(len(new_dates), dtype=bool)
+
+        n_features = len(self.features)
+        old_X = np.asarray(self.x, dtype=np.float64).reshape(len(stored), n_features)
+        old_y = np.asarray(self.y, dtype=np.float64)
+        add_X = np.asarray(X if X is not None else np.empty((0, n_features)), dtype=np.float64)
+        add_X = add_X.reshape(len(new_dates), n_features)[new_in_window]
+        add_y = np.asarray(y if y is not None else np.empty(0), dtype=np.float64)[new_in_window]
+
+        updates = self.updates_since_recompute + 1
+        moments = None
+        if updates < RECOMPUTE_EVERY:
+            moments = self.moments.remove(Moments.of(old_X[~keep], old_y[~keep])).merge(Moments.of(add_X, add_y))
+        updated = IncrementalFit.from_rows(
+            np.concatenate([stored[keep], new_dates[new_in_window]]),
+            np.concatenate([old_X[keep], add_X]),
+            np.concatenate([old_y[keep], add_y]),
+            self.inputs,
+            moments,
+        )
+        updated.updates_since_recompute = updates if moments is not None else 0
+        log.info(
+            f"Baseline window {updated.first_date}..{updated.last_date}: "
+            f"+{len(add_y)} / -{int((~keep).sum())} days ({updated.moments.n} total)"
+        )
+        return updated
+
+    def record(self) -> RegressionRecord:
+        """The RegressionRecord a full refit over the stored window would produce."""
+        record = fit_records_batch([self])[0]
+        if record is None:
+            n_features = len(self.features)
+            raise ValueError(f"Need more than {n_features} days in the baseline window, got {self.moments.n}.")
+        return record
+
+
+def solve_moments_batch(moments: Sequence[Moments]) -> Dict[str, np.ndarray]:
+    """OLS intercept (N,), coefficients (N, F) and R² (N,) of many facilities' moments in one batched solve."""
+    mean_x = np.array([m.mean_x for m in moments], dtype=np.float64)
+    sxx = np.array([m.sxx for m in moments], dtype=np.float64)
+    sxy = np.array([m.sxy for m in moments], dtype=np.float64)
+    mean_y = np.array([m.mean_y for m in moments], dtype=np.float64)
+    syy = np.array([m.syy for m in moments], dtype=np.float64)
+    # Rank-deficient weather (e.g. a constant column) gets the minimum-norm solution, as lstsq gives.
+    coef = (np.linalg.pinv(sxx, hermitian=True) @ sxy[..., None])[..., 0]
+    ss_res = np.maximum(syy - np.einsum("nf,nf->n", coef, sxy), 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r2 = np.where(syy > 0, 1.0 - ss_res / syy, 0.0)
+    return {"intercept": mean_y - np.einsum("nf,nf->n", coef, mean_x), "coef": coef, "r2": r2}
+
+
+def fit_records_batch(fits: Sequence[IncrementalFit]) -> List[Optional[RegressionRecord]]:
+    """
+    The RegressionRecord of each fit: coefficients and R² from its moments, and
+    MAPE, NMBE and the change-point model from one pass over the stacked rows.
+
+    Fits with no more days than features get None.
+    """
+    results: List[Optional[RegressionRecord]] = [None] * len(fits)
+    index = [i for i, fit in enumerate(fits) if fit.moments.n > len(fit.features)]
+    if not index:
+        return results
+    features = fits[index[0]].features
+    solved = solve_moments_batch([fits[i].moments for i in index])
+    rows = [
+        (np.asarray(fits[i].x, dtype=np.float64).reshape(-1, len(features)), np.asarray(fits[i].y, dtype=np.float64))
+        for i in index
+    ]
+    X, y, mask = stack_facilities(rows)
+    residuals = np.where(mask, y - solved["intercept"][:, None] - np.einsum("ndf,nf->nd", X, solved["coef"]), 0.0)
+    counts = mask.sum(axis=1)
+    mean_y = np.where(mask, y, 0.0).sum(axis=1) / counts
+    eps = np.finfo(np.float64).eps
+    nmbe = residuals.sum(axis=1) / counts / mean_y
+    mape = (np.abs(residuals) / np.maximum(np.abs(np.where(mask, y, 1.0)), eps) * mask).sum(axis=1) / counts
+
+    change_points: List[Any] = [None] * len(index)
+    if REGRESSION_CHANGE_POINT and "temperature" in features:
+        column = features.index("temperature")
+        change_points = fit_change_point_batch([(X_i[:, column], y_i) for X_i, y_i in rows])
+
+    record_date = datetime.now().date().isoformat()
+    for k, i in enumerate(index):
+        intercept = float(solved["intercept"][k])
+        coefficients = {name: float(c) for name, c in zip(features, solved["coef"][k])}
+        results[i] = RegressionRecord(
+            record_date=record_date,
+            regression_equation=format_equation(TARGET_NAME, intercept, coefficients),
+            intercept=intercept,
+            coefficients=coefficients,
+            nmbe=float(nmbe[k]),
+            mape=float(mape[k]),
+            r2=float(solved["r2"][k]),
+            n_observations=int(fits[i].moments.n),
+            change_point=change_points[k],
+        )
+    log.info(f"Solved {len(index)} baselines from their moments")
+    return results
@@ -0,0 +1,279 @@
+"""
+Local registry of fitted baseline models.
+
+Every fitted baseline is saved as a versioned JSON document under
+`<root>/<facility_id>/<baseline_from>_<baseline_to>/v<N>.json`, so a facility
+can be refit for the same window (new version) or for a new window without
+overwriting earlier baselines. Loaded models keep their coefficients as a
+numpy vector, so `BaselineModel.predict` is one matrix-vector product over a
+whole reporting period.
+
+When the model selection stage found a candidate within the CV(RMSE) and NMBE
+limits, that candidate is stored with the model as `selection` and is the one
+that predicts (`primary` "selected"); it needs the reporting dates for its
+calendar terms.
+
+Next to each version, `v<N>.stats.json` keeps the fit's sufficient statistics
+(see incremental.py), so the baseline can later be extended or rolled forward
+without refetching and refitting the whole window.
+"""
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+from pydantic import BaseModel, Field, PrivateAttr
+
+from .agent import RegressionRecord, WEATHER_FEATURES
+from .change_point import ChangePointModel
+from .incremental import IncrementalFit
+from .model_selection import COLUMNS, CandidateScore, design_matrix
+
+log = logging.getLogger(__name__)
+
+_VERSION_FILE = re.compile(r"^v(\d+)\.json$")
+
+
+class BaselineModel(BaseModel):
+    """A fitted baseline, identified by facility, baseline window and version."""
+    facility_id: str
+    baseline_from_date: str
+    baseline_to_date: str
+    version: int
+    created_at: str
+    features: List[str] = Field(default_factory=lambda: list(WEATHER_FEATURES))
+    regression: RegressionRecord
+    # "regression" (multiple linear regression on features), "change_point" or
+    # "selected" (the cross-validated winner in `selection`).
+    primary: str = "regression"
+    selection: Optional[CandidateScore] = None
+    balance_c: Optional[float] = None   # degree-day balance point of `selection`
+
+    _beta: Optional[np.ndarray] = PrivateAttr(default=None)
+
+    @property
+    def key(self) -> str:
+        return f"{self.facility_id}/{self.baseline_from_date}_{self.baseline_to_date}/v{self.version}"
+
+    @property
+    def change_point(self) -> Optional[ChangePointModel]:
+        return self.regression.change_point
+
+    def _coefficients(self) -> np.ndarray:
+        if self._beta is None:
+            coefficients = self.regression.coefficients
+            self._beta = np.array(
+                [self.regression.intercept] + [coefficients.get(f, 0.0) for f in self.features], dtype=np.float64
+            )
+        return self._beta
+
+    def _predict_selected(self, weather: Mapping[str, Sequence[float]], dates: Optional[Sequence[Any]]) -> np.ndarray:
+        if dates is None:
+            raise ValueError(f"Baseline {self.key} uses calendar terms; pass the reporting dates.")
+        X = np.column_stack([np.asarray(weather[f], dtype=np.float64) for f in WEATHER_FEATURES])
+        Z = design_matrix(dates, X, self.balance_c)
+        selection = self.selection
+        beta = np.zeros(len(COLUMNS))
+        beta[0] = selection.intercept
+        for feature, coefficient in selection.coefficients.items():
+            beta[COLUMNS.index(feature)] = coefficient
+        return Z @ beta
+
+    def predict(
+        self, weather: Mapping[str, Sequence[float]], dates: Optional[Sequence[Any]] = None
+    ) -> np.ndarray:
+        """
+        Adjusted baseline consumption for every day of `weather`.
+
+        Parameters:
+            weather: {feature: array of length n}; the change-point model only needs "temperature"
+            dates: the n days, required when the selected model is primary
+
+        Returns:
+            np.ndarray of length n, NaN where a required weather value is missing.
+        """
+        if self.primary == "selected" and self.selection is not None:
+            return self._predict_selected(weather, dates)
+        if self.primary == "change_point" and self.change_point is not None:
+            return self.change_point.predict(np.asarray(weather["temperature"], dtype=np.float64))
+        X = np.column_stack([np.asarray(weather[f], dtype=np.float64) for f in self.features])
+        beta = self._coefficients()
+        return beta[0] + X @ beta[1:]
+
+
+def choose_primary(record: RegressionRecord) -> str:
+    """Pick the model with the higher adjusted R² on the baseline period."""
+    cp = record.change_point
+    n = record.n_observations
+    if cp is None or n <= len(record.coefficients) + 1:
+        return "regression"
+
+    def adjusted(r2: float, p: int) -> float:
+        return 1.0 - (1.0 - r2) * (n - 1) / max(n - p, 1)
+
+    cp_params = {"2P": 2, "3PH": 3, "3PC": 3, "4P": 4, "5P": 5}.get(cp.model_type, 5)
+    if adjusted(cp.r2, cp_params) > adjusted(record.r2, len(record.coefficients) + 1):
+        return "change_point"
+    return "regression"
+
+
+def _safe(part: str) -> str:
+    return "".join(ch if ch.isalnum() or ch in "-_." else "_" for ch in str(part).strip()) or "_"
+
+
+class ModelRegistry:
+    """Versioned baseline models stored as JSON files on local disk."""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self._loaded: Dict[Path, BaselineModel] = {}
+        self._lock = threading.Lock()
+
+    def _window_dir(self, facility_id: str, baseline_from_date: str, baseline_to_date: str) -> Path:
+        return self.root / _safe(facility_id) / f"{_safe(baseline_from_date)}_{_safe(baseline_to_date)}"
+
+    def list_versions(self, facility_id: str, baseline_from_date: str, baseline_to_date: str) -> List[int]:
+        window = self._window_dir(facility_id, baseline_from_date, baseline_to_date)
+        if not window.is_dir():
+            return []
+        return sorted(int(m.group(1)) for m in map(_VERSION_FILE.match, os.listdir(window)) if m)
+
+    def register(
+        self,
+        facility_id: str,
+        baseline_from_date: str,
+        baseline_to_date: str,
+        record: RegressionRecord,
+        selection: Optional[CandidateScore] = None,
+        balance_c: Optional[float] = None,
+    ) -> BaselineModel:
+        """
+        Save a fitted baseline as the next version for this facility and window.
+
+        `selection` is a cross-validated winner that passed the limits; when given it
+        becomes the primary model, with degree days at `balance_c`.
+        """
+        with self._lock:
+            window = self._window_dir(facility_id, baseline_from_date, baseline_to_date)
+            window.mkdir(parents=True, exist_ok=True)
+            versions = self.list_versions(facility_id, baseline_from_date, baseline_to_date)
+            model = BaselineModel(
+                facility_id=facility_id,
+                baseline_from_date=str(baseline_from_date),
+                baseline_to_date=str(baseline_to_date),
+                version=(versions[-1] + 1) if versions else 1,
+                created_at=datetime.now().isoformat(timespec="seconds"),
+                regression=record,
+                primary="selected" if selection is not None else choose_primary(record),
+                selection=selection,
+                balance_c=balance_c if selection is not None else None,
+            )
+            path = window / f"v{model.version}.json"
+            tmp = path.with_suffix(".json.tmp")
+            tmp.write_text(model.model_dump_json(indent=2), encoding="utf-8")
+            os.replace(tmp, path)
+            self._loaded[path] = model
+        log.info(f"Registered baseline model {model.key} ({model.primary})")
+        return model
+
+    def save_stats(self, model: BaselineModel, fit: IncrementalFit) -> None:
+        """Store the sufficient statistics a registered model was fitted from."""
+        path = self._window_dir(model.facility_id, model.baseline_from_date, model.baseline_to_date)
+        path = path / f"v{model.version}.stats.json"
+        tmp = path.with_suffix(".json.tmp")
+        tmp.write_text(fit.model_dump_json(), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def get_stats(self, model: BaselineModel) -> Optional[IncrementalFit]:
+        """Sufficient statistics saved with a model, or None for models registered without them."""
+        path = self._window_dir(model.facility_id, model.baseline_from_date, model.baseline_to_date)
+        path = path / f"v{model.version}.stats.json"
+        if not path.exists():
+            return None
+        return IncrementalFit.model_validate_json(path.read_text(encoding="utf-8"))
+
+    def facilities(self) -> List[str]:
+        """Facility directories in the registry."""
+        if not self.root.is_dir():
+            return []
+        return sorted(p.name for p in self.root.iterdir() if p.is_dir())
+
+    def get(
+        self, facility_id: str, baseline_from_date: str, baseline_to_date: str, version: Optional[int] = None
+    ) -> Optional[BaselineModel]:
+        """Load a baseline model; the latest version when `version` is None."""
+        if version is None:
+            versions = self.list_versions(facility_id, baseline_from_date, baseline_to_date)
+            if not versions:
+                return None
+            version = versions[-1]
+        path = self._window_dir(facility_id, baseline_from_date, baseline_to_date) / f"v{version}.json"
+        with self._lock:
+            model = self._loaded.get(path)
+            if model is None:
+                if not path.exists():
+                    return None
+                model = BaselineModel.model_validate(json.loads(path.read_text(encoding="utf-8")))
+                self._loaded[path] = model
+        return model
+
+    def latest(self, facility_id: str) -> Optional[BaselineModel]:
+        """Most recently registered model for a facility across all baseline windows."""
+        facility_dir = self.root / _safe(facility_id)
+        if not facility_dir.is_dir():
+            return None
+        candidates = []
+        for window in facility_dir.iterdir():
+            if not window.is_dir():
+                continue
+            for name in os.listdir(window):
+                match = _VERSION_FILE.match(name)
+                if match:
+                    candidates.append(((window / name).stat().st_mtime, int(match.group(1)), window.name))
+        if not candidates:
+            return None
+        _, version, window_name = max(candidates)
+        from_date, _, to_date = window_name.partition("_")
+        return self.get(facility_id, from_date, to_date, version)
+
+
+def register_from_state(registry: ModelRegistry, state: Mapping[str, Any]) -> BaselineModel:
+    """
+    Register the `regression_record` in session state for the state's facility and baseline window.
+
+    The facility is state key `facility_id`, written with the user's details
+    (input_agent.user_state). Raises ValueError if it is missing or the
+    regression stage has not produced a record. When the model selection stage
+    ran and its winner passes, the winner is registered as the primary model;
+    a winner that fails the limits is advisory and is not used.
+    """
+    record = state.get("regression_record")
+    if not record:
+        raise ValueError("No regression_record in session state; the regression stage must run first.")
+    if isinstance(record, str):
+        record = json.loads(record)
+    facility_id = state.get("facility_id")
+    if not facility_id:
+        raise ValueError("No facility_id in session state; baselines are registered per facility.")
+    facility_id = str(facility_id)
+    selection = state.get("model_selection") or {}
+    if selection and not selection.get("passes"):
+        log.info(f"Model selection for {facility_id} found no candidate within the limits; keeping the regression baseline")
+    passed = bool(selection.get("passes"))
+    model = registry.register(
+        facility_id,
+        str(state.get("baseline_from_date")),
+        str(state.get("baseline_end_date")),
+        RegressionRecord.model_validate(record),
+        CandidateScore.model_validate(selection["winner"]) if passed else None,
+        selection.get("balance_c") if passed else None,
+    )
+    fit = IncrementalFit.from_state(state)
+    if fit.moments.n:
+        registry.save_stats(model, fit)
+    return model
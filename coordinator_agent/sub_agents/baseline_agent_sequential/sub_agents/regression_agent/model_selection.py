@@ -0,0 +1,273 @@
+"""
+Baseline model selection with blocked time-series cross-validation.
+
+Every candidate is a choice of one term from each feature group:
+
+    temperature   T | HDD | CDD | HDD + CDD          (degree days at MODEL_SELECTION_BALANCE_C)
+    moisture      none | H | D | H + D
+    calendar      none | weekend flag | day-of-week dummies (Monday is the reference)
+
+Each candidate is fitted with an intercept and scored out of sample. The window
+is cut into contiguous folds, and each fold is predicted from a fit on all the
+other days. Folds stay blocks of consecutive days, so autocorrelated neighbours
+do not leak into the fit the way they would with shuffled folds. CV(RMSE) and
+NMBE are computed over the pooled out-of-fold residuals, with n - p degrees of
+freedom as in ASHRAE Guideline 14. Among the candidates within
+MODEL_SELECTION_MAX_CV_RMSE and MODEL_SELECTION_MAX_NMBE, the lowest CV(RMSE)
+wins, ties going to fewer parameters. When no candidate passes, the lowest
+CV(RMSE) wins and `passes` is False.
+
+A winner that passes becomes the registered baseline (model_registry.py) and
+predicts the reporting period. One that does not pass is advisory only: the
+baseline stays the multiple regression or change-point model.
+
+All candidates are columns of one design matrix Z. The Gram matrix ZᵀZ and Zᵀy
+of every fold are computed once, and a training set's Gram is the total minus
+its fold's. A candidate's fit is then a solve on a small submatrix, reused
+across all 48 candidates. Large problems are scored in batches on a joblib
+process pool. Small ones, which covers daily windows of a few years, are
+scored in-process, because starting workers would cost more than the scoring.
+"""
+import itertools
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from config.settings import (
+    MODEL_SELECTION_BALANCE_C,
+    MODEL_SELECTION_FOLDS,
+    MODEL_SELECTION_MAX_CV_RMSE,
+    MODEL_SELECTION_MAX_NMBE,
+    MODEL_SELECTION_N_JOBS,
+)
+
+log = logging.getLogger(__name__)
+
+DAY_NAMES = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+# Design matrix columns; candidates pick subsets of these.
+COLUMNS = ["intercept", "temperature", "humidity", "dewpoint", "hdd", "cdd", "weekend"] + [
+    f"dow_{day}" for day in DAY_NAMES[1:]
+]
+FEATURE_GROUPS = {
+    "temperature": {"T": ["temperature"], "HDD": ["hdd"], "CDD": ["cdd"], "HDD+CDD": ["hdd", "cdd"]},
+    "moisture": {"": [], "H": ["humidity"], "D": ["dewpoint"], "H+D": ["humidity", "dewpoint"]},
+    "calendar": {"": [], "weekend": ["weekend"], "DOW": [f"dow_{day}" for day in DAY_NAMES[1:]]},
+}
+# rows x candidates above which scoring moves to the process pool.
+PARALLEL_MIN_WORK = 2_000_000
+
+
+class CandidateScore(BaseModel):
+    name: str
+    features: List[str]
+    n_params: int
+    cv_rmse: float
+    nmbe: float
+    r2: float                           # out-of-fold
+    passes: bool = False
+    # Fit on the whole window; filled in for the winner.
+    intercept: Optional[float] = None
+    coefficients: Dict[str, float] = Field(default_factory=dict)
+
+
+class ModelSelection(BaseModel):
+    record_date: str
+    n_observations: int
+    folds: int
+    balance_c: float
+    max_cv_rmse: float
+    max_nmbe: float
+    passes: bool
+    winner: CandidateScore
+    candidates: List[CandidateScore]    # best first
+
+
+def candidates() -> List[Tuple[str, List[str]]]:
+    """(name, features) for every combination of one term per feature group."""
+    result = []
+    for terms in itertools.product(*(group.items() for group in FEATURE_GROUPS.values())):
+        name = " + ".join(label for label, _ in terms if label)
+        result.append((name, [f for _, features in terms for f in features]))
+    return result
+
+
+def design_matrix(dates: np.ndarray, X: np.ndarray, balance_c: float = MODEL_SELECTION_BALANCE_C) -> np.ndarray:
+    """Z with one column per COLUMNS entry, from dates and (temperature, humidity, dewpoint) rows."""
+    X = np.asarray(X, dtype=np.float64).reshape(len(dates), 3)
+    # 1970-01-01 was a Thursday (day 3 with Monday = 0).
+    dow = (np.asarray(dates, dtype="datetime64[D]").astype(np.int64) + 3) % 7
+    Z = np.zeros((len(dates), len(COLUMNS)))
+    Z[:, 0] = 1.0
+    Z[:, 1:4] = X
+    Z[:, 4] = np.maximum(balance_c - X[:, 0], 0.0)
+    Z[:, 5] = np.maximum(X[:, 0] - balance_c, 0.0)
+    Z[:, 6] = dow >= 5
+    for day in range(1, 7):
+        Z[:, 6 + day] = dow == day
+    return Z
+
+
+def blocked_folds(n: int, k: int) -> List[Tuple[int, int]]:
+    """k contiguous (start, stop) blocks covering range(n), sizes differing by at most one."""
+    edges = np.linspace(0, n, k + 1).round().astype(int)
+    return [(int(a), int(b)) for a, b in zip(edges[:-1], edges[1:]) if b > a]
+
+
+def fold_grams(Z: np.ndarray, y: np.ndarray, folds: Sequence[Tuple[int, int]]) -> Dict[str, np.ndarray]:
+    """ZᵀZ and Zᵀy of every fold (stacked) and of the whole window."""
+    gram = np.stack([Z[a:b].T @ Z[a:b] for a, b in folds])
+    zty = np.stack([Z[a:b].T @ y[a:b] for a, b in folds])
+    return {"gram": gram, "zty": zty, "gram_total": gram.sum(axis=0), "zty_total": zty.sum(axis=0)}
+
+
+def _solve(gram: np.ndarray, zty: np.ndarray) -> np.ndarray:
+    try:
+        return np.linalg.solve(gram, zty)
+    except np.linalg.LinAlgError:
+        # Rank-deficient design (e.g. a weekday absent from the training days): minimum-norm solution.
+        return np.linalg.pinv(gram) @ zty
+
+
+def score_subsets(
+    Z: np.ndarray,
+    y: np.ndarray,
+    folds: Sequence[Tuple[int, int]],
+    grams: Dict[str, np.ndarray],
+    subsets: Sequence[Tuple[str, List[str]]],
+) -> List[Dict[str, Any]]:
+    """Out-of-fold CV(RMSE), NMBE and R² of each (name, features) candidate."""
+    n, mean_y = len(y), float(y.mean())
+    ss_tot = float(((y - mean_y) ** 2).sum())
+    scores = []
+    for name, features in subsets:
+        columns = [0] + [COLUMNS.index(f) for f in features]
+        index = np.ix_(columns, columns)
+        residuals = np.empty(n)
+        for fold, (a, b) in enumerate(folds):
+            beta = _solve(
+                grams["gram_total"][index] - grams["gram"][fold][index],
+                grams["zty_total"][columns] - grams["zty"][fold][columns],
+            )
+            residuals[a:b] = y[a:b] - Z[a:b, columns] @ beta
+        p = len(columns)
+        sse = float(residuals @ residuals)
+        scores.append({
+            "name": name,
+            "features": list(features),
+            "n_params": p,
+            "cv_rmse": float(np.sqrt(sse / max(n - p, 1)) / mean_y) if mean_y else float("inf"),
+            "nmbe": float(residuals.sum() / (max(n - p, 1) * mean_y)) if mean_y else float("inf"),
+            "r2": 1.0 - sse / ss_tot if ss_tot > 0 else 0.0,
+        })
+    return scores
+
+
+def _score_all(Z, y, folds, grams, subsets, n_jobs: int) -> List[Dict[str, Any]]:
+    if n_jobs == 1 or len(y) * len(subsets) < PARALLEL_MIN_WORK:
+        return score_subsets(Z, y, folds, grams, subsets)
+    from joblib import Parallel, delayed, effective_n_jobs
+
+    workers = min(effective_n_jobs(n_jobs), len(subsets))
+    batches = [list(batch) for batch in np.array_split(np.arange(len(subsets)), workers)]
+    log.info(f"Scoring {len(subsets)} candidates on {workers} worker processes")
+    results = Parallel(n_jobs=workers)(
+        delayed(score_subsets)(Z, y, folds, grams, [subsets[i] for i in batch]) for batch in batches
+    )
+    return [score for batch in results for score in batch]
+
+
+def select_model(
+    dates: np.ndarray,
+    X: np.ndarray,
+    y: np.ndarray,
+    n_folds: int = MODEL_SELECTION_FOLDS,
+    n_jobs: int = MODEL_SELECTION_N_JOBS,
+    max_cv_rmse: float = MODEL_SELECTION_MAX_CV_RMSE,
+    max_nmbe: float = MODEL_SELECTION_MAX_NMBE,
+    balance_c: float = MODEL_SELECTION_BALANCE_C,
+) -> ModelSelection:
+    """
+    Score every candidate with blocked time-series CV and pick the winner.
+
+    Parameters:
+        dates: datetime64[D] array of length n
+        X: (n, 3) temperature, humidity and dewpoint
+        y: consumption, length n
+
+    Raises ValueError when the window is too short for n_folds folds.
+    """
+    order = np.argsort(np.asarray(dates, dtype="datetime64[D]"), kind="stable")
+    dates = np.asarray(dates, dtype="datetime64[D]")[order]
+    y = np.asarray(y, dtype=np.float64)[order]
+    Z = design_matrix(dates, np.asarray(X, dtype=np.float64).reshape(len(order), 3)[order], balance_c)
+
+    folds = blocked_folds(len(y), n_folds)
+    if len(folds) < 2:
+        raise ValueError(f"Need at least 2 days for cross-validation, got {len(y)}.")
+    min_train = len(y) - max(b - a for a, b in folds)
+    subsets = [c for c in candidates() if len(c[1]) + 1 < min_train]
+    if not subsets:
+        raise ValueError(f"Too few days ({len(y)}) for {len(folds)}-fold cross-validation.")
+
+    grams = fold_grams(Z, y, folds)
+    scores = [CandidateScore(**s) for s in _score_all(Z, y, folds, grams, subsets, n_jobs)]
+    for score in scores:
+        score.passes = score.cv_rmse <= max_cv_rmse and abs(score.nmbe) <= max_nmbe
+    scores.sort(key=lambda s: (not s.passes, round(s.cv_rmse, 12), s.n_params))
+
+    winner = scores[0]
+    columns = [0] + [COLUMNS.index(f) for f in winner.features]
+    beta = _solve(grams["gram_total"][np.ix_(columns, columns)], grams["zty_total"][columns])
+    winner.intercept = float(beta[0])
+    winner.coefficients = {f: float(c) for f, c in zip(winner.features, beta[1:])}
+    log.info(
+        f"Selected baseline model '{winner.name}' of {len(scores)} candidates "
+        f"(CV(RMSE)={winner.cv_rmse:.4f}, NMBE={winner.nmbe:.4f}, {len(folds)} folds)"
+    )
+    return ModelSelection(
+        record_date=datetime.now().date().isoformat(),
+        n_observations=len(y),
+        folds=len(folds),
+        balance_c=balance_c,
+        max_cv_rmse=max_cv_rmse,
+        max_nmbe=max_nmbe,
+        passes=winner.passes,
+        winner=winner,
+        candidates=scores,
+    )
+
+
+def refit_winner(
+    winner: CandidateScore, dates: np.ndarray, X: np.ndarray, y: np.ndarray, balance_c: float
+) -> CandidateScore:
+    """
+    The selected candidate refitted on a new window, e.g. a rolled-forward baseline.
+
+    Only the intercept and coefficients change; the CV scores are those of the original selection.
+    """
+    Z = design_matrix(dates, X, balance_c)
+    columns = [0] + [COLUMNS.index(f) for f in winner.features]
+    y = np.asarray(y, dtype=np.float64)
+    beta = _solve(Z[:, columns].T @ Z[:, columns], Z[:, columns].T @ y)
+    return winner.model_copy(update={
+        "intercept": float(beta[0]),
+        "coefficients": {f: float(c) for f, c in zip(winner.features, beta[1:])},
+    })
+
+
+def format_selection_summary(selection: ModelSelection, top: int = 5) -> str:
+    """Human readable ranking of the best candidates."""
+    lines = [
+        f"Model selection ({selection.folds}-fold blocked CV, {selection.n_observations} days): "
+        f"winner '{selection.winner.name}'"
+        + ("" if selection.passes else " (no candidate meets the thresholds; advisory only, the baseline is unchanged)")
+    ]
+    for score in selection.candidates[:top]:
+        lines.append(
+            f"  {score.name:<28} CV(RMSE) {score.cv_rmse:.4f}  NMBE {score.nmbe:+.4f}  R² {score.r2:.4f}"
+            + ("" if score.passes else "  x")
+        )
+    return "\n".join(lines)
@@ -1 +1,8 @@
-from . import agent
+"""Agent package; `agent` is imported on first attribute access so the package stays cheap to import."""
+import importlib
+
+
+def __getattr__(name):
+    if name == "agent":
+        return importlib.import_module(".agent", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,22 +1,17 @@
-from .sub_agents import latlong_agent
+from .sub_agents.latlong_agent.agent import latlong_agent
+from .sub_agents.latlong_agent.geocoder import geocode
 
-from google.adk.agents import Agent
 from google.adk.agents import LlmAgent
 from google.adk.tools import AgentTool, FunctionTool
 from google.adk.models.google_llm import Gemini
 from google.adk.tools.tool_context import ToolContext
-from google.adk.agents.invocation_context import InvocationContext
-from google.adk.sessions import InMemorySessionService
-from google.adk.runners import Runner
-from google.adk.plugins.logging_plugin import LoggingPlugin
 
 import logging
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime
 
 from pydantic import BaseModel, Field
-from config.settings import SHARED_RETRY_CONFIG
-import argparse
+from config.settings import SHARED_RETRY_CONFIG, GEOCODER_MIN_SCORE
 
 
 logger = logging.getLogger(__name__)
@@ -25,47 +20,141 @@ logger = logging.getLogger(__name__)
 # Adjust this format string (%Y-%m-%d) to match your input date strings
 DATE_FORMAT = "%Y-%m-%d"
 
+def parse_baseline_dates(dates: List[str], require_past: bool = False) -> Tuple[str, str]:
+    """
+    Validate two baseline dates in DATE_FORMAT and return them sorted as (from, end).
+
+    With require_past, dates on or after today are rejected as well (the same
+    rule the consumption agent's date check applies to chat input).
+    Raises ValueError when the dates are missing, malformed or in the future.
+    """
+    if len(dates) != 2:
+        raise ValueError(f"Expected 2 dates, but got {len(dates)}")
+    date_objects = sorted(datetime.strptime(d, DATE_FORMAT).date() for d in dates)
+    if require_past and date_objects[1] >= datetime.now().date():
+        raise ValueError(f"Baseline dates must be in the past, got {date_objects[1].strftime(DATE_FORMAT)}")
+    return date_objects[0].strftime(DATE_FORMAT), date_objects[1].strftime(DATE_FORMAT)
+
+
+def default_facility_id(user_name: str, city: str) -> str:
+    """Facility id for a user who did not give one: their name and city."""
+    return f"{user_name}|{city}"
+
+
+def user_state(
+    user_name: str,
+    city: str,
+    dates: List[str],
+    baseline_from_date: Optional[str],
+    baseline_end_date: Optional[str],
+    latitude: Optional[float],
+    longitude: Optional[float],
+    facility_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    The session state entries save_userinfo writes for one user.
+
+    `facility_id` keys the user's baselines in the model registry; it defaults to
+    default_facility_id(user_name, city).
+    """
+    return {
+        "facility_id": facility_id or default_facility_id(user_name, city),
+        "user:user_data": {
+            "name": user_name,
+            "dates_provided": dates,
+            "baseline_from_date": baseline_from_date,
+            "baseline_end_date": baseline_end_date,
+        },
+        "city": city,
+        "baseline_from_date": baseline_from_date,
+        "baseline_end_date": baseline_end_date,
+        "latitude": latitude,
+        "longitude": longitude,
+    }
+
+
+def structured_user_state(
+    user_name: str,
+    city: Optional[str],
+    baseline_from_date: str,
+    baseline_end_date: str,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    facility_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Session state for a non-interactive run, without the coordinator and input agent LLM turns.
+
+    Dates are validated as for save_userinfo, and must be in the past. Coordinates
+    not given are resolved with the offline geocoder. Raises ValueError for invalid
+    dates and LookupError when the city cannot be resolved offline (the caller can
+    fall back to the conversational run, where the LatLong Agent looks it up).
+    """
+    dates = [baseline_from_date, baseline_end_date]
+    from_date, end_date = parse_baseline_dates(dates, require_past=True)
+    geo_location = {}
+    if latitude is None or longitude is None:
+        match = geocode(city or "", min_score=GEOCODER_MIN_SCORE) if city else None
+        if match is None:
+            raise LookupError(f"Could not resolve coordinates for '{city}' offline.")
+        latitude, longitude = match.latitude, match.longitude
+        geo_location = {"geo_location": {"latitude": latitude, "longitude": longitude}}
+    city = city or f"{latitude},{longitude}"
+    logger.info(f"Structured input for {city}: {from_date} to {end_date} at ({latitude}, {longitude})")
+    return {
+        **user_state(user_name, city, dates, from_date, end_date, latitude, longitude, facility_id),
+        **geo_location,
+    }
+
+
 def save_userinfo(
     tool_context: ToolContext, 
     user_name: str, 
     city: str, 
     dates: List[str],
-    latitude: float,    # Expects Python float
-    longitude: float    # Expects Python float
+    latitude: Optional[float] = None,    # Expects Python float
+    longitude: Optional[float] = None    # Expects Python float
 ) -> Dict[str, Any]:
-    user_info = {
-        "name": user_name,
-        "dates_provided": dates,
-        "baseline_from_date": None,
-        "baseline_end_date": None,
-    }
+    """
+    Save the user's name, city and baseline dates to session state.
+
+    Latitude and longitude are resolved from the offline gazetteer when not given.
+    If the city cannot be resolved, nothing is saved and the caller must look the
+    coordinates up with the LatLong Agent tool and call this tool again with them.
+    """
+    if latitude is None or longitude is None:
+        match = geocode(city, min_score=GEOCODER_MIN_SCORE)
+        if match is None:
+            return {
+                "status": "error",
+                "message": f"Could not resolve coordinates for '{city}'. "
+                           "Use the LatLong Agent tool to find them and call save_userinfo again with latitude and longitude.",
+            }
+        latitude, longitude = match.latitude, match.longitude
+        tool_context.state["geo_location"] = {"latitude": latitude, "longitude": longitude}
+    baseline_from_date = baseline_end_date = None
+    error = None
     if len(dates) == 2:
         try:
-            # 1. Convert string dates to datetime objects for reliable comparison
-            date_objects = [datetime.strptime(d, DATE_FORMAT).date() for d in dates]
-            
-            # 2. Sort the dates (sorts in ascending order by default)
-            date_objects.sort()
-            
-            # 3. Assign the sorted dates back to the dictionary keys (optional: convert back to string)
-            user_info["baseline_from_date"] = date_objects[0].strftime(DATE_FORMAT)
-            user_info["baseline_end_date"] = date_objects[1].strftime(DATE_FORMAT)
-            logger.info(f"Assigned baseline dates: From {user_info['baseline_from_date']} to {user_info['baseline_end_date']}")
-            
+            baseline_from_date, baseline_end_date = parse_baseline_dates(dates)
+            logger.info(f"Assigned baseline dates: From {baseline_from_date} to {baseline_end_date}")
         except ValueError as e:
             logger.error(f"Error parsing dates with format {DATE_FORMAT}: {e}")
-            user_info["error"] = "Invalid date format provided."
+            error = "Invalid date format provided."
     else:
         logger.info(f"Did not assign baseline dates: Expected 2 dates, but got {len(dates)}")
 
-    # Save the information to the agent's state using tool_context
-    tool_context.state["user:user_data"] = user_info
-    tool_context.state["city"] = city
-    tool_context.state["baseline_from_date"] = user_info["baseline_from_date"]
-    tool_context.state["baseline_end_date"] = user_info["baseline_end_date"]    
-    logger.info(f"Assigned baseline dates: From {user_info['baseline_from_date']} todate {user_info['baseline_end_date']}")
-    tool_context.state["latitude"] = latitude        
-    tool_context.state["longitude"] = longitude
+    # Save the information to the agent's state using tool_context. A facility id
+    # seeded before the conversation (batch.py) is kept.
+    state = user_state(
+        user_name, city, dates, baseline_from_date, baseline_end_date, latitude, longitude,
+        tool_context.state.get("facility_id"),
+    )
+    user_info = state["user:user_data"]
+    if error:
+        user_info["error"] = error
+    for key, value in state.items():
+        tool_context.state[key] = value
     logger.info(f"Saved user info to state: {city}")
     return {"status": "success", "user_info_saved": user_info}
 # The latlong_agent is a specialized agent designed to find coordinates and output JSON.
@@ -77,10 +166,12 @@ input_agent = LlmAgent(
     You are a helpful energy baseline assistant. Greet the user and ask for their name, city, 
     and two dates (start and end) for baseline creation in YYYY-MM-DD format.
     
-    PROCESS THE INPUT IN TWO STEPS:
-    1. **FIRST**, call the LatLong Agent tool with the city provided by the user to find the latitude and longitude.
-    2. **NEXT**, use the **save_userinfo** tool to save the user's name, city, the two dates- baseline from and baseline to, 
-       AND the retrieved latitude and longitude to the session state.
+    PROCESS THE INPUT:
+    1. **FIRST**, use the **save_userinfo** tool to save the user's name, city and the two dates- baseline from and baseline to,
+       to the session state. Do not pass latitude and longitude; the tool resolves them for the city.
+       If the user already provided latitude and longitude, pass them as given (use them as the city if no city was provided).
+    2. **ONLY IF** save_userinfo reports that the city could not be resolved, call the LatLong Agent tool with the city
+       to find the latitude and longitude, then call **save_userinfo** again with the retrieved latitude and longitude.
     """,
     # Include both the AgentTool wrapper and your custom function tool
     tools=[FunctionTool(save_userinfo),AgentTool(latlong_agent)],
@@ -1,5 +1,4 @@
-"""Subagents for the lead  pipeline."""
-from .latlong_agent.agent import latlong_agent
+"""Subagents for the lead  pipeline.
 
-# Explicitly export the imported agent instances so linters recognize they're used
-__all__ = ["latlong_agent"]
+Agents are built when their agent module is first imported, not with the package.
+"""
@@ -0,0 +1,199 @@
+"""
+Offline city geocoder backed by the bundled GeoNames gazetteer.
+
+Names and aliases are normalized (accents, case and punctuation stripped) and
+indexed twice: an exact-match dictionary and a trigram inverted index used for
+fuzzy matching. Lookups go through an LRU cache, so repeated cities cost a
+dictionary hit. The index is built lazily on the first lookup.
+"""
+import csv
+import gzip
+import logging
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import Field
+
+from .agent import CityGeoLocationResponse
+
+log = logging.getLogger(__name__)
+
+GAZETTEER_PATH = Path(__file__).parent / "data" / "cities.csv.gz"
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+class GeocodeMatch(CityGeoLocationResponse):
+    """A gazetteer hit: coordinates plus the matched place and its similarity score."""
+    name: str = Field(..., description="Gazetteer name of the matched place.")
+    country_code: str = Field(..., description="ISO 3166-1 alpha-2 country code.")
+    country: str = Field("", description="Country name.")
+    population: int = Field(0, description="Population used to rank ambiguous names.")
+    score: float = Field(..., description="1.0 for an exact name match, trigram similarity otherwise.")
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents and collapse punctuation/whitespace to single spaces."""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _NON_ALNUM.sub(" ", text.lower()).strip()
+
+
+def trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class Gazetteer:
+    """In-memory exact and trigram index over place names and aliases."""
+
+    def __init__(self, path: Path = GAZETTEER_PATH):
+        self.path = path
+        self.places: List[Tuple[str, str, str, float, float, int]] = []
+        self.keys: List[str] = []
+        self.key_places: List[List[int]] = []
+        self.key_gram_counts: List[int] = []
+        self.exact: Dict[str, int] = {}
+        self.trigram_index: Dict[str, List[int]] = defaultdict(list)
+        self.country_names: Dict[str, str] = {}
+        self._load()
+
+    def _load(self) -> None:
+        with gzip.open(self.path, "rt", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                place_id = len(self.places)
+                self.places.append((
+                    row["name"],
+                    row["country_code"],
+                    row["country"],
+                    float(row["latitude"]),
+                    float(row["longitude"]),
+                    int(row["population"]),
+                ))
+                self.country_names[normalize(row["country_code"])] = row["country_code"]
+                self.country_names[normalize(row["country"])] = row["country_code"]
+                names = [row["name"]] + [a for a in row["aliases"].split("|") if a]
+                for name in names:
+                    self._add_key(normalize(name), place_id)
+        log.info(f"Loaded gazetteer with {len(self.places)} places and {len(self.keys)} names from {self.path.name}")
+
+    def _add_key(self, key: str, place_id: int) -> None:
+        if not key:
+            return
+        key_id = self.exact.get(key)
+        if key_id is None:
+            key_id = len(self.keys)
+            self.exact[key] = key_id
+            self.keys.append(key)
+            self.key_places.append([])
+            grams = trigrams(key)
+            self.key_gram_counts.append(len(grams))
+            for gram in grams:
+                self.trigram_index[gram].append(key_id)
+        if place_id not in self.key_places[key_id]:
+            self.key_places[key_id].append(place_id)
+
+    def _best_place(self, key_id: int, country_code: Optional[str]) -> Optional[int]:
+        """Most populous place for a name, restricted to country_code when given."""
+        candidates = self.key_places[key_id]
+        if country_code:
+            candidates = [p for p in candidates if self.places[p][1] == country_code]
+        if not candidates:
+            return None
+        # Places are stored in descending population order.
+        return min(candidates)
+
+    def lookup(self, query: str, min_score: float = 0.6) -> Optional[GeocodeMatch]:
+        """
+        Resolve a city name such as "Mumbai" or "Paris, France".
+
+        Returns:
+            the best GeocodeMatch, or None if nothing scores at least min_score.
+        """
+        parts = [p for p in (normalize(p) for p in query.split(",")) if p]
+        if not parts:
+            return None
+        city = parts[0]
+        country_code = None
+        if len(parts) > 1:
+            country_code = self.country_names.get(parts[-1])
+
+        key_id = self.exact.get(city)
+        if key_id is not None:
+            place_id = self._best_place(key_id, country_code)
+            if place_id is not None:
+                return self._match(place_id, 1.0)
+
+        # Dice similarity over trigrams: 2|A∩B| / (|A|+|B|)
+        query_grams = trigrams(city)
+        shared: Dict[int, int] = defaultdict(int)
+        for gram in query_grams:
+            for candidate in self.trigram_index.get(gram, ()):
+                shared[candidate] += 1
+
+        best: Optional[Tuple[float, int, int]] = None
+        for candidate, count in shared.items():
+            score = 2.0 * count / (len(query_grams) + self.key_gram_counts[candidate])
+            if score < min_score or (best is not None and score < best[0]):
+                continue
+            place_id = self._best_place(candidate, country_code)
+            if place_id is None:
+                continue
+            # Prefer higher scores, then larger places (lower id).
+            if best is None or score > best[0] or place_id < best[2]:
+                best = (score, candidate, place_id)
+        if best is None:
+            return None
+        return self._match(best[2], best[0])
+
+    def _match(self, place_id: int, score: float) -> GeocodeMatch:
+        name, country_code, country, latitude, longitude, population = self.places[place_id]
+        return GeocodeMatch(
+            latitude=latitude,
+            longitude=longitude,
+            name=name,
+            country_code=country_code,
+            country=country,
+            population=population,
+            score=round(score, 4),
+        )
+
+
+_gazetteer: Optional[Gazetteer] = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer() -> Gazetteer:
+    """Return the process-wide gazetteer, loading it on first use."""
+    global _gazetteer
+    if _gazetteer is None:
+        with _gazetteer_lock:
+            if _gazetteer is None:
+                _gazetteer = Gazetteer()
+    return _gazetteer
+
+
+@lru_cache(maxsize=4096)
+def _geocode_cached(key: str, min_score: float) -> Optional[GeocodeMatch]:
+    return get_gazetteer().lookup(key, min_score=min_score)
+
+
+def geocode(city: str, min_score: float = 0.6) -> Optional[GeocodeMatch]:
+    """
+    Resolve a city name to coordinates without calling the LLM.
+
+    Returns:
+        GeocodeMatch, or None if the name could not be resolved confidently.
+    """
+    key = ",".join(normalize(p) for p in city.split(","))
+    match = _geocode_cached(key, min_score)
+    if match is None:
+        log.info(f"Offline geocoder could not resolve '{city}'")
+    else:
+        log.info(f"Offline geocoder resolved '{city}' to {match.name}, {match.country_code} ({match.latitude}, {match.longitude}) score={match.score}")
+    return match.model_copy() if match is not None else None
@@ -0,0 +1,404 @@
+"""
+Per-agent latency and token instrumentation.
+
+`InstrumentationPlugin` is an ADK plugin that times every agent, model call
+and tool call of a run. It also records prompt/output token counts, retries
+(Gemini retries from SHARED_RETRY_CONFIG and Open-Meteo retries from the
+weather client) and the size of each session state key. Every timed step is
+exported as an OpenTelemetry span through a private TracerProvider. At the
+end of each run a per-stage table is printed, and `batch_report` aggregates
+p50/p95/p99 latencies over all runs the plugin has kept (the latest
+`max_reports`, when capped).
+
+Exporters (TELEMETRY_EXPORTER): "none", "console", "file" (JSON lines in
+TELEMETRY_FILE, works offline) or "otlp" (OTLP/HTTP, endpoint from the
+standard OTEL_EXPORTER_OTLP_* variables).
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from google.adk.agents.base_agent import BaseAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.plugins.base_plugin import BasePlugin
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.tool_context import ToolContext
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    ConsoleSpanExporter,
+    SimpleSpanProcessor,
+    SpanExporter,
+    SpanExportResult,
+)
+
+from config.settings import TELEMETRY_EXPORTER, TELEMETRY_FILE, TELEMETRY_RUN_REPORT
+
+log = logging.getLogger(__name__)
+
+# Loggers whose retry messages are counted against the step that is running.
+RETRY_LOGGERS = {
+    "google_genai._api_client": "Retrying",
+    "coordinator_agent.sub_agents.baseline_agent_sequential.sub_agents.baseline_data_agent_parallel"
+    ".sub_agents.weather_data_agent.weather_client": "retrying in",
+}
+
+# The step (model or tool call) currently running in this task, for retry attribution.
+_current_step: contextvars.ContextVar[Optional["_Step"]] = contextvars.ContextVar("instrumentation_step", default=None)
+
+
+@dataclass
+class _Step:
+    kind: str                      # "run", "agent", "model" or "tool"
+    name: str
+    span: Any
+    started: float = field(default_factory=time.perf_counter)
+    retries: int = 0
+
+
+@dataclass
+class StageStats:
+    """Aggregated numbers for one stage (e.g. "model:RegressionAgent") within a run."""
+    calls: int = 0
+    seconds: float = 0.0
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+    retries: int = 0
+    errors: int = 0
+
+
+@dataclass
+class RunReport:
+    """Everything recorded for one runner invocation."""
+    invocation_id: str
+    seconds: float = 0.0
+    stages: Dict[str, StageStats] = field(default_factory=dict)
+    state_bytes: Dict[str, int] = field(default_factory=dict)
+
+    def stage(self, key: str) -> StageStats:
+        return self.stages.setdefault(key, StageStats())
+
+    def format_table(self) -> str:
+        header = f"{'stage':<48} {'calls':>5} {'total_s':>9} {'mean_s':>8} {'tok_in':>8} {'tok_out':>8} {'retries':>7} {'errors':>6}"
+        lines = [f"Run {self.invocation_id}: {self.seconds:.3f}s", header, "-" * len(header)]
+        for key, s in sorted(self.stages.items(), key=lambda kv: -kv[1].seconds):
+            lines.append(
+                f"{key[:48]:<48} {s.calls:>5} {s.seconds:>9.3f} {s.seconds / max(s.calls, 1):>8.3f} "
+                f"{s.prompt_tokens:>8} {s.output_tokens:>8} {s.retries:>7} {s.errors:>6}"
+            )
+        if self.state_bytes:
+            sizes = ", ".join(f"{k}={v / 1024:.1f}kB" for k, v in sorted(self.state_bytes.items(), key=lambda kv: -kv[1]))
+            lines.append(f"state sizes: {sizes}")
+        return "\n".join(lines)
+
+
+class JsonLinesSpanExporter(SpanExporter):
+    """Appends finished spans to a local file, one JSON document per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        lines = "".join(json.dumps(json.loads(span.to_json()), separators=(",", ":")) + "\n" for span in spans)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self) -> None:
+        pass
+
+
+def create_tracer_provider(exporter: str = TELEMETRY_EXPORTER, path: str = TELEMETRY_FILE) -> Optional[TracerProvider]:
+    """TracerProvider for the configured exporter, or None when telemetry export is off."""
+    if exporter == "none":
+        return None
+    provider = TracerProvider(resource=Resource.create({"service.name": "energy-baseline-agent"}))
+    if exporter == "console":
+        provider.add_span_processor(SimpleSpanProcessor(ConsoleSpanExporter()))
+    elif exporter == "file":
+        provider.add_span_processor(BatchSpanProcessor(JsonLinesSpanExporter(path)))
+    elif exporter == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    else:
+        raise ValueError(f"Unknown TELEMETRY_EXPORTER '{exporter}', expected none, console, file or otlp")
+    return provider
+
+
+def state_value_size(value: Any) -> int:
+    """Approximate size in bytes of a session state value."""
+    nbytes = getattr(value, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return len(str(value))
+
+
+def percentiles(values: Sequence[float]) -> Dict[str, float]:
+    if not values:
+        return {"p50_s": 0.0, "p95_s": 0.0, "p99_s": 0.0}
+    p50, p95, p99 = np.percentile(np.asarray(values, dtype=np.float64), [50, 95, 99])
+    return {"p50_s": float(p50), "p95_s": float(p95), "p99_s": float(p99)}
+
+
+class _RetryCounter(logging.Filter):
+    """
+    Counts retry log records against the step running in the same task.
+
+    The retry loggers are lowered to INFO so genai's tenacity messages are seen;
+    records below the logger's original level are counted and then dropped.
+    """
+
+    def __init__(self, marker: str, visible_level: int):
+        super().__init__()
+        self.marker = marker
+        self.visible_level = visible_level
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        step = _current_step.get()
+        if step is not None and self.marker in record.getMessage():
+            step.retries += 1
+        return record.levelno >= self.visible_level
+
+
+class InstrumentationPlugin(BasePlugin):
+    """Times agents, model calls and tool calls, and reports per-stage numbers per run."""
+
+    def __init__(
+        self,
+        name: str = "instrumentation_plugin",
+        tracer_provider: Optional[TracerProvider] = None,
+        print_report: bool = TELEMETRY_RUN_REPORT,
+        max_reports: Optional[int] = None,
+    ):
+        super().__init__(name)
+        self.tracer_provider = tracer_provider if tracer_provider is not None else create_tracer_provider()
+        provider = self.tracer_provider or trace.NoOpTracerProvider()
+        self.tracer = provider.get_tracer("energy_baseline.instrumentation")
+        self.print_report = print_report
+        # Long-lived runners (the service) cap this; batch_report then covers the latest runs.
+        self.reports: Deque[RunReport] = deque(maxlen=max_reports)
+        self._runs: Dict[str, Tuple[RunReport, _Step]] = {}
+        self._agents: Dict[Tuple[str, str, str], _Step] = {}
+        self._models: Dict[Tuple[str, str, str], List[_Step]] = {}
+        self._tools: Dict[str, _Step] = {}
+        self._retry_filters = []
+        for logger_name, marker in RETRY_LOGGERS.items():
+            retry_log = logging.getLogger(logger_name)
+            counter = _RetryCounter(marker, retry_log.getEffectiveLevel())
+            previous_level = retry_log.level
+            if not retry_log.isEnabledFor(logging.INFO):
+                retry_log.setLevel(logging.INFO)  # genai logs its tenacity retries at INFO
+            retry_log.addFilter(counter)
+            self._retry_filters.append((retry_log, counter, previous_level))
+
+    # ---------------------------------------------------------------
+    # Helpers
+    # ---------------------------------------------------------------
+    def _start(self, kind: str, name: str, parent: Optional[_Step], **attributes) -> _Step:
+        context = trace.set_span_in_context(parent.span) if parent is not None else None
+        span = self.tracer.start_span(f"{kind} {name}", context=context, attributes=attributes)
+        return _Step(kind=kind, name=name, span=span)
+
+    def _finish(self, invocation_id: str, step: _Step, error: Optional[BaseException] = None, **counts) -> float:
+        seconds = time.perf_counter() - step.started
+        step.span.set_attribute("retries", step.retries)
+        for key, value in counts.items():
+            step.span.set_attribute(key, value)
+        if error is not None:
+            step.span.record_exception(error)
+            step.span.set_status(trace.Status(trace.StatusCode.ERROR, str(error)))
+        step.span.end()
+        run = self._runs.get(invocation_id)
+        if run is not None:
+            stats = run[0].stage(f"{step.kind}:{step.name}")
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.retries += step.retries
+            stats.errors += error is not None
+            stats.prompt_tokens += counts.get("prompt_tokens", 0)
+            stats.output_tokens += counts.get("output_tokens", 0)
+        return seconds
+
+    @staticmethod
+    def _agent_key(callback_context: CallbackContext, agent_name: Optional[str] = None) -> Tuple[str, str, str]:
+        branch = callback_context._invocation_context.branch or ""
+        return callback_context.invocation_id, branch, agent_name or callback_context.agent_name
+
+    def _parent_for(self, invocation_id: str, branch: str, agent_name: str) -> Optional[_Step]:
+        step = self._agents.get((invocation_id, branch, agent_name))
+        if step is not None:
+            return step
+        run = self._runs.get(invocation_id)
+        return run[1] if run else None
+
+    # ---------------------------------------------------------------
+    # Run
+    # ---------------------------------------------------------------
+    async def before_run_callback(self, *, invocation_context) -> None:
+        report = RunReport(invocation_id=invocation_context.invocation_id)
+        step = self._start(
+            "run", invocation_context.agent.name, None,
+            session_id=invocation_context.session.id, invocation_id=invocation_context.invocation_id,
+        )
+        self._runs[invocation_context.invocation_id] = (report, step)
+        return None
+
+    async def after_run_callback(self, *, invocation_context) -> None:
+        invocation_id = invocation_context.invocation_id
+        run = self._runs.pop(invocation_id, None)
+        if run is None:
+            return
+        report, step = run
+        report.seconds = time.perf_counter() - step.started
+        report.state_bytes = {k: state_value_size(v) for k, v in invocation_context.session.state.items()}
+        step.span.set_attribute("state_bytes", sum(report.state_bytes.values()))
+        step.span.end()
+        self.reports.append(report)
+        # Drop leftovers of steps that never finished (e.g. an agent that raised).
+        for key in [k for k in self._agents if k[0] == invocation_id]:
+            self._agents.pop(key).span.end()
+        for key in [k for k in self._models if k[0] == invocation_id]:
+            self._models.pop(key)
+        if self.print_report:
+            print(report.format_table())
+
+    # ---------------------------------------------------------------
+    # Agents
+    # ---------------------------------------------------------------
+    async def before_agent_callback(self, *, agent: BaseAgent, callback_context: CallbackContext):
+        invocation_id, branch, name = self._agent_key(callback_context, agent.name)
+        parent_name = agent.parent_agent.name if agent.parent_agent else ""
+        # Sub-agents of a ParallelAgent run on a child branch ("<parent branch>.<parent>.<name>"),
+        # so look the parent up on each enclosing branch.
+        parent, candidate = None, branch
+        while parent is None:
+            parent = self._agents.get((invocation_id, candidate, parent_name))
+            if not candidate:
+                break
+            candidate = candidate.rpartition(".")[0]
+        if parent is None:
+            parent = self._parent_for(invocation_id, "", parent_name)
+        self._agents[(invocation_id, branch, name)] = self._start("agent", name, parent, branch=branch)
+        return None
+
+    async def after_agent_callback(self, *, agent: BaseAgent, callback_context: CallbackContext):
+        invocation_id, branch, name = self._agent_key(callback_context, agent.name)
+        step = self._agents.pop((invocation_id, branch, name), None)
+        if step is not None:
+            self._finish(invocation_id, step)
+        return None
+
+    # ---------------------------------------------------------------
+    # Model calls
+    # ---------------------------------------------------------------
+    async def before_model_callback(self, *, callback_context: CallbackContext, llm_request: LlmRequest):
+        key = self._agent_key(callback_context)
+        step = self._start(
+            "model", key[2], self._parent_for(*key),
+            model=llm_request.model or "", contents=len(llm_request.contents or []),
+        )
+        self._models.setdefault(key, []).append(step)
+        _current_step.set(step)
+        return None
+
+    def _pop_model(self, callback_context: CallbackContext) -> Optional[_Step]:
+        key = self._agent_key(callback_context)
+        steps = self._models.get(key)
+        if not steps:
+            return None
+        step = steps.pop()
+        if not steps:
+            self._models.pop(key, None)
+        _current_step.set(None)
+        return step
+
+    async def after_model_callback(self, *, callback_context: CallbackContext, llm_response: LlmResponse):
+        if llm_response.partial:
+            return None
+        step = self._pop_model(callback_context)
+        if step is not None:
+            usage = llm_response.usage_metadata
+            self._finish(
+                callback_context.invocation_id, step,
+                prompt_tokens=(usage.prompt_token_count or 0) if usage else 0,
+                output_tokens=(usage.candidates_token_count or 0) if usage else 0,
+            )
+        return None
+
+    async def on_model_error_callback(self, *, callback_context: CallbackContext, llm_request: LlmRequest, error: Exception):
+        step = self._pop_model(callback_context)
+        if step is not None:
+            self._finish(callback_context.invocation_id, step, error=error)
+        return None
+
+    # ---------------------------------------------------------------
+    # Tool calls
+    # ---------------------------------------------------------------
+    async def before_tool_callback(self, *, tool: BaseTool, tool_args: Dict[str, Any], tool_context: ToolContext):
+        key = self._agent_key(tool_context)
+        step = self._start("tool", tool.name, self._parent_for(*key), agent=key[2])
+        self._tools[tool_context.function_call_id or f"{key}:{tool.name}"] = step
+        _current_step.set(step)
+        return None
+
+    def _pop_tool(self, tool: BaseTool, tool_context: ToolContext) -> Optional[_Step]:
+        _current_step.set(None)
+        return self._tools.pop(tool_context.function_call_id or f"{self._agent_key(tool_context)}:{tool.name}", None)
+
+    async def after_tool_callback(self, *, tool: BaseTool, tool_args: Dict[str, Any], tool_context: ToolContext, result: dict):
+        step = self._pop_tool(tool, tool_context)
+        if step is not None:
+            self._finish(tool_context.invocation_id, step)
+        return None
+
+    async def on_tool_error_callback(self, *, tool: BaseTool, tool_args: Dict[str, Any], tool_context: ToolContext, error: Exception):
+        step = self._pop_tool(tool, tool_context)
+        if step is not None:
+            self._finish(tool_context.invocation_id, step, error=error)
+        return None
+
+    # ---------------------------------------------------------------
+    # Reporting
+    # ---------------------------------------------------------------
+    def batch_report(self) -> Dict[str, Dict[str, float]]:
+        """p50/p95/p99 of run latency and of each stage's per-run time across all recorded runs."""
+        per_stage: Dict[str, List[float]] = {}
+        for report in self.reports:
+            for key, stats in report.stages.items():
+                per_stage.setdefault(key, []).append(stats.seconds)
+        summary = {"run": {"runs": len(self.reports), **percentiles([r.seconds for r in self.reports])}}
+        for key, values in sorted(per_stage.items()):
+            summary[key] = {"runs": len(values), **percentiles(values)}
+        return summary
+
+    @staticmethod
+    def format_batch_report(summary: Dict[str, Dict[str, float]]) -> str:
+        header = f"{'stage':<48} {'runs':>5} {'p50_s':>8} {'p95_s':>8} {'p99_s':>8}"
+        lines = [header, "-" * len(header)]
+        for key, row in summary.items():
+            lines.append(f"{key[:48]:<48} {row['runs']:>5} {row['p50_s']:>8.3f} {row['p95_s']:>8.3f} {row['p99_s']:>8.3f}")
+        return "\n".join(lines)
+
+    async def close(self) -> None:
+        for retry_log, counter, previous_level in self._retry_filters:
+            retry_log.removeFilter(counter)
+            retry_log.setLevel(previous_level)
+        self._retry_filters = []
+        if self.tracer_provider is not None:
+            self.tracer_provider.force_flush()
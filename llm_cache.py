@@ -0,0 +1,258 @@
+"""
+Opt-in on-disk cache of LLM responses.
+
+`LlmCachePlugin` answers a model call from disk when an identical request was
+seen before, so re-runs (e.g. the same portfolio in batch mode, or geocoding
+the same city through latlong_agent) replay in milliseconds and use no tokens.
+The key is a SHA-256 of the normalized request: model, system instruction,
+contents, tool declarations, response schema and generation settings. Text
+whitespace is collapsed and function call ids are dropped, so ids and
+formatting that differ between runs do not cause misses.
+
+Entries are JSON files in LLM_CACHE_DIR. They expire after LLM_CACHE_TTL_HOURS,
+and the least recently used are evicted once the store outgrows LLM_CACHE_MAX_MB.
+Tools still run when a cached turn asks for them; only the model call is skipped.
+
+Put the plugin before other plugins with model callbacks. A cache hit ends the
+before_model chain, and ADK does not run after_model for it.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.plugins.base_plugin import BasePlugin
+from google.genai import types
+from pydantic import BaseModel
+
+from config.settings import LLM_CACHE_DIR, LLM_CACHE_MAX_BYTES, LLM_CACHE_TTL_S
+
+log = logging.getLogger(__name__)
+
+# GenerateContentConfig fields that change what the model returns.
+GENERATION_FIELDS = (
+    "temperature", "top_p", "top_k", "max_output_tokens", "candidate_count",
+    "stop_sequences", "seed", "presence_penalty", "frequency_penalty", "response_mime_type",
+)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _normalize_text(text: str) -> str:
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def _dump(value: Any) -> Any:
+    """JSON-compatible form of a genai / pydantic value (or pydantic class, as its schema)."""
+    if isinstance(value, type) and issubclass(value, BaseModel):
+        return value.model_json_schema()
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json", exclude_none=True)
+    return value
+
+
+def _normalize_part(part: types.Part) -> Dict[str, Any]:
+    if part.text is not None:
+        return {"text": _normalize_text(part.text)}
+    if part.function_call is not None:
+        return {"function_call": {"name": part.function_call.name, "args": part.function_call.args or {}}}
+    if part.function_response is not None:
+        return {"function_response": {"name": part.function_response.name, "response": part.function_response.response or {}}}
+    return part.model_dump(mode="json", exclude_none=True, exclude={"thought_signature"})
+
+
+def normalize_request(llm_request: LlmRequest) -> Dict[str, Any]:
+    """The parts of a request that determine the response, in a canonical form."""
+    config = llm_request.config or types.GenerateContentConfig()
+    instruction = config.system_instruction
+    if isinstance(instruction, types.Content):
+        instruction = " ".join(p.text or "" for p in instruction.parts or [])
+    declarations = [
+        declaration.model_dump(mode="json", exclude_none=True)
+        for tool in config.tools or []
+        for declaration in (getattr(tool, "function_declarations", None) or [])
+    ]
+    return {
+        "model": llm_request.model,
+        "system_instruction": _normalize_text(str(instruction or "")),
+        "contents": [
+            {"role": content.role, "parts": [_normalize_part(p) for p in content.parts or []]}
+            for content in llm_request.contents
+        ],
+        "tools": sorted(declarations, key=lambda d: d.get("name", "")),
+        "response_schema": _dump(config.response_schema),
+        "response_json_schema": _dump(config.response_json_schema),
+        "generation": {f: _dump(getattr(config, f, None)) for f in GENERATION_FIELDS if getattr(config, f, None) is not None},
+    }
+
+
+def request_key(llm_request: LlmRequest) -> str:
+    canonical = json.dumps(normalize_request(llm_request), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LlmResponseCache:
+    """JSON file per request key, with TTL and an LRU size budget."""
+
+    def __init__(self, cache_dir: str, ttl_s: float = 7 * 24 * 3600, max_bytes: int = 64 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.stores = 0
+        self.evictions = 0
+        self.tokens_saved = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> Optional[LlmResponse]:
+        """Cached response for key, or None if missing, expired or unreadable."""
+        path = self._path(key)
+        with self._lock:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    entry = json.load(f)
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+            except (OSError, ValueError) as e:
+                log.warning(f"Discarding unreadable LLM cache entry {path.name}: {e}")
+                path.unlink(missing_ok=True)
+                self.misses += 1
+                return None
+            if time.time() - entry["created"] > self.ttl_s:
+                path.unlink(missing_ok=True)
+                self.expired += 1
+                self.misses += 1
+                return None
+            try:
+                os.utime(path)  # LRU order follows mtime
+            except OSError:
+                pass
+            self.hits += 1
+            self.tokens_saved += entry.get("tokens", 0)
+        return LlmResponse.model_validate(entry["response"])
+
+    def put(self, key: str, llm_response: LlmResponse) -> None:
+        usage = llm_response.usage_metadata
+        entry = {
+            "created": time.time(),
+            "tokens": ((usage.prompt_token_count or 0) + (usage.candidates_token_count or 0)) if usage else 0,
+            "response": llm_response.model_dump(
+                mode="json", exclude_none=True, exclude={"usage_metadata", "custom_metadata"}
+            ),
+        }
+        with self._lock:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self._path(key)
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, separators=(",", ":"))
+            os.replace(tmp_path, path)
+            self.stores += 1
+            self._evict(keep=path)
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters, tokens not spent thanks to hits and current on-disk size."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "expired": self.expired,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "tokens_saved": self.tokens_saved,
+            "size_bytes": sum(size for _, size, _ in self._files()),
+        }
+
+    def clear(self) -> None:
+        """Remove every cached response."""
+        with self._lock:
+            for path, _, _ in self._files():
+                path.unlink(missing_ok=True)
+
+    def _files(self) -> List[Tuple[Path, int, float]]:
+        if not self.cache_dir.exists():
+            return []
+        files = []
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            files.append((path, st.st_size, st.st_mtime))
+        return files
+
+    def _evict(self, keep: Optional[Path] = None) -> None:
+        """Delete least-recently-used entries until the store fits in max_bytes."""
+        files = sorted(self._files(), key=lambda f: f[2])
+        total = sum(size for _, size, _ in files)
+        for path, size, _ in files:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+            self.evictions += 1
+
+
+class LlmCachePlugin(BasePlugin):
+    """Serves repeated model calls from an LlmResponseCache and stores new final responses."""
+
+    def __init__(self, name: str = "llm_cache_plugin", cache: Optional[LlmResponseCache] = None):
+        super().__init__(name)
+        self.cache = cache or LlmResponseCache(LLM_CACHE_DIR, ttl_s=LLM_CACHE_TTL_S, max_bytes=LLM_CACHE_MAX_BYTES)
+        # Keys of cache misses waiting for their response, per running agent.
+        self._pending: Dict[Tuple[str, str, str], str] = {}
+
+    @staticmethod
+    def _agent_key(callback_context: CallbackContext) -> Tuple[str, str, str]:
+        branch = callback_context._invocation_context.branch or ""
+        return callback_context.invocation_id, branch, callback_context.agent_name
+
+    async def before_model_callback(
+        self, *, callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> Optional[LlmResponse]:
+        key = request_key(llm_request)
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is None:
+            self._pending[self._agent_key(callback_context)] = key
+            return None
+        log.info(f"LLM cache hit for {callback_context.agent_name} ({key[:12]})")
+        cached.custom_metadata = {**(cached.custom_metadata or {}), "llm_cache": "hit"}
+        return cached
+
+    async def after_model_callback(
+        self, *, callback_context: CallbackContext, llm_response: LlmResponse
+    ) -> Optional[LlmResponse]:
+        if llm_response.partial:
+            return None
+        key = self._pending.pop(self._agent_key(callback_context), None)
+        if key is None or llm_response.error_code or not llm_response.content or not llm_response.content.parts:
+            return None
+        await asyncio.to_thread(self.cache.put, key, llm_response)
+        return None
+
+    async def on_model_error_callback(
+        self, *, callback_context: CallbackContext, llm_request: LlmRequest, error: Exception
+    ) -> Optional[LlmResponse]:
+        self._pending.pop(self._agent_key(callback_context), None)
+        return None
+
+    async def close(self) -> None:
+        log.info(f"LLM cache stats: {self.cache.stats()}")
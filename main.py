@@ -1,16 +1,18 @@
 import asyncio
 import json
 import logging
-from google.adk.sessions import InMemorySessionService
-from google.adk.runners import Runner
-from google.adk.plugins.logging_plugin import LoggingPlugin
-from google.genai import types
 import os
+import uuid
+from typing import TYPE_CHECKING, Any, Dict, Optional
 
-# NOTE: Ensure 'root_agent' is your Input Agent or Sequential Agent defined elsewhere.
-from coordinator_agent.agent import root_agent 
+from config.settings import LLM_CACHE_ENABLED, STRUCTURED_INPUT
 from dotenv import load_dotenv
 
+# ADK, the agent tree and the plugins are imported in main(), so `--help` and
+# argument errors return without paying for them.
+if TYPE_CHECKING:
+    from google.adk.runners import Runner
+
 load_dotenv()  # Loads .env from current directory
 
 api_key = os.getenv("GOOGLE_API_KEY")  # or the variable name you used
@@ -18,17 +20,34 @@ api_key = os.getenv("GOOGLE_API_KEY")  # or the variable name you used
 # --- Configuration ---
 APP_NAME = "multiple_regression_prediction_app"
 USER_ID = "multiple_workflow_user"
-SESSION_ID = "multiple_workflow_session" 
-# Use a specific session ID for reuse, or set to None/unique for fresh sessions.
+# Prefix of the per-run session id. Sessions persist (SESSION_BACKEND), so every run
+# gets a fresh one rather than reopening the previous run's state and events.
+SESSION_ID = "multiple_workflow_session"
 
 logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
 
 
 async def run_session(
-    runner_instance: Runner, user_queries: list[str] | str, session_id: str = "default"
+    runner_instance: "Runner",
+    user_queries: list[str] | str,
+    session_id: str = "default",
+    state: Optional[Dict[str, Any]] = None,
 ):
-    """Helper function to run queries in a session and display responses."""
+    """
+    Helper function to run queries in a session and display responses, after seeding `state` into it.
+
+    Progress milestones (progress.py) are printed as soon as each stage finishes.
+    """
+    from google.adk.errors.already_exists_error import AlreadyExistsError
+    from google.genai import types
+
+    from progress import ProgressEvent, ProgressTracker
+    from session_store import seed_session_state
+
+    def show_progress(progress: ProgressEvent) -> None:
+        print(f"Progress [{progress.elapsed_s:.2f}s] {progress.milestone}: {progress.message}", flush=True)
+
     print(f"\n### Session: {session_id}")
 
     # Create or retrieve session
@@ -36,11 +55,14 @@ async def run_session(
         session = await session_service.create_session(
             app_name=APP_NAME, user_id=USER_ID, session_id=session_id
         )
-    except:
+    except AlreadyExistsError:
         session = await session_service.get_session(
             app_name=APP_NAME, user_id=USER_ID, session_id=session_id
         )
 
+    if state:
+        await seed_session_state(session_service, session, state)
+
     # Convert single query to list
     if isinstance(user_queries, str):
         user_queries = [user_queries]
@@ -49,11 +71,14 @@ async def run_session(
     for query in user_queries:
         print(f"\nUser > {query}")
         query_content = types.Content(role="user", parts=[types.Part(text=query)])
+        tracker = ProgressTracker(state, on_progress=show_progress)
+        tracker.start()
 
         # Stream agent response
         async for event in runner_instance.run_async(
             user_id=USER_ID, session_id=session.id, new_message=query_content
         ):
+            tracker.observe(event)
             if event.is_final_response() and event.content and event.content.parts:
                 text = event.content.parts[0].text
                 if text and text != "None":
@@ -61,15 +86,56 @@ async def run_session(
 
 
 print("✅ Helper functions defined.")
-async def main(name: str, city: str, baseline_from_date: str, baseline_to_date: str):
+async def main(
+    name: str,
+    city: str,
+    baseline_from_date: str,
+    baseline_to_date: str,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+    structured: bool = STRUCTURED_INPUT,
+    facility_id: Optional[str] = None,
+):
     global session_service
     global logger
-    session_service = InMemorySessionService()
-
-    # Initialize the runner with logging plugin
+    from google.adk.plugins.logging_plugin import LoggingPlugin
+    from google.adk.runners import Runner
+
+    # Structured input: validate the arguments here and seed session state, so the
+    # run starts at the baseline pipeline without the coordinator and input agent turns.
+    state = None
+    if structured:
+        from coordinator_agent.sub_agents.input_agent.agent import structured_user_state
+
+        try:
+            state = structured_user_state(
+                name, city, baseline_from_date, baseline_to_date, latitude, longitude, facility_id
+            )
+        except ValueError as e:
+            raise SystemExit(f"Invalid baseline input: {e}")
+        except LookupError as e:
+            logger.warning(f"{e} Falling back to the conversational run.")
+    if state is not None:
+        from coordinator_agent.sub_agents.baseline_agent_sequential.agent import baseline_agent_sequential as root_agent
+    else:
+        from coordinator_agent.agent import root_agent
+
+        # The input agent keeps a seeded facility id when it saves the user's details.
+        state = {"facility_id": facility_id} if facility_id else None
+    from instrumentation import InstrumentationPlugin
+    from llm_cache import LlmCachePlugin
+    from resilience import ResiliencePlugin
+    from session_store import create_session_service
+
+    session_service = create_session_service()
+
+    # Initialize the runner with logging and instrumentation plugins
+    instrumentation = InstrumentationPlugin()
+    # The LLM cache goes first: a hit skips the model callbacks of later plugins.
+    plugins = [LlmCachePlugin()] if LLM_CACHE_ENABLED else []
     runner = Runner(
         agent=root_agent,
-        plugins=[LoggingPlugin()],
+        plugins=plugins + [ResiliencePlugin(), LoggingPlugin(), instrumentation],
         session_service=session_service,
         app_name=APP_NAME,
     )
@@ -85,8 +151,10 @@ async def main(name: str, city: str, baseline_from_date: str, baseline_to_date:
     await run_session(
         runner_instance=runner,
         user_queries=user_input,
-        session_id=SESSION_ID,
+        session_id=f"{SESSION_ID}_{uuid.uuid4().hex}",
+        state=state,
     )
+    await runner.close()
 if __name__ == "__main__":
     import argparse
 
@@ -106,6 +174,17 @@ if __name__ == "__main__":
         help="Baseline end date in YYYY-MM-DD format",
     )
 
+    parser.add_argument("--latitude", type=float, help="Latitude, when the city cannot be geocoded offline")
+    parser.add_argument("--longitude", type=float, help="Longitude, when the city cannot be geocoded offline")
+    parser.add_argument(
+        "--facility_id", type=str, help="Id the baseline is registered under (default: name and city)"
+    )
+    parser.add_argument(
+        "--conversational",
+        action="store_true",
+        help="Send the inputs through the coordinator as a chat message instead of seeding session state",
+    )
+
     args = parser.parse_args()
 
     asyncio.run(
@@ -114,5 +193,9 @@ if __name__ == "__main__":
             city=args.city,
             baseline_from_date=args.baseline_from_date,
             baseline_to_date=args.baseline_to_date,
+            latitude=args.latitude,
+            longitude=args.longitude,
+            structured=STRUCTURED_INPUT and not args.conversational,
+            facility_id=args.facility_id,
         )
     )
\ No newline at end of file
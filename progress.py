@@ -0,0 +1,208 @@
+"""
+Progress milestones of a baseline run.
+
+The runner yields every event as it happens, including those of the agents
+inside AnalyticalCoreAgentSequential and BaselineDataAgentParallel. Each
+pipeline stage ends by writing its output to session state, so the first
+event carrying a stage's state key marks that stage as finished.
+`ProgressTracker` turns those events into typed milestones, each with a
+compact partial result:
+
+    geocode_resolved     location and baseline window (at the start, for seeded state)
+    weather_ready        weather branch done: days and date range
+    consumption_ready    consumption branch done: days, date range and total kWh
+    fit_complete         regression equation and R², NMBE, MAPE (and the change-point / hourly fits)
+    model_selected       cross-validated winner, when model selection is enabled
+    prediction_ready     savings summary for the reporting period
+
+main.py prints them as they arrive, batch.run_facility passes them to an
+`on_progress` callback and server.py streams them over server-sent events.
+Callers get the fitted baseline as soon as the regression stage is done,
+without waiting for model selection and prediction.
+"""
+import json
+import time
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+import numpy as np
+from google.adk.events import Event
+from pydantic import BaseModel, Field
+
+from coordinator_agent.sub_agents.baseline_agent_sequential.sub_agents.context_summary import series_span
+from coordinator_agent.sub_agents.baseline_agent_sequential.sub_agents.daily_series import RECORDS_FIELD, DailySeries
+
+GEOCODE_RESOLVED = "geocode_resolved"
+WEATHER_READY = "weather_ready"
+CONSUMPTION_READY = "consumption_ready"
+FIT_COMPLETE = "fit_complete"
+MODEL_SELECTED = "model_selected"
+PREDICTION_READY = "prediction_ready"
+
+
+class ProgressEvent(BaseModel):
+    """One milestone of a run, with the partial result it makes available."""
+    milestone: str
+    stage: str                          # author of the event that completed it
+    elapsed_s: float                    # since the run started
+    message: str
+    data: Dict[str, Any] = Field(default_factory=dict)
+
+
+def _as_dict(value: Any) -> Dict[str, Any]:
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    if isinstance(value, str):
+        return json.loads(value)
+    return dict(value or {})
+
+
+def _series_data(value: Any, date_field: str = "date", total_field: Optional[str] = None) -> Dict[str, Any]:
+    days, first, last = series_span(value, date_field) or (0, "", "")
+    data: Dict[str, Any] = {"days": days, "from_date": first, "to_date": last}
+    if total_field and days:
+        if isinstance(value, DailySeries):
+            data[f"total_{total_field}"] = round(float(np.nansum(value[total_field])), 3)
+        else:
+            records = _as_dict(value).get(RECORDS_FIELD) or []
+            data[f"total_{total_field}"] = round(sum(float(r.get(total_field) or 0.0) for r in records), 3)
+    return data
+
+
+def _geocode(state: Mapping[str, Any]) -> Dict[str, Any]:
+    return {
+        key: state.get(key)
+        for key in ("city", "latitude", "longitude", "baseline_from_date", "baseline_end_date")
+    }
+
+
+def _fit(record: Any, hourly: Any = None) -> Dict[str, Any]:
+    record = _as_dict(record)
+    data = {
+        key: record.get(key)
+        for key in ("regression_equation", "intercept", "coefficients", "r2", "nmbe", "mape", "n_observations")
+    }
+    change_point = record.get("change_point")
+    if change_point:
+        data["change_point"] = {key: change_point.get(key) for key in ("model_type", "r2", "cv_rmse", "nmbe")}
+    if hourly:
+        hourly = _as_dict(hourly)
+        data["hourly"] = {key: hourly.get(key) for key in ("r2", "cv_rmse", "nmbe", "mape", "n_observations")}
+    return data
+
+
+def _selection(selection: Any) -> Dict[str, Any]:
+    selection = _as_dict(selection)
+    winner = selection.get("winner") or {}
+    return {
+        "model": winner.get("name"),
+        "cv_rmse": winner.get("cv_rmse"),
+        "nmbe": winner.get("nmbe"),
+        "passes": selection.get("passes"),
+        "candidates": len(selection.get("candidates") or []),
+    }
+
+
+def _prediction(savings: Any) -> Dict[str, Any]:
+    savings = _as_dict(savings)
+    return {"baseline_model": savings.get("baseline_model"), "summary": savings.get("summary")}
+
+
+def _message(milestone: str, data: Dict[str, Any]) -> str:
+    if milestone == GEOCODE_RESOLVED:
+        return (
+            f"{data['city']} at ({data['latitude']}, {data['longitude']}), "
+            f"baseline {data['baseline_from_date']} to {data['baseline_end_date']}"
+        )
+    if milestone in (WEATHER_READY, CONSUMPTION_READY):
+        text = f"{data['days']} days" + (f", {data['from_date']} to {data['to_date']}" if data["days"] else "")
+        if "total_consumption_kwh" in data:
+            text += f", {data['total_consumption_kwh']:.1f} kWh"
+        return text
+    if milestone == FIT_COMPLETE:
+        return (
+            f"{data['regression_equation']} (R² {data['r2']:.4f}, NMBE {data['nmbe']:.4f}, "
+            f"MAPE {data['mape']:.4f}, {data['n_observations']} days)"
+        )
+    if milestone == MODEL_SELECTED:
+        return f"'{data['model']}' of {data['candidates']} candidates (CV(RMSE) {data['cv_rmse']:.4f})"
+    summary = data.get("summary") or {}
+    return (
+        f"{summary.get('n_days')} days, adjusted baseline {summary.get('adjusted_baseline_kwh') or 0.0:.1f} kWh, "
+        f"avoided energy {summary.get('avoided_energy_kwh') or 0.0:.1f} kWh"
+    )
+
+
+class ProgressTracker:
+    """
+    Milestones of one run, from the runner's events.
+
+    Each milestone is emitted once, the first time its state key appears. With
+    `state` (session state seeded before the run), milestones already reached
+    are emitted by `start`.
+    """
+
+    def __init__(
+        self,
+        state: Optional[Mapping[str, Any]] = None,
+        on_progress: Optional[Callable[[ProgressEvent], Any]] = None,
+        started: Optional[float] = None,
+    ):
+        self.state: Dict[str, Any] = dict(state or {})
+        self.on_progress = on_progress
+        self.events: List[ProgressEvent] = []
+        self.started = time.perf_counter() if started is None else started   # perf_counter() at run start
+
+    @property
+    def reached(self) -> Dict[str, float]:
+        """Elapsed seconds at which each milestone was reached."""
+        return {e.milestone: e.elapsed_s for e in self.events}
+
+    def start(self) -> List[ProgressEvent]:
+        """Milestones already reached in the seeded state."""
+        return self._check("user", self.state)
+
+    def observe(self, event: Event) -> List[ProgressEvent]:
+        """Milestones completed by this event, if any."""
+        delta = event.actions.state_delta if event.actions and not event.partial else None
+        if not delta:
+            return []
+        self.state.update(delta)
+        return self._check(event.author, delta)
+
+    def _check(self, stage: str, changed: Mapping[str, Any]) -> List[ProgressEvent]:
+        state, reached = self.state, self.reached
+        candidates = []
+        if "latitude" in changed and state.get("latitude") is not None and state.get("longitude") is not None:
+            candidates.append((GEOCODE_RESOLVED, lambda: _geocode(state)))
+        if changed.get("weather_data") is not None:
+            candidates.append((WEATHER_READY, lambda: _series_data(state["weather_data"])))
+        if changed.get("energy_consumption_data") is not None:
+            candidates.append(
+                (CONSUMPTION_READY, lambda: _series_data(state["energy_consumption_data"], "record_date", "consumption_kwh"))
+            )
+        if changed.get("regression_record"):
+            candidates.append(
+                (FIT_COMPLETE, lambda: _fit(state["regression_record"], state.get("hourly_regression_record")))
+            )
+        if changed.get("model_selection"):
+            candidates.append((MODEL_SELECTED, lambda: _selection(state["model_selection"])))
+        if changed.get("savings"):
+            candidates.append((PREDICTION_READY, lambda: _prediction(state["savings"])))
+
+        emitted = []
+        for milestone, build in candidates:
+            if milestone in reached:
+                continue
+            data = build()
+            progress = ProgressEvent(
+                milestone=milestone,
+                stage=stage,
+                elapsed_s=round(time.perf_counter() - self.started, 4),
+                message=_message(milestone, data),
+                data=data,
+            )
+            self.events.append(progress)
+            emitted.append(progress)
+            if self.on_progress is not None:
+                self.on_progress(progress)
+        return emitted
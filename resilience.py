@@ -0,0 +1,348 @@
+"""
+Upstream protection shared by every session in the process.
+
+- `TokenBucket`: process-wide rate limiter per upstream ("gemini", "open_meteo").
+  Callers queue FIFO for tokens; queue depth and wait times are recorded.
+- `CircuitBreaker`: after BREAKER_FAILURE_THRESHOLD consecutive upstream
+  failures, calls fail fast for BREAKER_RESET_S, then a single probe decides
+  whether the circuit closes again.
+- `Deadline`: per-baseline time budget carried in a context variable. Limiter
+  waits, per-attempt timeouts and retry backoff all stop at the deadline, so
+  a 429 storm cannot stall a run for longer than BASELINE_DEADLINE_S.
+
+`ResiliencePlugin` applies all three to Gemini calls and opens one deadline
+per runner invocation. The Open-Meteo client applies them to weather requests.
+"""
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+import httpx
+import numpy as np
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.plugins.base_plugin import BasePlugin
+from google.genai import errors, types
+
+from config.settings import (
+    BASELINE_DEADLINE_S,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_RESET_S,
+    GEMINI_BURST,
+    GEMINI_RATE_PER_MIN,
+    OPEN_METEO_BURST,
+    OPEN_METEO_RATE_PER_MIN,
+    SHARED_RETRY_CONFIG,
+)
+
+log = logging.getLogger(__name__)
+
+# Status codes that mean the upstream (not the request) is in trouble.
+UPSTREAM_FAILURE_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the deadline budget of the current baseline run is used up."""
+
+
+class CircuitOpenError(Exception):
+    """Raised when an upstream's circuit breaker is open."""
+
+
+# -------------------------------------------------------------------
+# Deadline budget
+# -------------------------------------------------------------------
+class Deadline:
+    """Monotonic point in time by which the current baseline run must finish."""
+
+    def __init__(self, budget_s: float):
+        self.budget_s = budget_s
+        self.expires_at = time.monotonic() + budget_s
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self, what: str) -> None:
+        if self.expired:
+            raise DeadlineExceeded(f"{what}: deadline budget of {self.budget_s:.0f}s exhausted")
+
+
+_deadline: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar("baseline_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Deadline of the baseline run this task belongs to, if any."""
+    return _deadline.get()
+
+
+def start_deadline(budget_s: float) -> contextvars.Token:
+    """Open a deadline for the current context (never extending an enclosing one)."""
+    enclosing = _deadline.get()
+    deadline = Deadline(budget_s)
+    if enclosing is not None and enclosing.expires_at < deadline.expires_at:
+        deadline = enclosing
+    return _deadline.set(deadline)
+
+
+def end_deadline(token: contextvars.Token) -> None:
+    try:
+        _deadline.reset(token)
+    except ValueError:
+        pass  # Reset from a different context; the context is going away anyway.
+
+
+# -------------------------------------------------------------------
+# Rate limiting
+# -------------------------------------------------------------------
+class TokenBucket:
+    """
+    FIFO token bucket: `rate_per_s` sustained, `burst` at once. rate_per_s=0 disables limiting.
+
+    Each caller reserves the next token and sleeps until it is due, so the
+    number of sleeping callers is the queue depth.
+    """
+
+    def __init__(self, name: str, rate_per_s: float, burst: int):
+        self.name = name
+        self.rate_per_s = rate_per_s
+        self.burst = max(int(burst), 1)
+        self.acquired = 0
+        self.waited = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.total_wait_s = 0.0
+        self._waits: deque = deque(maxlen=2048)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, deadline: Optional[Deadline]) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate_per_s)
+            self._updated = now
+            wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate_per_s
+            if deadline is not None and wait > deadline.remaining():
+                raise DeadlineExceeded(
+                    f"{self.name}: rate limit wait of {wait:.1f}s exceeds the remaining deadline budget"
+                )
+            self._tokens -= 1
+            return wait
+
+    async def acquire(self, deadline: Optional[Deadline] = None) -> float:
+        """Wait for a token; returns the seconds waited. Raises DeadlineExceeded instead of waiting past deadline."""
+        wait = self._reserve(deadline) if self.rate_per_s > 0 else 0.0
+        if wait > 0:
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                self.queue_depth -= 1
+            self.waited += 1
+            self.total_wait_s += wait
+        self.acquired += 1
+        self._waits.append(wait)
+        return wait
+
+    def stats(self) -> Dict[str, Any]:
+        waits = np.asarray(self._waits, dtype=np.float64)
+        p50, p95 = np.percentile(waits, [50, 95]) if len(waits) else (0.0, 0.0)
+        return {
+            "rate_per_min": round(self.rate_per_s * 60, 1),
+            "acquired": self.acquired,
+            "waited": self.waited,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "total_wait_s": round(self.total_wait_s, 3),
+            "wait_p50_s": round(float(p50), 4),
+            "wait_p95_s": round(float(p95), 4),
+            "wait_max_s": round(float(waits.max()), 4) if len(waits) else 0.0,
+        }
+
+
+# -------------------------------------------------------------------
+# Circuit breaker
+# -------------------------------------------------------------------
+class CircuitBreaker:
+    """Closed -> open after `failure_threshold` consecutive failures -> half-open probe after `reset_s`."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_s: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_s = reset_s
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opens = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go out now. In half-open state only one probe at a time is let through."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and now - self._opened_at >= self.reset_s:
+                self.state = self.HALF_OPEN
+                self._probe_started = now
+                log.info(f"Circuit {self.name} half-open, sending a probe")
+                return True
+            if self.state == self.HALF_OPEN and now - self._probe_started >= self.reset_s:
+                self._probe_started = now  # The previous probe never reported back
+                return True
+            self.rejected += 1
+            return False
+
+    def check(self) -> None:
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit open after {self.consecutive_failures} consecutive failures")
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != self.CLOSED:
+                log.info(f"Circuit {self.name} closed")
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or (
+                self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold
+            ):
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self.opens += 1
+                log.warning(f"Circuit {self.name} opened after {self.consecutive_failures} consecutive failures")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "opens": self.opens,
+            "rejected": self.rejected,
+        }
+
+
+# -------------------------------------------------------------------
+# Process-wide instances
+# -------------------------------------------------------------------
+LIMITERS: Dict[str, TokenBucket] = {
+    "gemini": TokenBucket("gemini", GEMINI_RATE_PER_MIN / 60, GEMINI_BURST),
+    "open_meteo": TokenBucket("open_meteo", OPEN_METEO_RATE_PER_MIN / 60, OPEN_METEO_BURST),
+}
+BREAKERS: Dict[str, CircuitBreaker] = {
+    name: CircuitBreaker(name, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_S) for name in LIMITERS
+}
+
+
+def resilience_stats() -> Dict[str, Dict[str, Any]]:
+    """Limiter queue/wait metrics and breaker state per upstream."""
+    return {name: {**LIMITERS[name].stats(), "breaker": BREAKERS[name].stats()} for name in LIMITERS}
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """Whether an error says the upstream is unhealthy (as opposed to a bad request)."""
+    if isinstance(error, errors.APIError):
+        return error.code in UPSTREAM_FAILURE_CODES
+    return isinstance(error, (httpx.TimeoutException, httpx.TransportError, asyncio.TimeoutError))
+
+
+def budget_retry_options(base: types.HttpRetryOptions, remaining_s: float) -> types.HttpRetryOptions:
+    """`base` with attempts cut so the worst-case backoff fits in remaining_s."""
+    initial = base.initial_delay or 1.0
+    exp_base = base.exp_base or 2.0
+    max_delay = base.max_delay or 60.0
+    jitter = base.jitter or 1.0
+    attempts, slept = 1, 0.0
+    while attempts < (base.attempts or 5):
+        delay = min(initial * exp_base ** (attempts - 1), max_delay) + jitter
+        if slept + delay >= remaining_s:
+            break
+        slept += delay
+        attempts += 1
+    return base.model_copy(update={"attempts": attempts})
+
+
+def _error_response(code: str, message: str) -> LlmResponse:
+    return LlmResponse(error_code=code, error_message=message)
+
+
+class ResiliencePlugin(BasePlugin):
+    """Deadline per invocation, plus rate limiting, circuit breaking and budgeted retries for model calls."""
+
+    def __init__(
+        self,
+        name: str = "resilience_plugin",
+        deadline_s: float = BASELINE_DEADLINE_S,
+        retry_options: types.HttpRetryOptions = SHARED_RETRY_CONFIG,
+    ):
+        super().__init__(name)
+        self.deadline_s = deadline_s
+        self.retry_options = retry_options
+        self.limiter = LIMITERS["gemini"]
+        self.breaker = BREAKERS["gemini"]
+        self._tokens: Dict[str, contextvars.Token] = {}
+
+    async def before_run_callback(self, *, invocation_context) -> None:
+        self._tokens[invocation_context.invocation_id] = start_deadline(self.deadline_s)
+        return None
+
+    async def after_run_callback(self, *, invocation_context) -> None:
+        token = self._tokens.pop(invocation_context.invocation_id, None)
+        if token is not None:
+            end_deadline(token)
+
+    async def before_model_callback(
+        self, *, callback_context: CallbackContext, llm_request: LlmRequest
+    ) -> Optional[LlmResponse]:
+        deadline = current_deadline()
+        try:
+            self.breaker.check()
+            if deadline is not None:
+                deadline.check(f"{callback_context.agent_name} model call")
+            await self.limiter.acquire(deadline)
+        except (CircuitOpenError, DeadlineExceeded) as e:
+            log.error(f"Skipping model call of {callback_context.agent_name}: {e}")
+            code = "CIRCUIT_OPEN" if isinstance(e, CircuitOpenError) else "DEADLINE_EXCEEDED"
+            return _error_response(code, str(e))
+
+        if deadline is not None:
+            # Each attempt and the whole retry schedule stay inside the remaining budget.
+            remaining = deadline.remaining()
+            http_options = llm_request.config.http_options or types.HttpOptions()
+            http_options.retry_options = budget_retry_options(self.retry_options, remaining)
+            http_options.timeout = max(int(remaining * 1000), 1)
+            llm_request.config.http_options = http_options
+        return None
+
+    async def after_model_callback(
+        self, *, callback_context: CallbackContext, llm_response: LlmResponse
+    ) -> Optional[LlmResponse]:
+        if not llm_response.partial:
+            self.breaker.record_success()
+        return None
+
+    async def on_model_error_callback(
+        self, *, callback_context: CallbackContext, llm_request: LlmRequest, error: Exception
+    ) -> Optional[LlmResponse]:
+        if is_upstream_failure(error):
+            self.breaker.record_failure()
+        return None
+
+    async def close(self) -> None:
+        log.info(f"Upstream stats: {resilience_stats()}")
@@ -0,0 +1,334 @@
+"""
+Long-running baseline HTTP service.
+
+One warm `Runner` over the baseline pipeline serves every request. It is built
+once at startup, together with the agent graph, the session store and the
+plugins. Requests are seeded into session state as in batch.py's structured
+mode.
+
+    POST /baselines                  create (or join) a baseline; ?wait=<seconds> to block for the result
+    GET  /baselines/{job_id}         status, and the result once finished; also takes ?wait=
+    GET  /baselines/{job_id}/events  server-sent events: the job status, each progress milestone, then the result
+    GET  /healthz                    job counts and coalescing / cache statistics
+
+Requests are keyed by facility id, weather grid cell (WEATHER_CACHE_GRID_DEG)
+and baseline window. While a baseline for a key is running, identical requests
+join it instead of starting another run, and every waiter gets the same result.
+Different facilities in the same cell run separately, since their consumption
+differs; their weather is still fetched once, by the weather cache.
+Successful results are reused for SERVICE_RESULT_TTL_MIN. Failed runs are not
+reused: the next request for the key starts a new run.
+
+While a job runs, its progress milestones (progress.py: geocode, weather,
+consumption, fit, model selection, prediction) are added to the job as each
+stage finishes, with their partial results. The events stream sends each one
+as it happens; clients that join late get the ones already reached first.
+
+    python server.py --port 8080        (or: uvicorn server:app)
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from batch import FacilityRequest
+from progress import ProgressEvent
+from config.settings import (
+    LLM_CACHE_ENABLED,
+    SERVICE_CONCURRENCY,
+    SERVICE_HOST,
+    SERVICE_MAX_JOBS,
+    SERVICE_PORT,
+    SERVICE_RESULT_TTL_S,
+    WEATHER_CACHE_GRID_DEG,
+)
+
+load_dotenv()  # Loads .env from current directory
+
+logger = logging.getLogger(__name__)
+
+PENDING, RUNNING, SUCCEEDED, FAILED = "pending", "running", "succeeded", "failed"
+
+
+class BaselineJob(BaseModel):
+    """One baseline run and the requests that share it."""
+    job_id: str
+    key: Tuple[str, int, int, str, str]
+    status: str = PENDING
+    requests: int = 1           # requests answered by this run, including coalesced and cached ones
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    expires_at: Optional[float] = None
+    progress: List[ProgressEvent] = []
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (SUCCEEDED, FAILED)
+
+    def view(self) -> Dict[str, Any]:
+        return self.model_dump(exclude={"key"})
+
+
+class BaselineService:
+    """Warm runner plus single-flight coalescing and a TTL cache of finished baselines."""
+
+    def __init__(
+        self,
+        concurrency: int = SERVICE_CONCURRENCY,
+        result_ttl_s: float = SERVICE_RESULT_TTL_S,
+        max_jobs: int = SERVICE_MAX_JOBS,
+    ):
+        self.result_ttl_s = result_ttl_s
+        self.max_jobs = max_jobs
+        self.jobs: "OrderedDict[str, BaselineJob]" = OrderedDict()
+        self.stats = {"runs": 0, "coalesced": 0, "cache_hits": 0}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        # Set (and replaced) whenever a job gets a milestone or finishes; see updates().
+        self._changed: Dict[str, asyncio.Event] = {}
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.runner = None
+        self.session_service = None
+
+    async def start(self) -> None:
+        """Build the agent graph, session store and runner once for the life of the process."""
+        from google.adk.runners import Runner
+
+        from coordinator_agent.sub_agents.baseline_agent_sequential.agent import baseline_agent_sequential
+        from instrumentation import InstrumentationPlugin
+        from llm_cache import LlmCachePlugin
+        from resilience import ResiliencePlugin
+        from session_store import create_session_service
+
+        from batch import APP_NAME
+
+        self.session_service = create_session_service()
+        # The LLM cache goes first: a hit skips the model callbacks of later plugins.
+        plugins = [LlmCachePlugin()] if LLM_CACHE_ENABLED else []
+        self.runner = Runner(
+            agent=baseline_agent_sequential,
+            plugins=plugins + [ResiliencePlugin(), InstrumentationPlugin(print_report=False, max_reports=SERVICE_MAX_JOBS)],
+            session_service=self.session_service,
+            app_name=APP_NAME,
+        )
+        logger.info("Baseline service ready")
+
+    async def close(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        # Let cancelled runs unwind (and delete their sessions) before the runner goes.
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.runner is not None:
+            await self.runner.close()
+
+    @staticmethod
+    def resolve(facility: FacilityRequest) -> Tuple[FacilityRequest, Tuple[str, int, int, str, str]]:
+        """
+        Validate the request and resolve its location offline.
+
+        Returns the facility with latitude/longitude filled in and its coalescing
+        key (facility id, grid cell, baseline window). Raises ValueError or LookupError as
+        structured_user_state does.
+        """
+        from coordinator_agent.sub_agents.baseline_agent_sequential.sub_agents.baseline_data_agent_parallel.sub_agents.weather_data_agent.weather_cache import (
+            grid_cell,
+        )
+        from coordinator_agent.sub_agents.input_agent.agent import structured_user_state
+
+        state = structured_user_state(
+            facility.name, facility.city, facility.baseline_from_date, facility.baseline_to_date,
+            facility.latitude, facility.longitude, facility.facility_id,
+        )
+        resolved = facility.model_copy(update={"latitude": state["latitude"], "longitude": state["longitude"]})
+        cell = grid_cell(state["latitude"], state["longitude"], WEATHER_CACHE_GRID_DEG)
+        return resolved, (facility.facility_id, *cell, state["baseline_from_date"], state["baseline_end_date"])
+
+    def submit(self, facility: FacilityRequest) -> BaselineJob:
+        """The running or cached job for this request's key, or a newly started one."""
+        facility, key = self.resolve(facility)
+        job_id = hashlib.sha256(json.dumps(key).encode()).hexdigest()[:16]
+        now = time.time()
+        job = self.jobs.get(job_id)
+        if job is not None and not job.finished:
+            job.requests += 1
+            self.stats["coalesced"] += 1
+            logger.info(f"Joined in-flight baseline {job_id} ({job.requests} requests)")
+            return job
+        if job is not None and job.status == SUCCEEDED and job.expires_at > now:
+            job.requests += 1
+            self.stats["cache_hits"] += 1
+            self.jobs.move_to_end(job_id)
+            return job
+
+        job = BaselineJob(job_id=job_id, key=key, created_at=now)
+        self.jobs[job_id] = job
+        self.jobs.move_to_end(job_id)
+        self._tasks[job_id] = asyncio.create_task(self._run(job, facility))
+        self.stats["runs"] += 1
+        self._trim()
+        return job
+
+    async def _run(self, job: BaselineJob, facility: FacilityRequest) -> None:
+        from batch import run_facility
+
+        try:
+            async with self._semaphore:
+                job.status, job.started_at = RUNNING, time.time()
+                result = await run_facility(
+                    self.runner, self.session_service, facility, structured=True,
+                    on_progress=lambda progress: self._publish(job, progress),
+                )
+            job.result = result
+            job.status = SUCCEEDED if result["status"] == "success" else FAILED
+            job.error = result.get("error")
+        except Exception as e:
+            logger.exception(f"Baseline {job.job_id} failed")
+            job.status, job.error = FAILED, str(e)
+        finally:
+            job.finished_at = time.time()
+            job.expires_at = job.finished_at + self.result_ttl_s
+            self._tasks.pop(job.job_id, None)
+            self._notify(job.job_id)
+            logger.info(f"Baseline {job.job_id} {job.status} in {job.finished_at - job.created_at:.3f}s")
+
+    def _publish(self, job: BaselineJob, progress: ProgressEvent) -> None:
+        job.progress.append(progress)
+        self._notify(job.job_id)
+
+    def _notify(self, job_id: str) -> None:
+        changed = self._changed.pop(job_id, None)
+        if changed is not None:
+            changed.set()
+
+    async def updates(self, job: BaselineJob, seen: int, timeout: float) -> None:
+        """Wait up to timeout seconds for the job to have more than `seen` milestones or to finish."""
+        if len(job.progress) > seen or job.finished:
+            return
+        changed = self._changed.setdefault(job.job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _trim(self) -> None:
+        """Drop expired finished jobs, then the oldest finished ones beyond max_jobs."""
+        now = time.time()
+        for job_id in [j.job_id for j in self.jobs.values() if j.finished and j.expires_at <= now]:
+            del self.jobs[job_id]
+        finished = [j.job_id for j in self.jobs.values() if j.finished]
+        for job_id in finished[: max(len(self.jobs) - self.max_jobs, 0)]:
+            del self.jobs[job_id]
+
+    async def wait(self, job: BaselineJob, timeout: float) -> BaselineJob:
+        """Wait up to timeout seconds for the job to finish; the job is returned either way."""
+        task = self._tasks.get(job.job_id)
+        if task is not None and timeout > 0:
+            try:
+                await asyncio.wait_for(asyncio.shield(task), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return job
+
+    def get(self, job_id: str) -> BaselineJob:
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Unknown or expired baseline job '{job_id}'")
+        return job
+
+    def health(self) -> Dict[str, Any]:
+        statuses: Dict[str, int] = {}
+        for job in self.jobs.values():
+            statuses[job.status] = statuses.get(job.status, 0) + 1
+        return {"status": "ok" if self.runner is not None else "starting", "jobs": statuses, **self.stats}
+
+
+def _job_response(job: BaselineJob) -> JSONResponse:
+    return JSONResponse(job.view(), status_code=200 if job.finished else 202)
+
+
+def create_app(service: Optional[BaselineService] = None) -> FastAPI:
+    service = service or BaselineService()
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        await service.start()
+        yield
+        await service.close()
+
+    app = FastAPI(title="Energy baseline service", lifespan=lifespan)
+    app.state.service = service
+
+    @app.post("/baselines")
+    async def create_baseline(
+        facility: FacilityRequest, wait: float = Query(0.0, ge=0, description="Seconds to wait for the result")
+    ) -> JSONResponse:
+        try:
+            job = service.submit(facility)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        except LookupError as e:
+            raise HTTPException(status_code=422, detail=f"{e} Give latitude and longitude.")
+        return _job_response(await service.wait(job, wait))
+
+    @app.get("/baselines/{job_id}")
+    async def get_baseline(
+        job_id: str, wait: float = Query(0.0, ge=0, description="Seconds to wait for the result")
+    ) -> JSONResponse:
+        return _job_response(await service.wait(service.get(job_id), wait))
+
+    @app.get("/baselines/{job_id}/events")
+    async def baseline_events(job_id: str):
+        from sse_starlette.sse import EventSourceResponse
+
+        job = service.get(job_id)
+
+        async def events() -> AsyncGenerator[Dict[str, str], None]:
+            yield {"event": "status", "data": json.dumps({"job_id": job.job_id, "status": job.status})}
+            sent = 0
+            while True:
+                finished = job.finished
+                for progress in job.progress[sent:]:
+                    yield {"event": "progress", "data": progress.model_dump_json()}
+                sent = len(job.progress)
+                if finished:
+                    break
+                await service.updates(job, sent, 15.0)
+            yield {"event": "result", "data": json.dumps(job.view(), default=str)}
+
+        return EventSourceResponse(events())
+
+    @app.get("/healthz")
+    async def healthz() -> Dict[str, Any]:
+        return service.health()
+
+    return app
+
+
+app = create_app()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+    import argparse
+
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve energy baselines over HTTP from one warm agent graph.")
+    parser.add_argument("--host", default=SERVICE_HOST, help="Interface to bind")
+    parser.add_argument("--port", type=int, default=SERVICE_PORT, help="Port to listen on")
+    args = parser.parse_args()
+
+    # One worker: coalescing and the result cache live in this process.
+    uvicorn.run(app, host=args.host, port=args.port, workers=1)
@@ -0,0 +1,314 @@
+"""
+Persistent session storage.
+
+`ColumnarSqliteSessionService` extends ADK's aiosqlite backed
+SqliteSessionService so sessions survive restarts. Bulky state values (any
+key in BLOB_STATE_KEYS holding a DailySeries or {"daily_records": [...]}) are
+not written into the JSON state column or the event log. They are stored once
+per session as a compressed Arrow IPC blob in a separate table. Blobs are decoded only when a
+session is opened with get_session; `load_columns` reads one value as numpy
+columns without building record dicts at all.
+
+It hooks two private SqliteSessionService methods, `_get_db_connection` and
+`_update_session_state_in_db`. If an ADK upgrade renames them or changes their
+parameters, create_session_service falls back to the stock SqliteSessionService.
+"""
+import asyncio
+import inspect
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+from google.adk.events import Event, EventActions
+from google.adk.sessions import BaseSessionService, InMemorySessionService
+from google.adk.sessions.base_session_service import GetSessionConfig
+from google.adk.sessions.session import Session
+from google.adk.sessions.sqlite_session_service import SqliteSessionService
+from google.adk.sessions.state import State
+
+from config.settings import SESSION_BACKEND, SESSION_DB_PATH
+from coordinator_agent.sub_agents.baseline_agent_sequential.sub_agents.daily_series import DailySeries
+
+log = logging.getLogger(__name__)
+
+BLOB_STATE_KEYS = ("weather_data", "energy_consumption_data", "savings")
+RECORDS_FIELD = "daily_records"
+BLOB_CODEC = "arrow-ipc-zstd"
+# How long a connection waits for another process's write lock.
+BUSY_TIMEOUT_MS = 30000
+
+SESSION_BLOBS_TABLE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS session_blobs (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    codec TEXT NOT NULL,
+    data BLOB NOT NULL,
+    update_time REAL NOT NULL,
+    PRIMARY KEY (app_name, user_id, session_id, key),
+    FOREIGN KEY (app_name, user_id, session_id) REFERENCES sessions(app_name, user_id, id) ON DELETE CASCADE
+);
+"""
+
+
+def encode_records(value: Any) -> Optional[bytes]:
+    """
+    Encode a DailySeries or {"daily_records": [dict, ...], ...} as a compressed Arrow IPC stream.
+
+    Other top-level keys are kept as JSON in the schema metadata. Returns None
+    for values that are not record lists, which then stay in the JSON state.
+    """
+    if isinstance(value, DailySeries):
+        table = pa.table({value.date_field: pa.array(value.dates), **value.columns})
+        return _write_table(table.replace_schema_metadata({"daily_series": value.date_field}))
+    if not isinstance(value, dict) or not isinstance(value.get(RECORDS_FIELD), list):
+        return None
+    records = value[RECORDS_FIELD]
+    if not all(isinstance(r, dict) for r in records):
+        return None
+    extra = {k: v for k, v in value.items() if k != RECORDS_FIELD}
+    try:
+        table = pa.Table.from_pylist(records)
+        table = table.replace_schema_metadata({"extra": json.dumps(extra, default=str)})
+    except (pa.ArrowException, TypeError, ValueError) as e:
+        log.debug(f"Keeping state value as JSON, not encodable as columns: {e}")
+        return None
+    return _write_table(table)
+
+
+def _write_table(table: pa.Table) -> bytes:
+    sink = pa.BufferOutputStream()
+    options = pa.ipc.IpcWriteOptions(compression="zstd")
+    with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _read_table(data: bytes) -> pa.Table:
+    return pa.ipc.open_stream(pa.py_buffer(data)).read_all()
+
+
+def decode_records(data: bytes) -> Any:
+    """Inverse of encode_records."""
+    table = _read_table(data)
+    metadata = table.schema.metadata or {}
+    if b"daily_series" in metadata:
+        date_field = metadata[b"daily_series"].decode()
+        columns = decode_columns(data)
+        dates = columns.pop(date_field)
+        return DailySeries(date_field=date_field, dates=dates, columns=columns)
+    value = json.loads(metadata.get(b"extra", b"{}"))
+    value[RECORDS_FIELD] = table.to_pylist()
+    return value
+
+
+def decode_columns(data: bytes) -> Dict[str, np.ndarray]:
+    """Decode a blob straight to numpy columns (dates as datetime64[D])."""
+    table = _read_table(data)
+    columns = {}
+    for name, column in zip(table.column_names, table.columns):
+        if pa.types.is_date(column.type):
+            columns[name] = column.to_numpy(zero_copy_only=False).astype("datetime64[D]")
+        elif pa.types.is_floating(column.type) or pa.types.is_integer(column.type):
+            columns[name] = column.cast(pa.float64()).fill_null(np.nan).to_numpy()
+        else:
+            columns[name] = np.asarray(column.to_pylist(), dtype=object)
+    return columns
+
+
+# Private SqliteSessionService methods ColumnarSqliteSessionService overrides, with their parameters.
+HOOKED_METHODS = {
+    "_get_db_connection": ("self",),
+    "_update_session_state_in_db": ("self", "db", "app_name", "user_id", "session_id", "delta", "now"),
+}
+
+
+def _hooks_available() -> bool:
+    """Whether the installed SqliteSessionService still has the methods in HOOKED_METHODS."""
+    for name, params in HOOKED_METHODS.items():
+        method = getattr(SqliteSessionService, name, None)
+        if method is None or tuple(inspect.signature(method).parameters) != params:
+            log.warning(f"SqliteSessionService.{name} is missing or changed; columnar session storage is disabled")
+            return False
+    return True
+
+
+COLUMNAR_STORE_AVAILABLE = _hooks_available()
+
+
+class ColumnarSqliteSessionService(SqliteSessionService):
+    """SqliteSessionService that keeps bulky record lists as columnar blobs."""
+
+    def __init__(self, db_path: str, blob_keys: Tuple[str, ...] = BLOB_STATE_KEYS):
+        super().__init__(db_path)
+        self.blob_keys = set(blob_keys)
+        # Encoded blobs waiting to be written inside append_event's transaction.
+        self._pending: Dict[Tuple[str, str, str, str], bytes] = {}
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _writes(self) -> asyncio.Lock:
+        """
+        Lock serializing this process's write transactions.
+
+        SQLite admits one writer at a time anyway. Queuing writers here, instead
+        of letting each connection thread poll the busy handler, keeps bursts of
+        concurrent sessions from running into the busy timeout.
+        """
+        loop = asyncio.get_running_loop()
+        if self._write_lock is None or self._loop is not loop:
+            self._write_lock = asyncio.Lock()
+            self._loop = loop
+        return self._write_lock
+
+    @asynccontextmanager
+    async def _get_db_connection(self):
+        async with super()._get_db_connection() as db:
+            await db.execute("PRAGMA journal_mode=WAL")
+            await db.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            await db.executescript(SESSION_BLOBS_TABLE_SCHEMA)
+            yield db
+
+    async def _encode_delta(self, delta: Dict[str, Any]) -> Dict[str, bytes]:
+        """Encode the blob-eligible session keys of a state delta."""
+        candidates = {
+            k: v for k, v in delta.items()
+            if k in self.blob_keys and not k.startswith((State.APP_PREFIX, State.USER_PREFIX, State.TEMP_PREFIX))
+        }
+        if not candidates:
+            return {}
+        encoded = await asyncio.to_thread(lambda: {k: encode_records(v) for k, v in candidates.items()})
+        return {k: data for k, data in encoded.items() if data is not None}
+
+    async def _write_blobs(self, db, app_name: str, user_id: str, session_id: str, blobs: Dict[str, bytes], now: float):
+        await db.executemany(
+            """
+            INSERT INTO session_blobs (app_name, user_id, session_id, key, codec, data, update_time)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(app_name, user_id, session_id, key) DO UPDATE SET
+                codec=excluded.codec, data=excluded.data, update_time=excluded.update_time
+            """,
+            [(app_name, user_id, session_id, key, BLOB_CODEC, data, now) for key, data in blobs.items()],
+        )
+
+    async def _load_blobs(self, app_name: str, user_id: str, session_id: str) -> Dict[str, Any]:
+        async with self._get_db_connection() as db:
+            rows = await db.execute_fetchall(
+                "SELECT key, data FROM session_blobs WHERE app_name=? AND user_id=? AND session_id=?",
+                (app_name, user_id, session_id),
+            )
+        return await asyncio.to_thread(lambda: {row["key"]: decode_records(row["data"]) for row in rows})
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        blobs = await self._encode_delta(state or {})
+        json_state = {k: v for k, v in (state or {}).items() if k not in blobs}
+        async with self._writes():
+            session = await super().create_session(
+                app_name=app_name, user_id=user_id, state=json_state, session_id=session_id
+            )
+            if blobs:
+                async with self._get_db_connection() as db:
+                    await self._write_blobs(db, app_name, user_id, session.id, blobs, time.time())
+                    await db.commit()
+        session.state.update({k: state[k] for k in blobs})
+        return session
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        session = await super().get_session(
+            app_name=app_name, user_id=user_id, session_id=session_id, config=config
+        )
+        if session is not None:
+            session.state.update(await self._load_blobs(app_name, user_id, session_id))
+        return session
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        async with self._writes():
+            await super().delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    async def load_columns(self, app_name: str, user_id: str, session_id: str, key: str) -> Optional[Dict[str, np.ndarray]]:
+        """One blob state value as numpy columns, without opening the whole session."""
+        async with self._get_db_connection() as db:
+            async with db.execute(
+                "SELECT data FROM session_blobs WHERE app_name=? AND user_id=? AND session_id=? AND key=?",
+                (app_name, user_id, session_id, key),
+            ) as cursor:
+                row = await cursor.fetchone()
+        return decode_columns(row["data"]) if row else None
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        delta = event.actions.state_delta if event.actions and not event.partial else None
+        blobs = await self._encode_delta(delta) if delta else {}
+        if not blobs:
+            async with self._writes():
+                return await super().append_event(session=session, event=event)
+
+        # Persist a slim copy of the event: blob values are replaced by a reference
+        # in both the JSON state and the event log, and written by _update_session_state_in_db.
+        for key, data in blobs.items():
+            self._pending[(session.app_name, session.user_id, session.id, key)] = data
+        slim_delta = {k: ({"$blob": BLOB_CODEC} if k in blobs else v) for k, v in delta.items()}
+        slim_event = event.model_copy(update={"actions": event.actions.model_copy(update={"state_delta": slim_delta})})
+        try:
+            async with self._writes():
+                await super().append_event(session=session, event=slim_event)
+        finally:
+            for key in blobs:
+                self._pending.pop((session.app_name, session.user_id, session.id, key), None)
+        # Keep the in-memory session and the caller's event holding the real values.
+        session.state.update({k: delta[k] for k in blobs})
+        session.events[-1] = event
+        return event
+
+    async def _update_session_state_in_db(self, db, app_name: str, user_id: str, session_id: str, delta: dict, now: float) -> None:
+        blobs = {}
+        json_delta = {}
+        for key, value in delta.items():
+            data = self._pending.get((app_name, user_id, session_id, key))
+            if data is not None and isinstance(value, dict) and "$blob" in value:
+                blobs[key] = data
+                json_delta[key] = None  # json_patch removes any JSON copy of the key
+            else:
+                json_delta[key] = value
+        if blobs:
+            await self._write_blobs(db, app_name, user_id, session_id, blobs, now)
+        await super()._update_session_state_in_db(db, app_name, user_id, session_id, json_delta, now)
+
+
+async def seed_session_state(
+    session_service: BaseSessionService, session: Session, state: Dict[str, Any], author: str = "user"
+) -> Session:
+    """Write `state` into the session through one event, as a tool's state changes would be."""
+    event = Event(author=author, invocation_id=Event.new_id(), actions=EventActions(state_delta=dict(state)))
+    await session_service.append_event(session=session, event=event)
+    return session
+
+
+def create_session_service(backend: str = SESSION_BACKEND, db_path: str = SESSION_DB_PATH) -> BaseSessionService:
+    """Session service selected by the SESSION_BACKEND setting ("sqlite" or "memory")."""
+    if backend == "memory":
+        return InMemorySessionService()
+    if backend == "sqlite":
+        log.info(f"Using SQLite session store {db_path}")
+        if not COLUMNAR_STORE_AVAILABLE:
+            return SqliteSessionService(db_path)
+        return ColumnarSqliteSessionService(db_path)
+    raise ValueError(f"Unknown SESSION_BACKEND '{backend}', expected sqlite or memory")
@@ -0,0 +1,173 @@
+"""
+Cold-start benchmark for the CLI entry points.
+
+Each target runs in fresh interpreters under `python -X importtime`; the report
+gives median wall time, total import time, number of modules loaded and the
+packages that account for most of the import time. Targets:
+
+    import_main   `import main` (what every CLI invocation pays before main())
+    main_help     `python main.py --help`
+    root_agent    `coordinator_agent.root_agent`, i.e. building the whole agent tree
+
+Results can be saved as a baseline and later runs compared against it, as with
+benchmark.py:
+
+    python startup_benchmark.py --save-baseline .cache/benchmarks/startup_baseline.json
+    python startup_benchmark.py --baseline .cache/benchmarks/startup_baseline.json   # exit code 1 on regressions
+"""
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+STARTUP_TARGETS = {
+    "import_main": ["-c", "import main"],
+    "main_help": ["main.py", "--help"],
+    "root_agent": ["-c", "import coordinator_agent; coordinator_agent.root_agent"],
+}
+
+# metric: (higher is worse, absolute slack in seconds / modules below which changes are noise)
+COMPARED_METRICS = {"wall_s": (True, 0.05), "import_s": (True, 0.05), "modules": (True, 25)}
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """(module, self_us, cumulative_us, depth) for every line of `-X importtime` output."""
+    rows = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+def _package(module: str) -> str:
+    """Distribution-level name used to group import time ("google.adk", "numpy", ...)."""
+    parts = module.split(".")
+    return ".".join(parts[:2]) if parts[0] in ("google", "opentelemetry") and len(parts) > 1 else parts[0]
+
+
+def package_import_times(rows: List[Tuple[str, int, int, int]]) -> Dict[str, float]:
+    """Import self time summed per package, in seconds."""
+    totals: Dict[str, int] = defaultdict(int)
+    for name, self_us, _, _ in rows:
+        totals[_package(name)] += self_us
+    return {name: us / 1e6 for name, us in totals.items()}
+
+
+def run_target(args: List[str]) -> Dict[str, Any]:
+    """One cold start of `python -X importtime <args>` in the repository directory."""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=REPO_DIR, capture_output=True, text=True, env={**os.environ, "PYTHONWARNINGS": "ignore"},
+    )
+    wall_s = time.perf_counter() - start
+    if proc.returncode != 0:
+        tail = [line for line in proc.stderr.splitlines() if not line.startswith("import time:")][-5:]
+        raise RuntimeError(f"{' '.join(args)} exited with {proc.returncode}: {' / '.join(tail)}")
+    rows = parse_importtime(proc.stderr)
+    return {
+        "wall_s": wall_s,
+        "import_s": sum(self_us for _, self_us, _, _ in rows) / 1e6,
+        "modules": len(rows),
+        "packages": package_import_times(rows),
+    }
+
+
+def measure(args: List[str], runs: int = 5, top: int = 10) -> Dict[str, Any]:
+    """Median of several cold starts, plus the slowest packages of the median run."""
+    samples = sorted((run_target(args) for _ in range(runs)), key=lambda s: s["wall_s"])
+    median_run = samples[len(samples) // 2]
+    packages = sorted(median_run["packages"].items(), key=lambda kv: -kv[1])[:top]
+    return {
+        "runs": runs,
+        "wall_s": round(statistics.median(s["wall_s"] for s in samples), 4),
+        "wall_min_s": round(samples[0]["wall_s"], 4),
+        "import_s": round(statistics.median(s["import_s"] for s in samples), 4),
+        "modules": median_run["modules"],
+        "top_packages": {name: round(seconds, 4) for name, seconds in packages},
+    }
+
+
+def run_startup_benchmark(targets: List[str], runs: int = 5, top: int = 10) -> Dict[str, Any]:
+    run_target(STARTUP_TARGETS[targets[0]])  # untimed: fills the bytecode cache
+    return {
+        "python": sys.version.split()[0],
+        "targets": {name: measure(STARTUP_TARGETS[name], runs=runs, top=top) for name in targets},
+    }
+
+
+def compare_to_baseline(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.2) -> List[str]:
+    """Regressions of results against a saved baseline, as human readable lines."""
+    regressions = []
+    for name, target in results["targets"].items():
+        base = baseline.get("targets", {}).get(name)
+        if base is None:
+            continue
+        for metric, (higher_is_worse, slack) in COMPARED_METRICS.items():
+            current, previous = target.get(metric), base.get(metric)
+            if current is None or previous is None:
+                continue
+            change = (current - previous) if higher_is_worse else (previous - current)
+            if change > max(slack, abs(previous) * tolerance):
+                regressions.append(f"{name}: {metric} {previous} -> {current}")
+    return regressions
+
+
+def format_results(results: Dict[str, Any]) -> str:
+    header = f"{'target':<12} {'wall_s':>8} {'min_s':>8} {'import_s':>9} {'modules':>8}"
+    lines = [header, "-" * len(header)]
+    for name, t in results["targets"].items():
+        lines.append(f"{name:<12} {t['wall_s']:>8.3f} {t['wall_min_s']:>8.3f} {t['import_s']:>9.3f} {t['modules']:>8}")
+    for name, t in results["targets"].items():
+        lines.append(f"\n{name} import time by package")
+        for package, seconds in t["top_packages"].items():
+            lines.append(f"  {package:<32} {seconds:>8.3f}")
+    return "\n".join(lines)
+
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Cold-start (import time) benchmark of the CLI entry points.")
+    parser.add_argument(
+        "--targets", nargs="+", choices=list(STARTUP_TARGETS), default=list(STARTUP_TARGETS), help="Targets to measure"
+    )
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts per target (the median is reported)")
+    parser.add_argument("--top", type=int, default=10, help="Packages listed per target")
+    parser.add_argument("--output", default=os.path.join(".cache", "benchmarks", "startup.json"), help="Results JSON file")
+    parser.add_argument("--save-baseline", help="Also save the results as a baseline JSON file")
+    parser.add_argument("--baseline", help="Baseline JSON file to compare against; exits 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Relative change flagged as a regression")
+    args = parser.parse_args()
+
+    results = run_startup_benchmark(args.targets, runs=args.runs, top=args.top)
+    print(format_results(results))
+    _write_json(args.output, results)
+    if args.save_baseline:
+        _write_json(args.save_baseline, results)
+        print(f"\nBaseline saved to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regressions against {args.baseline}:")
+            print("\n".join(f"  {line}" for line in regressions))
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")